@@ -0,0 +1,98 @@
+from agents.bank import Bank
+from model.state import ExposureView
+from utils.logger import log
+
+
+def state_field(name):
+    def getter(self):
+        return float(getattr(self.state, name)[self.index])
+
+    def setter(self, value):
+        getattr(self.state, name)[self.index] = value
+
+    return property(getter, setter)
+
+
+class ArrayBank(Bank, object):
+    '''
+    A Bank whose balance sheet is a row of a shared BankState instead of its
+    own attributes and dicts. All Bank behaviour is inherited unchanged.
+    '''
+    cash = state_field('cash')
+    deposit = state_field('deposit')
+    equity = state_field('equity')
+    external_asset = state_field('external_asset')
+    lending_total = state_field('lending_total')
+    borrowing_total = state_field('borrowing_total')
+
+    def __init__(self, params, state):
+        self.state = state
+        self.index = state.index[params.get("code", "")]
+        self.lending_view = ExposureView(state, self.index, axis=0)
+        self.borrowing_view = ExposureView(state, self.index, axis=1)
+        # params without interbank dicts keep the exposures already loaded in state
+        self.keep_exposures = "lendings" not in params and "borrowings" not in params
+        Bank.__init__(self, params)
+        self.keep_exposures = False
+
+    @property
+    def lendings(self):
+        return self.lending_view
+
+    @lendings.setter
+    def lendings(self, amounts):
+        if not self.keep_exposures:
+            self.lending_view.assign(amounts)
+
+    @property
+    def borrowings(self):
+        return self.borrowing_view
+
+    @borrowings.setter
+    def borrowings(self, amounts):
+        if not self.keep_exposures:
+            self.borrowing_view.assign(amounts)
+
+    @property
+    def bankrupted(self):
+        return bool(self.state.bankrupted[self.index])
+
+    @bankrupted.setter
+    def bankrupted(self, value):
+        self.state.bankrupted[self.index] = bool(value)
+
+    # ===================================================================
+    # Only the linked banks are walked, never the whole row
+
+    def positive_codes(self, axis):
+        indices, values = self.state.linked(self.index, axis)
+        return [self.state.codes[i] for i in indices[values > 0]]
+
+    def init_relation_indicators(self):
+        return {bank_code: 1 for bank_code in self.positive_codes(axis=0)}
+
+    def borrowing_codes(self):
+        return self.positive_codes(axis=1)
+
+    def counterparty_codes(self):
+        return set(self.positive_codes(axis=0)).union(self.positive_codes(axis=1))
+
+    # ===================================================================
+    # A loan is a single cell shared by lender and borrower, so only the
+    # lender side (lend/receive) moves it; pay/borrow just move cash.
+    # Writing a cell keeps the running totals of both banks in BankState.
+
+    def set_lending(self, bank_code, amount):
+        self.lendings[bank_code] = amount
+
+    def set_borrowing(self, bank_code, amount):
+        self.borrowings[bank_code] = amount
+
+    def pay(self, bank, amount):
+        log.debug('pay', code=self.code, bank=bank.code, amount=amount)
+        self.cash -= amount
+
+    def borrow(self, bank, amount, scheduled_payment):
+        log.debug('borrow', code=self.code, bank=bank.code, amount=amount)
+        self.cash += amount
+        self.update_scheduled_payment(bank, scheduled_payment)
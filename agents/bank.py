@@ -4,22 +4,40 @@ from mesa import Agent
 import model.fomulas as fl
 import math
 from data.contanst import *
+from model.distributions import uniform_stream
+from model.scores import ScoreRow
+from utils.logger import log, DEBUG
+
+def set_exposure(exposures, bank_code, amount):
+    if amount != 0:
+        exposures[bank_code] = amount
+    else:
+        exposures.pop(bank_code, None)
+
 
 class Bank(Agent):
+    # the formulas module, or the counted formulas of an instrumented model
+    formulas = fl
+
     def __init__(self, params):
         self.code = params.get("code", "")
         self.name = self.code
         self.unique_id = self.code
 
-        self.term = LOAN_TERM
+        self.term = params.get("loan_term", LOAN_TERM)
+
+        # debug mode: compare the running totals with a full recomputation
+        self.check_aggregates = params.get("check_aggregates", False)
 
         # Liabilities
         liability = params.get("liability", {})
         self.equity = liability.get("equity", 0)
         self.deposit = liability.get("deposit", 0)
         # self.total_borrowings() == liability["total"] - self.equity - self.deposit
+        # only the counterparties are kept, a missing code is no exposure
         borrowings = params.get("borrowings", {})
-        self.borrowings = {code: borrowings[code] for code in borrowings if code != self.code}
+        self.borrowings = {code: borrowings[code] for code in borrowings if code != self.code and borrowings[code] != 0}
+        self.borrowing_total = sum(self.borrowings.values())
 
         # Assets
         asset = params.get("asset", {})
@@ -27,11 +45,14 @@ class Bank(Agent):
         self.external_asset = asset.get("external_asset", 0)
         # self.total_lendings() == asset["total"] - self.cash - self.external_asset
         lendings = params.get("lendings", {})
-        self.lendings = {code: lendings[code] for code in lendings if code != self.code}
+        self.lendings = {code: lendings[code] for code in lendings if code != self.code and lendings[code] != 0}
+        self.lending_total = sum(self.lendings.values())
 
         self.short_term_lending_rate = params.get("short_term_lending_rate", 0)
         self.short_term_borrowing_rate = params.get("short_term_borrowing_rate", 0)
 
+        # RepaymentLedger shared by the banks of a model, None to keep the schedules in lists
+        self.ledger = params.get("ledger", None)
         self.scheduled_repayment_amount = {}
         self.init_scheduled_payment(self.term)
 
@@ -47,8 +68,15 @@ class Bank(Agent):
         self.recover_rate_params = params.get("recover_rate", {"min": 0, "max": 0})
 
         self.is_a_large_bank = params.get("large_bank", False)
+        self.total_score_weight = params.get("total_score_weight", TOTAL_SCORE_WEIGHT)
+        # bounds of the alpha and beta drawn for every lending decision
+        if self.is_a_large_bank:
+            self.alpha_limits = tuple(params.get("large_bank_alpha_range", LARGE_BANK_ALPHA_RANGE))
+        else:
+            self.alpha_limits = tuple(params.get("alpha_range", ALPHA_RANGE))
+        self.beta_limits = tuple(params.get("beta_range", BETA_RANGE))
 
-        self.relation_indicators = {bank_code: 1 if self.lendings[bank_code] > 0 else 0 for bank_code in self.lendings}
+        self.relation_indicators = self.init_relation_indicators()
         # ======
 
         self.total_asset_target_amount = 0
@@ -65,11 +93,22 @@ class Bank(Agent):
         self.relation_score = {}
         self.size_score = {}
         self.total_score = {}
+        # ScoreEngine computing the scores of all banks at once, see attach_score_engine
+        self.score_engine = None
 
         self.bankrupting_processor = params.get("bankrupting_processor", None)
         self.is_affected_by_bankrupting = False
 
         self.is_shocked = False
+        # share of the external asset lost when shocked
+        self.shock_rate = params.get("shock_rate", 0.5)
+
+        # random stream of the bank, the global NumPy generator by default
+        self.random = params.get("random", np.random)
+        # pre-generated uniforms for the batched lending decisions
+        self.random_stream = params.get("random_stream", uniform_stream)
+        # InterbankMarket shared by the banks of a model, None to ask banks one by one
+        self.market = params.get("market", None)
 
     def step(self, stage, banks):
         """ A single step of the agent. """
@@ -83,11 +122,16 @@ class Bank(Agent):
 
     # ===================================================================
 
+    # Running totals, kept up to date by set_lending/set_borrowing
     def total_borrowings(self):
-        return sum(self.borrowings.values())
+        if self.check_aggregates:
+            self.verify_aggregates()
+        return self.borrowing_total
 
     def total_lendings(self):
-        return sum(self.lendings.values())
+        if self.check_aggregates:
+            self.verify_aggregates()
+        return self.lending_total
 
     def total_asset(self):
         return self.cash + self.total_lendings() + self.external_asset
@@ -98,29 +142,45 @@ class Bank(Agent):
     def check_balance_sheet_problem(self):
         return round(self.total_asset() - self.total_liability(), 5) == 0
 
+    def verify_aggregates(self):
+        for name, total, entries in [("lendings", self.lending_total, self.lendings),
+                                     ("borrowings", self.borrowing_total, self.borrowings)]:
+            expected = sum(entries.values())
+            if abs(total - expected) > 1e-6 * max(1, abs(expected)):
+                raise AssertionError("Code %s: running total of %s is %s, recomputed %s" %
+                                     (self.code, name, total, expected))
+
+    def set_lending(self, bank_code, amount):
+        self.lending_total += amount - self.lendings.get(bank_code, 0)
+        set_exposure(self.lendings, bank_code, amount)
+
+    def set_borrowing(self, bank_code, amount):
+        self.borrowing_total += amount - self.borrowings.get(bank_code, 0)
+        set_exposure(self.borrowings, bank_code, amount)
+
     # ===================================================================
 
     def pay(self, bank, amount):
-        print "--->", 'Code:', str(self.code), "- Name:", self.name, ":", "paid", amount
+        log.debug('pay', code=self.code, bank=bank.code, amount=amount)
         self.cash -= amount
-        self.borrowings[bank.code] -= amount
+        self.set_borrowing(bank.code, self.borrowings.get(bank.code, 0) - amount)
 
 
     def receive(self, bank, amount):
-        print "--->", 'Code:', str(self.code), "- Name:", self.name, ":", "received", amount
+        log.debug('receive', code=self.code, bank=bank.code, amount=amount)
         self.cash += amount
-        self.lendings[bank.code] -= amount
+        self.set_lending(bank.code, self.lendings.get(bank.code, 0) - amount)
 
 
     def lend(self, bank, amount):
-        print "--->", 'Code:', str(self.code), "- Name:", self.name, ":", "lend", amount
+        log.debug('lend', code=self.code, bank=bank.code, amount=amount)
         self.cash -= amount
-        self.lendings[bank.code] += amount
+        self.set_lending(bank.code, self.lendings.get(bank.code, 0) + amount)
 
     def borrow(self, bank, amount, scheduled_payment):
-        print "--->", 'Code:', str(self.code), "- Name:", self.name, ":", "borrowed", amount
+        log.debug('borrow', code=self.code, bank=bank.code, amount=amount)
         self.cash += amount
-        self.borrowings[bank.code] += amount
+        self.set_borrowing(bank.code, self.borrowings.get(bank.code, 0) + amount)
         self.update_scheduled_payment(bank, scheduled_payment)
 
     # ===================================================================
@@ -128,8 +188,8 @@ class Bank(Agent):
     def update_deposit(self):
         noise_rate = self.deposit_noise_rate()
         new_deposit = self.deposit_target_amount * (1 + noise_rate)
-        print "--->", 'Code:', str(self.code), "updated_deposit", "-", "deposit_target_amount", ":", \
-            self.deposit_target_amount, "-", "new_deposit", ":", new_deposit, '-', 'noise rate :', noise_rate
+        log.debug('update_deposit', code=self.code, deposit_target_amount=self.deposit_target_amount,
+                  new_deposit=new_deposit, noise_rate=noise_rate)
         self.cash += new_deposit - self.deposit
         self.deposit = new_deposit
 
@@ -139,23 +199,23 @@ class Bank(Agent):
             new_external_asset = self.external_asset * (1 - shock_rate)
             self.equity -= self.external_asset * shock_rate
 
-            print "--->(SHOCK)", 'Code:', str(self.code), "updated_external_asset", "-", "external_asset", ":", \
-                self.external_asset, "- shock_rate :", shock_rate, "-", "new_external_asset", ":", new_external_asset
+            log.info('shock', code=self.code, external_asset=self.external_asset, shock_rate=shock_rate,
+                     new_external_asset=new_external_asset)
         else:
             external_asset_growth_rate = self.external_asset_growth_rate()
             new_external_asset = self.external_asset * math.exp(external_asset_growth_rate)
             self.cash -= new_external_asset - self.external_asset
 
-            print "--->", 'Code:', str(self.code), "updated_external_asset", "-", "external_asset", ":", \
-                self.external_asset, "- growth_rate:", external_asset_growth_rate, "-", "new_external_asset", ":", new_external_asset
+            log.debug('update_external_asset', code=self.code, external_asset=self.external_asset,
+                      growth_rate=external_asset_growth_rate, new_external_asset=new_external_asset)
 
         self.external_asset = new_external_asset
 
     def update_equity(self):
         equity_growth_rate = self.equity_growth_rate()
         new_equity = self.equity * (1 + equity_growth_rate)
-        print "--->", 'Code:', str(self.code), "updated_equity", "-", "equity", ":", self.equity, "-", \
-            "growth_rate: ", equity_growth_rate, "-", "new_equity", ":", new_equity
+        log.debug('update_equity', code=self.code, equity=self.equity, growth_rate=equity_growth_rate,
+                  new_equity=new_equity)
         self.cash += new_equity - self.equity
         self.equity = new_equity
 
@@ -166,8 +226,7 @@ class Bank(Agent):
 
     def bankrupting(self, banks):
         recover_rate = self.recover_rate()
-        other_banks = self.other_agents(banks)
-        self.sell_asset(other_banks, recover_rate)
+        self.sell_asset(banks, recover_rate)
 
         total_debt = self.deposit + self.total_borrowings()
         if total_debt > 0:
@@ -177,16 +236,16 @@ class Bank(Agent):
             self.deposit = 0
 
             for bank in banks:
-                if self.borrowings[bank.code] > 0:
+                if self.borrowings.get(bank.code, 0) > 0:
                     repay = total_cash * self.borrowings[bank.code] / total_debt
                     self.pay(bank, repay)
-                    self.borrowings[bank.code] = 0
-                    bank.equity -= self.borrowings[bank.code] - repay
-                    self.scheduled_repayment_amount[bank.code] = []
+                    self.set_borrowing(bank.code, 0)
+                    bank.equity -= self.borrowings.get(bank.code, 0) - repay
+                    self.clear_scheduled_payment(bank.code)
                     bank.receive(self, repay)
-                    bank.lendings[self.code] = 0
+                    bank.set_lending(self.code, 0)
 
-        print "--->", 'Code:', str(self.code), "bankrupted", "-", "cash", ":", self.cash
+        log.info('bankrupted', code=self.code, cash=self.cash)
 
     # ===================================================================
 
@@ -202,13 +261,10 @@ class Bank(Agent):
         self.update_deposit()
         self.update_cash()
 
-        print "--->", 'Code:', str(self.code), '- cash :', self.cash
-
         # if self.is_bankrupted():
         #     self.bankrupting(banks)
 
-        print 'Code:', str(self.code), 'Balance Sheet', ":", str(self.check_balance_sheet_problem())
-        print 'Code:', str(self.code), "- Name:", self.name, "--> Run", "stage_1"
+        self.log_stage(1)
 
     def stage_2(self, banks):
         '''
@@ -217,47 +273,56 @@ class Bank(Agent):
         banks = self.update_size_score(banks)
         self.update_total_score(banks)
 
-        borrowed_amount = 0
         term = 1 if self.need_short_term_loan() else self.term
 
         # 2.2. Ask for loan
-
-        total_score = [{bank: self.total_score[bank]} for bank in banks]
-        bank_priority = sorted(total_score) # [{bank: 0.5}, ...] desc
         self.ask_amount = self.borrowing_target_amount
-
-        for bank_score in bank_priority:
-            bank = bank_score.keys()[0]
-            print '---> Code', self.code, 'total_score with Bank', bank.code, ":", bank_score.values()[0]
-            bank.available_lending_amount = bank.lending_target_amount
-            bank.limit = bank.lending_target_amount / 5
-            if not bank.is_bankrupted() and bank.is_available_for_lendings():
-                if bank.can_give_a_loan_to(self):
-                    real_borrowing_amount = round(min(self.ask_amount, bank.available_lending_amount, bank.limit), 5)
-                    print '---> Code', self.code, 'lending', '- amount:', real_borrowing_amount,\
-                        "- remaining amount:", self.ask_amount - real_borrowing_amount, \
-                        'Bank:', bank.code, \
-                        "- available amount:", bank.available_lending_amount - real_borrowing_amount
-                    self.ask_amount -= real_borrowing_amount
-                    bank.available_lending_amount -= real_borrowing_amount
-                    if real_borrowing_amount > 0:
-                        scheduling_repayment = [real_borrowing_amount / term for _ in range(term)]\
-                            if real_borrowing_amount > 0 else []
-                        self.borrow(bank, real_borrowing_amount, scheduling_repayment)
-                        bank.lend(self, real_borrowing_amount)
-                        borrowed_amount += real_borrowing_amount
-                        if self.borrowing_amount - borrowed_amount == 0:
-                            break
+        if self.market is not None:
+            borrowed_amount = self.market.match(self, term)
+        else:
+            borrowed_amount = self.ask_for_loans(banks, term)
 
         self.update_relation_score(banks, borrowed_amount)
 
-        print "--->", 'Code:', str(self.code), '- cash :', self.cash
-
         if self.is_bankrupted():
             self.bankrupting(banks)
 
-        print 'Code:', str(self.code), 'Balance Sheet', ":", str(self.check_balance_sheet_problem())
-        print 'Code:', str(self.code), "- Name:", self.name, "--> Run", "stage_2"
+        self.log_stage(2)
+
+    def ask_for_loans(self, banks, term):
+        '''
+        Asks banks for loans in descending order of total score, without a
+        shared InterbankMarket.
+        '''
+        borrowed_amount = 0
+        bank_priority = sorted(banks, key=lambda bank: self.total_score[bank], reverse=True)
+
+        # Lending is not possible for bankrupted or saturated banks, which
+        # cannot change while this bank asks, so decide for all of them at once
+        lenders = [bank for bank in bank_priority if not bank.is_bankrupted() and bank.is_available_for_lendings()]
+        decisions = self.lending_decisions(lenders)
+
+        for bank, accepted in zip(lenders, decisions):
+            log.trace('score', code=self.code, bank=bank.code, score=self.total_score.get(bank))
+            bank.available_lending_amount = bank.lending_target_amount
+            bank.limit = bank.lending_target_amount / 5
+            if accepted:
+                real_borrowing_amount = round(min(self.ask_amount, bank.available_lending_amount, bank.limit), 5)
+                log.debug('loan', code=self.code, bank=bank.code, amount=real_borrowing_amount,
+                          remaining=self.ask_amount - real_borrowing_amount)
+                self.ask_amount -= real_borrowing_amount
+                bank.available_lending_amount -= real_borrowing_amount
+                if real_borrowing_amount > 0:
+                    self.take_loan(bank, real_borrowing_amount, term)
+                    borrowed_amount += real_borrowing_amount
+                    if self.borrowing_amount - borrowed_amount == 0:
+                        break
+        return borrowed_amount
+
+    def take_loan(self, bank, amount, term):
+        scheduling_repayment = [amount / term for _ in range(term)]
+        self.borrow(bank, amount, scheduling_repayment)
+        bank.lend(self, amount)
 
     def stage_3(self, banks):
         '''
@@ -265,19 +330,24 @@ class Bank(Agent):
         '''
         self.update_equity()
 
-        for bank in banks:
-            if self.borrowings.get(bank.code, 0) > 0 and len(self.scheduled_repayment_amount[bank.code]) > 0:
-                repay_amount = self.scheduled_repayment_amount[bank.code].pop(0)
+        for bank in self.lenders_among(banks):
+            repay_amount = self.next_repayment(bank.code)
+            if repay_amount is not None:
                 self.pay(bank, repay_amount)
                 bank.receive(self, repay_amount)
 
-        print 'Code:', str(self.code), 'Balance Sheet', ":", str(self.check_balance_sheet_problem()),\
-            'diff = ', math.fabs(self.total_asset() - self.total_liability())
-        print 'Code:', str(self.code), "- Name:", self.name, "--> Run", "stage_3"
+        self.log_stage(3)
 
     def stage_4(self, banks):
         pass
 
+    def log_stage(self, stage):
+        # the balance sheet check is computed, so only pay for it when traced
+        if log.enabled(DEBUG):
+            log.debug('stage', code=self.code, stage=stage, cash=self.cash,
+                      balanced=self.check_balance_sheet_problem(),
+                      diff=math.fabs(self.total_asset() - self.total_liability()))
+
     # ===================================================================
     # Helper Function used for all process
     def is_available(self):
@@ -286,6 +356,26 @@ class Bank(Agent):
     def other_agents(self, banks):
         return [bank for bank in banks if (self.unique_id != bank.unique_id)] # and (bank.is_available())]
 
+    def lenders_among(self, banks):
+        '''
+        The banks of banks this bank owes money to, in the order of banks.
+        The banks of a schedule are picked by position, so only the lenders
+        are visited.
+        '''
+        codes = [code for code, amount in self.borrowings.items() if amount > 0]
+        if hasattr(banks, 'among'):
+            return banks.among(codes)
+        codes = set(codes)
+        return [bank for bank in banks if bank.code in codes]
+
+    def counterparty_codes(self):
+        '''
+        Codes of the banks this bank lends to or borrows from.
+        '''
+        codes = set(code for code, amount in self.lendings.items() if amount > 0)
+        codes.update(code for code, amount in self.borrowings.items() if amount > 0)
+        return codes
+
     ## Functions related to bankrupt
     def is_bankrupted(self):
         if self.bankrupted:
@@ -303,7 +393,7 @@ class Bank(Agent):
 
     ### Bankrupting process Function
     def recover_rate(self):
-        return np.random.uniform(self.recover_rate_params["min"], self.recover_rate_params["max"])
+        return self.random.uniform(self.recover_rate_params["min"], self.recover_rate_params["max"])
 
     def sell_external_asset(self):
         cash = self.external_asset
@@ -313,63 +403,54 @@ class Bank(Agent):
     def sell_asset(self, banks, recover_rate):
         cash = recover_rate * self.sell_external_asset()
         self.cash += cash
-        print 'Code', self.code, 'sell debt:'
         for bank in banks:
-            if not bank.is_bankrupted() and self.lendings[bank.code] > 0:
+            if not bank.is_bankrupted() and self.lendings.get(bank.code, 0) > 0:
                 debt = recover_rate * self.lendings[bank.code]
+                log.debug('sell_debt', code=self.code, bank=bank.code, cash=bank.cash, debt=debt,
+                          enough_cash=bank.cash >= debt)
                 if bank.cash < debt:
                     # bank.bankrupted = True
-                    print '---> Code', bank.code, 'has not enough cash', "-", "cash", ":", bank.cash, "-", "debt", ":", debt
                     self.bankrupting_processor.add_bank(bank)
-                else:
-                    print '---> Code', bank.code, 'bought debt', "-", "cash", ":", bank.cash, "-", "debt", ":", debt
                 repay_debt = min(bank.cash, debt)
                 bank.cash -= repay_debt
                 self.cash += repay_debt
                 self.cash = round(self.cash, 5)
-                bank.borrowings[self.code] = self.lendings[bank.code] = 0
-                bank.scheduled_repayment_amount[self.code] = []
+                bank.set_borrowing(self.code, 0)
+                self.set_lending(bank.code, 0)
+                bank.clear_scheduled_payment(self.code)
 
     # ===================================================================
     # Stage 1 Helper function
     ##1.1. Set growth rate of EA => Update EA (function to update above)
     def external_asset_growth_rate(self):
-        return np.random.normal(self.growth_rate["external_asset"]["mean"], self.growth_rate["external_asset"]["var"])
+        return self.random.normal(self.growth_rate["external_asset"]["mean"], self.growth_rate["external_asset"]["var"])
 
     ## 1.2. Update target of total asset (compare to EA), update deposit, lending, borrowing as fixed ratio compared with total asset
 
     def update_total_asset_target_amount(self):
         self.total_asset_target_amount = self.external_asset / self.external_asset_target_rate
-        print '---> Code', self.code, 'update_total_asset_target_amount :', self.total_asset_target_amount, "=", \
-            "external_asset(" + str(self.external_asset) + ")/ external_asset_target_rate(" + \
-            str(self.external_asset_target_rate) + ")"
+        log.trace('update_target_amount', code=self.code, target='total_asset', amount=self.total_asset_target_amount)
 
     def update_borrowing_target_amount(self):
         self.borrowing_target_amount = self.total_asset_target_amount * self.borrowing_target_rate
         self.borrowing_target_amount = max(self.borrowing_target_amount - self.total_borrowings(), 0)
-        print '---> Code', self.code, 'update_borrowing_target_amount:', self.borrowing_target_amount, "-", \
-            "total_asset_target_amount(" + str(self.total_asset_target_amount) + ") * borrowing_target_rate(" + \
-            str(self.borrowing_target_rate) + ")", "-", "total_borrowings() :", self.total_borrowings()
+        log.trace('update_target_amount', code=self.code, target='borrowing', amount=self.borrowing_target_amount)
 
     def update_lending_target_amount(self):
         self.lending_target_amount = self.total_asset_target_amount * self.lending_target_rate
         self.available_lending_amount = max(self.lending_target_amount - self.total_lendings(), 0)
-        print '---> Code', self.code, 'update_lending_target_amount:', self.lending_target_amount, "-", \
-            "total_asset_target_amount(" + str(self.total_asset_target_amount) + ") * lending_target_rate(" + \
-            str(self.lending_target_rate) + ")", "-", "total_lendings() :", self.total_lendings()
+        log.trace('update_target_amount', code=self.code, target='lending', amount=self.lending_target_amount)
 
 
     def update_deposit_target_amount(self):
         self.deposit_target_amount = self.total_asset_target_amount * self.deposit_target_rate
-        print '---> Code', self.code, 'update_deposit_target_amount:', self.deposit_target_amount, "-", \
-            "total_asset_target_amount(" + str(self.total_asset_target_amount) + ") * deposit_target_rate(" + \
-            str(self.deposit_target_rate) + ")"
+        log.trace('update_target_amount', code=self.code, target='deposit', amount=self.deposit_target_amount)
 
 
             ## 1.3. Update deposit (Deposit update function above)
     def deposit_noise_rate(self):
         # return np.random.standard_normal(1)[0]
-        return np.random.uniform(-0.02, 0.02)
+        return self.random.uniform(-0.02, 0.02)
 
     # ===================================================================
     # Stage 2 Helper function
@@ -377,7 +458,20 @@ class Bank(Agent):
 
     ## 2.2. helper function for lending decision
     def is_available_for_lendings(self):
-        return max(self.lending_target_amount * self.lending_target_rate - self.total_lendings(), 0) > 0
+        return self.lending_capacity() > 0
+
+    def lending_capacity(self):
+        return max(self.lending_target_amount * self.lending_target_rate - self.total_lendings(), 0)
+
+    def attach_score_engine(self, engine):
+        '''
+        From now on the scores are rows of the engine matrices, updated by
+        the scheduler once per stage instead of by this bank.
+        '''
+        self.score_engine = engine
+        self.relation_score = ScoreRow(engine, 'relation', self)
+        self.size_score = ScoreRow(engine, 'size', self)
+        self.total_score = ScoreRow(engine, 'total', self)
 
     def init_scores(self, banks):
         self.update_relation_score(banks)
@@ -385,21 +479,28 @@ class Bank(Agent):
         self.update_total_score(banks)
 
     def update_relation_score(self, banks, borrowed_amount=None):
+        if self.score_engine is not None:
+            if borrowed_amount is not None:
+                self.score_engine.update_relation(self, borrowed_amount)
+            return
         if borrowed_amount is None:
-            self.relation_score = {bank: fl.relation_score(0, self.total_borrowings()) for bank in banks}
+            self.relation_score = {bank: self.formulas.relation_score(0, self.total_borrowings()) for bank in banks}
         else:
-            self.relation_score = {bank: fl.relation_score(self.relation_score[bank], borrowed_amount) for bank in
-                                   banks}
+            # in place, so a bank that is not live now keeps its score, as in a ScoreEngine row
+            for bank in banks:
+                self.relation_score[bank] = self.formulas.relation_score(self.relation_score[bank], borrowed_amount)
 
     def update_size_score(self, banks):
+        if self.score_engine is not None:
+            return self.score_engine.live_banks(self, banks)
         bank_assets, indicators, live_banks = [], [], []
         for bank in banks:
             if round(bank.total_asset(), 0) > 0:
                 live_banks.append(bank)
                 total_asset = max(bank.total_asset(), 0)
                 bank_assets.append(total_asset)
-                indicators.append(self.relation_indicators[bank.code])
-        tmp = {bank: fl.size_score(bank.total_asset(), bank_assets, indicators) for bank in live_banks}
+                indicators.append(self.relation_indicators.get(bank.code, 0))
+        tmp = {bank: self.formulas.size_score(bank.total_asset(), bank_assets, indicators) for bank in live_banks}
         self.size_score = {}
         if len(live_banks) > 0:
             max_score = max(np.abs(tmp.values()))
@@ -413,28 +514,53 @@ class Bank(Agent):
         return live_banks
 
     def update_total_score(self, banks):
+        if self.score_engine is not None:
+            return
         for bank in banks:
             if bank in self.size_score:
-                score = fl.total_score(weight=TOTAL_SCORE_WEIGHT, score=[self.relation_score[bank], self.size_score[bank]])
+                score = self.formulas.total_score(weight=self.total_score_weight, score=[self.relation_score[bank], self.size_score[bank]])
                 if float(str(score)) == float('Inf') or float(str(score)) == float('nan'):
                     a = 0
                 self.total_score[bank] = score
 
     def alpha(self):
-        if self.is_a_large_bank:
-            return np.random.uniform(0.3, 0.5)
-        return np.random.uniform(0.9, 1.1)
+        return self.random.uniform(*self.alpha_range())
 
     def beta(self):
-        return np.random.uniform(-1.1, -0.9)
+        return self.random.uniform(*self.beta_range())
+
+    def alpha_range(self):
+        return self.alpha_limits
+
+    def beta_range(self):
+        return self.beta_limits
 
     def can_give_a_loan_to(self, bank):
-        probability = fl.lending_decision(self.total_score[bank], self.alpha(), self.beta())
+        probability = self.formulas.lending_decision(self.total_score[bank], self.alpha(), self.beta())
         try:
-            return True if np.random.choice(2, 1, p=[1 - probability, probability])[0] == 1 else False
+            return True if self.random.choice(2, 1, p=[1 - probability, probability])[0] == 1 else False
         except:
             return False
 
+    def lending_decisions(self, lenders):
+        '''
+        can_give_a_loan_to(self) of every lender at once: alpha, beta and the
+        Bernoulli draw come from one block of the pre-generated stream.
+        '''
+        if len(lenders) == 0:
+            return []
+        uniforms = self.random_stream.take(3 * len(lenders)).reshape(3, len(lenders))
+        alpha_ranges = np.array([bank.alpha_range() for bank in lenders], dtype=float)
+        beta_ranges = np.array([bank.beta_range() for bank in lenders], dtype=float)
+        alphas = alpha_ranges[:, 0] + (alpha_ranges[:, 1] - alpha_ranges[:, 0]) * uniforms[0]
+        betas = beta_ranges[:, 0] + (beta_ranges[:, 1] - beta_ranges[:, 0]) * uniforms[1]
+        # a lender without a score for this bank refuses, like a failed draw did
+        if self.score_engine is not None:
+            scores = self.score_engine.scores_towards(self, lenders)
+        else:
+            scores = np.array([bank.total_score.get(self, np.nan) for bank in lenders], dtype=float)
+        return uniforms[2] < self.formulas.lending_decisions(scores, alphas, betas)
+
     # Functions related termed payments (use in stage 2 + stage 3)
     def update_short_term_lending_rate(self):
         self.short_term_lending_rate = self.short_term_lending_rate
@@ -442,18 +568,49 @@ class Bank(Agent):
     def update_short_term_borrowing_rate(self):
         self.short_term_borrowing_rate = self.short_term_borrowing_rate
 
+    def init_relation_indicators(self):
+        return {bank_code: 1 for bank_code, amount in self.lendings.items() if amount > 0}
+
+    def borrowing_codes(self):
+        return list(self.borrowings)
+
     def init_scheduled_payment(self, term):
         self.scheduled_repayment_amount = {}
-        for bank_code in self.borrowings:
+        for bank_code in self.borrowing_codes():
             total_borrowing_amount = self.borrowings[bank_code]
             short_term_payment_amount = self.short_term_borrowing_rate * total_borrowing_amount
             long_term_payment_amount = (1 - self.short_term_borrowing_rate) * total_borrowing_amount
-            self.scheduled_repayment_amount[bank_code] = [0] + [short_term_payment_amount + float(long_term_payment_amount) / term] + [float(long_term_payment_amount) / term] * (term - 1)
+            ladder = [0] + [short_term_payment_amount + float(long_term_payment_amount) / term] + [float(long_term_payment_amount) / term] * (term - 1)
+            if self.ledger is None:
+                self.scheduled_repayment_amount[bank_code] = ladder
+            elif total_borrowing_amount > 0:
+                self.ledger.schedule(self.code, bank_code, ladder)
 
     def need_short_term_loan(self):
-        return True if np.random.uniform(0, 1) < 0.5 else False
+        return True if self.random.uniform(0, 1) < 0.5 else False
+
+    def clear_scheduled_payment(self, bank_code):
+        if self.ledger is not None:
+            self.ledger.clear(self.code, bank_code)
+        else:
+            self.scheduled_repayment_amount[bank_code] = []
+
+    def next_repayment(self, bank_code):
+        '''
+        Takes the repayment due now to bank_code off the schedule, None when
+        nothing is scheduled.
+        '''
+        if self.ledger is not None:
+            return self.ledger.take(self.code, bank_code)
+        if len(self.scheduled_repayment_amount[bank_code]) > 0:
+            return self.scheduled_repayment_amount[bank_code].pop(0)
+        return None
 
     def update_scheduled_payment(self, bank, scheduled_payment):
+        if self.ledger is not None:
+            self.ledger.schedule(self.code, bank.code, scheduled_payment)
+            return
+        self.scheduled_repayment_amount.setdefault(bank.code, [])
         _ = [len(self.scheduled_repayment_amount[bank.code]), len(scheduled_payment)]
         add_term = max(_) - min(_)
         if len(self.scheduled_repayment_amount[bank.code]) != len(scheduled_payment):
@@ -467,16 +624,20 @@ class Bank(Agent):
     # ===================================================================
     # Stage 3 Helper function
     def equity_growth_rate(self):
-        return np.random.normal(self.growth_rate["equity"]["mean"], self.growth_rate["equity"]["var"])
+        return self.random.normal(self.growth_rate["equity"]["mean"], self.growth_rate["equity"]["var"])
 
     def round_scheduled_repayment_amount(self):
+        if self.ledger is not None:
+            return {bank_code: [round(_, 5) for _ in ladder] for bank_code, ladder in self.ledger.ladders(self.code).items()}
         return {bank_code: [round(_, 5) \
                             for _ in self.scheduled_repayment_amount[bank_code]]\
                 for bank_code in self.scheduled_repayment_amount}
 
-    def set_shock(self, be_shocked=True):
+    def set_shock(self, be_shocked=True, shock_rate=None):
         self.is_shocked = be_shocked
+        if shock_rate is not None:
+            self.shock_rate = shock_rate
 
     def get_shock_rate(self):
         self.is_shocked = False
-        return 0.5
\ No newline at end of file
+        return self.shock_rate
\ No newline at end of file
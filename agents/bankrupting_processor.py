@@ -1,12 +1,31 @@
+from collections import deque
+
 from agents.bank import Bank
 from mesa import Agent
+from model.clearing import clearing_vector, network_of
+from utils.logger import log
 
 class BankruptingProcessor(Agent):
-    def __init__(self, context={}):
+    '''
+    Cascade engine of the model. Defaulted banks are processed from a
+    deduplicated FIFO worklist, each one only against the banks it actually
+    lends to or borrows from, so a cascade unfolds in rounds: the banks
+    pushed by a default of round d are processed in round d + 1.
+    '''
+    def __init__(self, context={}, clearing=False):
         self.unique_id = 'BankruptingProcessor'
         # context = {"banks": [bank_1, bank_2, ...]}
-        self.context = context
-        self.bankrupted_bank = []
+        self.set_context(context)
+        self.bankrupted_bank = deque()
+        self.queued = set()
+        # depth of the bank being processed, None outside of a cascade
+        self.depth = None
+        # clearing = True also records the Eisenberg-Noe defaults of every cascade
+        self.clearing = clearing
+        # one record per cascade: {"defaults", "rounds", "depth"} (+ "clearing_defaults", "clearing_rounds")
+        self.cascades = []
+        # clock() timing every cascade in its record as "seconds", None not to time them
+        self.clock = None
 
         self.cash = 0
         self.equity = 0
@@ -21,15 +40,47 @@ class BankruptingProcessor(Agent):
 
     def set_context(self, context):
         self.context = context
+        # position of every bank, to process counterparties in the context order
+        self.position = {bank.code: i for i, bank in enumerate(context.get("banks", []))}
 
     def add_bank(self, bank):
-        self.bankrupted_bank.append(bank)
+        if bank.code in self.queued:
+            return
+        self.queued.add(bank.code)
+        self.bankrupted_bank.append((bank, self.depth + 1 if self.depth is not None else 0))
+
+    def counterparties(self, bank):
+        banks = self.context["banks"]
+        return [banks[i] for i in sorted(self.position[code] for code in bank.counterparty_codes()
+                                        if code in self.position)]
 
     def processing(self):
-        while self.bankrupted_bank.__len__() > 0:
-            bank = self.bankrupted_bank.pop()
-            banks = bank.other_agents(self.context["banks"])
-            bank.bankrupting(banks)
+        if not self.bankrupted_bank:
+            return
+        start = self.clock() if self.clock is not None else None
+        cascade = {"defaults": 0, "rounds": 0, "depth": 0}
+        if self.clearing:
+            payments, defaults, rounds = clearing_vector(*network_of(self.context["banks"]))
+            cascade["clearing_defaults"] = int(defaults.sum())
+            cascade["clearing_rounds"] = rounds
+
+        # queued is kept until the worklist is empty, so every bank is
+        # processed at most once per cascade
+        while self.bankrupted_bank:
+            bank, depth = self.bankrupted_bank.popleft()
+            self.depth = depth
+            bank.bankrupting(self.counterparties(bank))
+            cascade["defaults"] += 1
+            cascade["depth"] = max(cascade["depth"], depth)
+        # The first round is the banks queued before processing
+        cascade["rounds"] = cascade["depth"] + 1
+        self.queued = set()
+        self.depth = None
+
+        if start is not None:
+            cascade["seconds"] = self.clock() - start
+        self.cascades.append(cascade)
+        log.debug('cascade', **cascade)
 
     def round_scheduled_repayment_amount(self):
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,122 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+
+import numpy as np
+
+from model.model import CreditContagionModel
+from model.distributions import derive_seed
+from model.pool import run_pool
+from model.scenarios import summarize, SUMMARY_VALUES
+
+TASK_FIELDS = ['shock_type', 'shocked_bank_number', 'test_case', 'seed']
+SUMMARY_FIELDS = TASK_FIELDS + SUMMARY_VALUES
+
+
+def build_tasks(replications, shock_types, shocked_bank_numbers, initial_bank, base_seed=0, engine='dict',
+                export=False):
+    '''
+    One task per (shock_type, shocked_bank_number, test_case). Each task gets
+    its own seed derived from base_seed and its description, so any single
+    replication can be re-run on its own and gives the same result.
+    '''
+    tasks = []
+    for shock_type, shocked_bank_number, test_case in itertools.product(shock_types, shocked_bank_numbers,
+                                                                        range(replications)):
+        tasks.append({
+            "shock_type": shock_type,
+            "shocked_bank_number": shocked_bank_number,
+            "test_case": test_case,
+            "initial_bank": initial_bank,
+            "seed": derive_seed(base_seed, shock_type, shocked_bank_number, test_case),
+            "engine": engine,
+            "export": export,
+        })
+    return tasks
+
+
+def run_replication(task):
+    model = CreditContagionModel(shock_type=task["shock_type"], shocked_bank_number=task["shocked_bank_number"],
+                                 initial_bank=task["initial_bank"], test_case=task["test_case"],
+                                 engine=task["engine"], seed=task["seed"], reports=task["export"])
+    model.run_model()
+    if task["export"]:
+        model.export_report()
+
+    return dict({field: task[field] for field in TASK_FIELDS}, **summarize(model))
+
+
+def print_progress(done, total):
+    sys.stdout.write('\r%d/%d replications' % (done, total) + ('\n' if done == total else ''))
+    sys.stdout.flush()
+
+
+def run_batch(tasks, processes=None, progress=print_progress):
+    '''
+    Runs the tasks over a process pool and returns their summaries ordered
+    like the tasks. processes=1 runs in the current process.
+    '''
+    return run_pool(run_replication, tasks, processes, progress)
+
+
+def aggregate(results):
+    '''
+    Mean, standard deviation, min and max of the summary values per scenario.
+    '''
+    scenarios = {}
+    for result in results:
+        scenarios.setdefault((result["shock_type"], result["shocked_bank_number"]), []).append(result)
+
+    rows = []
+    for (shock_type, shocked_bank_number), group in sorted(scenarios.items()):
+        row = {"shock_type": shock_type, "shocked_bank_number": shocked_bank_number, "replications": len(group)}
+        for field in SUMMARY_VALUES:
+            values = np.array([result[field] for result in group], dtype=float)
+            row[field + "_mean"] = values.mean()
+            row[field + "_std"] = values.std()
+            row[field + "_min"] = values.min()
+            row[field + "_max"] = values.max()
+        rows.append(row)
+    return rows
+
+
+def write_csv(file_path, rows, fields):
+    directory = os.path.dirname(file_path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(file_path, 'wb') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def export_batch(results, directory='statistic_reports/batch'):
+    write_csv(os.path.join(directory, 'replications.csv'), results, SUMMARY_FIELDS)
+    scenarios = aggregate(results)
+    if scenarios:
+        fields = ['shock_type', 'shocked_bank_number', 'replications'] + \
+                 sorted(key for key in scenarios[0] if key not in ['shock_type', 'shocked_bank_number', 'replications'])
+        write_csv(os.path.join(directory, 'scenarios.csv'), scenarios, fields)
+    return scenarios
+
+
+if __name__ == '__main__':
+    from data.banks_1 import params
+
+    parser = argparse.ArgumentParser(description='Monte Carlo replications of the credit contagion model')
+    parser.add_argument('--replications', type=int, default=10)
+    parser.add_argument('--shock-type', action='append', dest='shock_types')
+    parser.add_argument('--shocked-bank-number', type=int, action='append', dest='shocked_bank_numbers')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='dict', choices=['dict', 'array'])
+    parser.add_argument('--export', action='store_true', help='also write the per replication reports')
+    parser.add_argument('--output', default='statistic_reports/batch')
+    args = parser.parse_args()
+
+    tasks = build_tasks(args.replications, args.shock_types or ['Idiosyncratic Shock'],
+                        args.shocked_bank_numbers or [1], params.__len__(), args.seed, args.engine, args.export)
+    export_batch(run_batch(tasks, args.processes), args.output)
@@ -0,0 +1,77 @@
+'''
+Real schedule steps with the "all banks but me" views of BankIndex (views)
+and with a new list per bank and stage, as other_agents made them (lists).
+Every case runs in a fresh process, and the memory growth of building the
+model and of stepping it are measured apart (see model.metrics.PeakMemory),
+so stepping is not hidden behind a higher peak of the construction:
+
+    python -m benchmarks.other_banks --banks 100 300 --steps 3
+'''
+import argparse
+import itertools
+import json
+import multiprocessing
+import time
+
+from data.generator import generate_population
+from model.metrics import PeakMemory
+from schedule import BankIndex
+
+STAGES = [1, 2, 3, 4]
+
+
+def copied_others(index, bank):
+    return [other for other in index.banks if other is not bank]
+
+
+def run_case(case):
+    from model.model import CreditContagionModel
+
+    if case["others"] == 'lists':
+        # this process only runs this case
+        BankIndex.others = copied_others
+    memory = PeakMemory()
+    memory.enter()
+    population = generate_population(case["banks"], density=case["density"], seed=case["seed"])
+    model = CreditContagionModel(engine=case["engine"], population=population, reports=False, seed=case["seed"])
+    construction_memory = memory.exit()
+    schedule = model.schedule
+    memory.enter()
+    start = time.time()
+    for step in range(case["steps"]):
+        schedule.set_run_time(step)
+        for stage in STAGES:
+            schedule.step(stage, cycle_stage=len(STAGES))
+    seconds = time.time() - start
+    # bytes
+    return dict(case, seconds_per_step=seconds / case["steps"], bankrupted_banks=schedule.number_bankrupted_bank(),
+                memory=memory.mode, construction_memory=construction_memory, step_memory=memory.exit())
+
+
+def build_cases(sizes, engines, steps=5, density=0.1, seed=0):
+    return [{"banks": size, "engine": engine, "others": others, "steps": steps, "density": density, "seed": seed}
+            for size, engine, others in itertools.product(sizes, engines, ['lists', 'views'])]
+
+
+def run_cases(cases):
+    results = []
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        for result in pool.imap(run_case, cases):
+            results.append(result)
+            print json.dumps(result, sort_keys=True)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banks', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--engine', action='append', dest='engines', choices=['dict', 'array'])
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--density', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    run_cases(build_cases(args.banks, args.engines or ['dict'], args.steps, args.density, args.seed))
@@ -0,0 +1,150 @@
+'''
+Times CreditContagionModel on synthetic populations and writes one JSON
+line per case, so the results of two revisions can be compared:
+
+    python -m benchmarks.suite --banks 10 100 1000 --output new.jsonl
+    python -m benchmarks.suite --compare old.jsonl new.jsonl
+
+Every case runs in its own process, in a temporary directory, so the peak
+resident memory and the report files belong to that case only.
+'''
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+from data.generator import generate_population, TOPOLOGIES
+from model.metrics import FORMULAS
+
+SECTIONS = ['construction', 'run_model', 'stage_1', 'stage_2', 'stage_3', 'stage_4', 'cascade', 'collect',
+            'report']
+
+
+def revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(case):
+    from model.model import CreditContagionModel
+
+    population = generate_population(case["banks"], case["topology"], case["density"], case["seed"])
+    directory = tempfile.mkdtemp(prefix='benchmark_')
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        start = time.time()
+        model = CreditContagionModel(shock_type=case["shock_type"], shocked_bank_number=case["shocked_bank_number"],
+                                     initial_bank=case["banks"], stable_count_limit=case["stable_count_limit"],
+                                     engine=case["engine"], seed=case["seed"], reports=case["reports"],
+                                     collector=case["collector"], population=population, metrics=True)
+        metrics = model.metrics
+        metrics.seconds['construction'] = time.time() - start
+
+        model.run_model()
+        if case["reports"]:
+            model.export_report()
+        schedule = model.schedule
+        steps = schedule.get_run_time()
+        bankrupted = schedule.number_bankrupted_bank()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return dict(case, steps=steps, bankrupted_banks=bankrupted,
+                seconds={section: metrics.seconds[section] for section in SECTIONS},
+                calls={formula: metrics.calls[formula] for formula in FORMULAS},
+                # kilobytes on Linux
+                peak_memory=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def build_cases(sizes, shock_types, engines, topologies=('erdos_renyi',), density=0.1, seed=0,
+                shocked_bank_number=1, stable_count_limit=10, reports=False, collector='mesa'):
+    return [{"banks": size, "shock_type": shock_type, "engine": engine, "topology": topology, "density": density,
+             "seed": seed, "shocked_bank_number": shocked_bank_number, "stable_count_limit": stable_count_limit,
+             "reports": reports, "collector": collector}
+            for size, shock_type, engine, topology in itertools.product(sizes, shock_types, engines, topologies)]
+
+
+def run_suite(cases, output=None):
+    meta = {"revision": revision(), "python": platform.python_version(), "machine": platform.machine()}
+    results = []
+    # a fresh process per case keeps peak_memory per case
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        for result in pool.imap(run_case, cases):
+            result.update(meta)
+            results.append(result)
+            line = json.dumps(result, sort_keys=True)
+            print line
+            if output is not None:
+                with open(output, 'a') as results_file:
+                    results_file.write(line + '\n')
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+CASE_KEYS = ["banks", "shock_type", "engine", "topology", "density", "collector", "reports"]
+
+
+def case_key(result):
+    return tuple(result.get(key) for key in CASE_KEYS)
+
+
+def load_results(path):
+    with open(path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+def compare(baseline, current):
+    '''
+    Ratio current / baseline of every section time of the cases in both files.
+    '''
+    baseline = {case_key(result): result for result in baseline}
+    rows = []
+    for result in current:
+        old = baseline.get(case_key(result))
+        if old is None:
+            continue
+        ratios = {section: result["seconds"][section] / old["seconds"][section]
+                  for section in SECTIONS if old["seconds"][section] > 0}
+        rows.append(dict(zip(CASE_KEYS, case_key(result)),
+                         ratios=ratios, memory_ratio=float(result["peak_memory"]) / old["peak_memory"]))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banks', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--shock-type', action='append', dest='shock_types')
+    parser.add_argument('--engine', action='append', dest='engines', choices=['dict', 'array'])
+    parser.add_argument('--topology', action='append', dest='topologies', choices=TOPOLOGIES)
+    parser.add_argument('--density', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shocked-bank-number', type=int, default=1)
+    parser.add_argument('--stable-count-limit', type=int, default=10)
+    parser.add_argument('--reports', action='store_true', help='also time the per step report files')
+    parser.add_argument('--collector', default='mesa', choices=['mesa', 'columnar', 'parquet'])
+    parser.add_argument('--output', help='appends the results to this JSON lines file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'))
+    args = parser.parse_args()
+
+    if args.compare:
+        for row in compare(load_results(args.compare[0]), load_results(args.compare[1])):
+            print json.dumps(row, sort_keys=True)
+    else:
+        run_suite(build_cases(args.banks, args.shock_types or ['Idiosyncratic Shock'], args.engines or ['dict'],
+                              args.topologies or ['erdos_renyi'], args.density, args.seed, args.shocked_bank_number, args.stable_count_limit,
+                              args.reports, args.collector), args.output)
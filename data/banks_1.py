@@ -0,0 +1,4 @@
+from data.generator import generate_population
+
+# Default population of CreditContagionModel and run.py, generated instead of written by hand
+params, lending_borrowing_matrix = generate_population(100, 'core_periphery', density=0.1, seed=1).to_params()
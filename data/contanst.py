@@ -6,4 +6,9 @@ TOTAL_SCORE_WEIGHT = [0.3, 0.7]
 
 SHOCK_RATE = 0.01
 
-LENDING_COUNT = 5
\ No newline at end of file
+LENDING_COUNT = 5
+
+# Ranges of the lending decision parameters alpha and beta drawn by a lender
+ALPHA_RANGE = (0.9, 1.1)
+LARGE_BANK_ALPHA_RANGE = (0.3, 0.5)
+BETA_RANGE = (-1.1, -0.9)
\ No newline at end of file
@@ -0,0 +1,214 @@
+import numpy as np
+
+TOPOLOGIES = ['erdos_renyi', 'scale_free', 'core_periphery']
+
+GROWTH_RATE = {
+    "deposit": {"mean": 0.01, "var": 0.02},
+    "external_asset": {"mean": 0.015, "var": 0.025},
+    "equity": {"mean": 0.02, "var": 0.01}
+}
+
+
+class Population(object):
+    '''
+    Balance sheets of a generated bank network as arrays. Exposures are kept
+    sparse: values[k] is the amount lent by bank rows[k] to bank cols[k].
+
+    Every bank satisfies cash + lendings + external_asset ==
+    deposit + borrowings + equity.
+    '''
+    def __init__(self, codes, cash, external_asset, equity, rows, cols, values, large_bank_rate=0.1):
+        self.codes = list(codes)
+        self.rows = rows
+        self.cols = cols
+        self.values = values
+        self.cash = cash
+        self.external_asset = external_asset
+        self.lending_total = np.bincount(rows, weights=values, minlength=len(self.codes))
+        self.borrowing_total = np.bincount(cols, weights=values, minlength=len(self.codes))
+
+        total = self.total_asset()
+        self.equity = equity
+        self.deposit = total - equity - self.borrowings()
+        self.large_bank = total >= np.percentile(total, 100 * (1 - large_bank_rate)) if len(total) > 0 \
+            else np.zeros(0, dtype=bool)
+        # directory the population was loaded from by data.store, None when built in memory
+        self.directory = None
+
+    def size(self):
+        return len(self.codes)
+
+    def lendings(self):
+        return self.lending_total
+
+    def borrowings(self):
+        return self.borrowing_total
+
+    def total_asset(self):
+        return self.cash + self.lendings() + self.external_asset
+
+    def total_liability(self):
+        return self.deposit + self.borrowings() + self.equity
+
+    def exposure_matrix(self):
+        exposures = np.zeros((self.size(), self.size()))
+        exposures[self.rows, self.cols] = self.values
+        return exposures
+
+    def bank_params(self, i, lendings=None, borrowings=None):
+        '''
+        Bank params of bank i shaped like data/banks, without the interbank
+        dicts unless given.
+        '''
+        lending_total, borrowing_total = float(self.lending_total[i]), float(self.borrowing_total[i])
+        total = float(self.cash[i] + self.lending_total[i] + self.external_asset[i])
+        params = {
+            "code": self.codes[i],
+            "asset": {"total": total, "cash": float(self.cash[i]), "interbank_asset": lending_total,
+                      "external_asset": float(self.external_asset[i])},
+            "liability": {"total": total, "deposit": float(self.deposit[i]),
+                          "interbank_liability": borrowing_total, "equity": float(self.equity[i])},
+            "growth_rate": GROWTH_RATE,
+            "short_term_lending_rate": 0.8,
+            "short_term_borrowing_rate": 0.8,
+            "lending_target_rate": 0.2,
+            "borrowing_target_rate": 0.2,
+            "recover_rate": {"min": 0.5, "max": 0.8},
+            "large_bank": bool(self.large_bank[i])
+        }
+        if lendings is not None:
+            params["lendings"] = lendings
+        if borrowings is not None:
+            params["borrowings"] = borrowings
+        return params
+
+    def iter_params(self, chunk_size=1000):
+        '''
+        Yields the bank params chunk by chunk, each bank with its nonzero
+        lendings and borrowings only.
+        '''
+        order = np.argsort(self.rows, kind='mergesort')
+        lending_starts = np.searchsorted(self.rows[order], np.arange(self.size() + 1))
+        borrowing_order = np.argsort(self.cols, kind='mergesort')
+        borrowing_starts = np.searchsorted(self.cols[borrowing_order], np.arange(self.size() + 1))
+        for start in range(0, self.size(), chunk_size):
+            chunk = []
+            for i in range(start, min(start + chunk_size, self.size())):
+                lent = order[lending_starts[i]:lending_starts[i + 1]]
+                borrowed = borrowing_order[borrowing_starts[i]:borrowing_starts[i + 1]]
+                chunk.append(self.bank_params(
+                    i, {self.codes[self.cols[k]]: float(self.values[k]) for k in lent},
+                    {self.codes[self.rows[k]]: float(self.values[k]) for k in borrowed}))
+            yield chunk
+
+    def to_params(self):
+        '''
+        params and the full lending_borrowing_matrix dict of dicts read by
+        CreditContagionModel. O(N^2), only meant for small populations.
+        '''
+        exposures = self.exposure_matrix()
+        params = [self.bank_params(i) for i in range(self.size())]
+        lending_borrowing_matrix = {code: dict(zip(self.codes, exposures[i].tolist()))
+                                    for i, code in enumerate(self.codes)}
+        return params, lending_borrowing_matrix
+
+
+# ===================================================================
+# Topologies: each one yields the (rows, cols) of the links of a chunk of
+# lenders, without self loops or duplicates
+
+def sample_links(rng, lenders, counts, targets, probabilities=None):
+    '''
+    counts[k] links from lenders[k] to banks drawn among targets.
+    '''
+    rows = np.repeat(lenders, counts)
+    if probabilities is None:
+        cols = targets[rng.randint(0, len(targets), len(rows))] if len(targets) > 0 else rows[:0]
+    else:
+        cols = targets[np.searchsorted(np.cumsum(probabilities), rng.uniform(size=len(rows)) * probabilities.sum())
+                       .clip(0, len(targets) - 1)]
+    keep = rows != cols
+    return unique_links(rows[keep], cols[keep])
+
+
+def unique_links(rows, cols):
+    size = max(rows.max(), cols.max()) + 1 if len(rows) > 0 else 1
+    links = np.unique(rows.astype(np.int64) * size + cols)
+    return (links // size).astype(np.int64), (links % size).astype(np.int64)
+
+
+def erdos_renyi(rng, lenders, size, density):
+    counts = rng.binomial(size - 1, density, len(lenders))
+    return sample_links(rng, lenders, counts, np.arange(size))
+
+
+def scale_free(rng, lenders, size, density, weights):
+    '''
+    Chung-Lu graph: the expected degree of a bank is proportional to its
+    weight, power law distributed, and links go to banks in proportion to
+    their weight.
+    '''
+    expected = weights[lenders] * density * (size - 1) / weights.mean()
+    counts = np.minimum(rng.poisson(expected), size - 1)
+    return sample_links(rng, lenders, counts, np.arange(size), weights)
+
+
+def scale_free_weights(rng, size, exponent=2.5):
+    return (1 - rng.uniform(size=size)) ** (-1. / (exponent - 1))
+
+
+def core_periphery(rng, lenders, size, density, core_rate=0.1, core_density=0.8):
+    '''
+    A dense core lending to each other, the periphery only linked to the
+    core. The periphery density is set so that the overall density holds.
+    '''
+    core_size = max(int(round(size * core_rate)), 1)
+    core, periphery = np.arange(core_size), np.arange(core_size, size)
+    # links: core_density * core^2 + 2 * periphery_density * core * periphery
+    periphery_density = (density * size * (size - 1) - core_density * core_size * (core_size - 1)) / \
+        max(2. * core_size * len(periphery), 1)
+    periphery_density = min(max(periphery_density, 0), 1)
+
+    in_core = lenders < core_size
+    core_rows, core_cols = sample_links(rng, lenders[in_core], rng.binomial(core_size - 1, core_density,
+                                                                              in_core.sum()), core)
+    out_rows, out_cols = sample_links(rng, lenders[in_core], rng.binomial(len(periphery), periphery_density,
+                                                                          in_core.sum()), periphery)
+    in_rows, in_cols = sample_links(rng, lenders[~in_core], rng.binomial(core_size, periphery_density,
+                                                                         (~in_core).sum()), core)
+    return np.concatenate([core_rows, out_rows, in_rows]), np.concatenate([core_cols, out_cols, in_cols])
+
+
+def generate_population(size, topology='erdos_renyi', density=0.1, seed=None, chunk_size=1000, amount=(1, 10),
+                        **options):
+    '''
+    Generates size banks linked by topology, chunk_size lenders at a time,
+    so no N x N structure is ever built. Extra options go to the topology
+    (exponent for scale_free, core_rate and core_density for core_periphery).
+    '''
+    if topology not in TOPOLOGIES:
+        raise ValueError("Unknown topology: %s" % topology)
+    rng = np.random.RandomState(seed)
+    if topology == 'scale_free':
+        options.setdefault("weights", scale_free_weights(rng, size, options.pop("exponent", 2.5)))
+    link = {'erdos_renyi': erdos_renyi, 'scale_free': scale_free, 'core_periphery': core_periphery}[topology]
+
+    rows, cols = [], []
+    for start in range(0, size, chunk_size):
+        chunk_rows, chunk_cols = link(rng, np.arange(start, min(start + chunk_size, size)), size, density, **options)
+        rows.append(chunk_rows)
+        cols.append(chunk_cols)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    values = rng.uniform(amount[0], amount[1], len(rows))
+
+    borrowings = np.bincount(cols, weights=values, minlength=size)
+    cash = rng.uniform(10, 30, size)
+    # enough external assets for the deposits to stay positive
+    external_asset = rng.uniform(50, 150, size) + 2 * borrowings
+    total = cash + np.bincount(rows, weights=values, minlength=size) + external_asset
+    equity = rng.uniform(0.1, 0.2, size) * total
+
+    width = len(str(max(size - 1, 0)))
+    codes = ["B%0*d" % (width, i) for i in range(size)]
+    return Population(codes, cash, external_asset, equity, rows, cols, values)
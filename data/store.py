@@ -0,0 +1,94 @@
+'''
+Populations saved as a directory of .npy files, memory mapped when loaded:
+the worker processes of a parallel run share one copy of them through the
+page cache instead of holding their own.
+
+    codes.npy, cash.npy, external_asset.npy, equity.npy, large_bank.npy
+    indptr.npy, indices.npy, data.npy   exposures in CSR, row i = lendings of bank i
+    rows.npy, keys.npy, order.npy,      index of the CSR searched by model.sparse.SparseExposures
+    col_indptr.npy
+    exposures.npy                       dense N x N exposures, when saved with dense=True
+'''
+import os
+
+import numpy as np
+
+from data.generator import Population
+from model.sparse import csr_index
+
+BALANCE_SHEET = ['cash', 'external_asset', 'equity', 'large_bank']
+CSR_INDEX = ['rows', 'keys', 'order', 'col_indptr']
+
+
+def save_population(directory, population, dense=False):
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    np.save(os.path.join(directory, 'codes.npy'), np.array([str(code) for code in population.codes]))
+    for name in BALANCE_SHEET:
+        np.save(os.path.join(directory, name + '.npy'), getattr(population, name))
+
+    order = np.lexsort((population.cols, population.rows))
+    indptr = np.searchsorted(population.rows[order], np.arange(population.size() + 1)).astype(np.int64)
+    indices = population.cols[order].astype(np.int64)
+    np.save(os.path.join(directory, 'indptr.npy'), indptr)
+    np.save(os.path.join(directory, 'indices.npy'), indices)
+    np.save(os.path.join(directory, 'data.npy'), population.values[order].astype(np.float64))
+    # built once here rather than by every process loading the population
+    for name, values in zip(CSR_INDEX, csr_index(population.size(), indptr, indices)):
+        np.save(os.path.join(directory, name + '.npy'), values.astype(np.int64))
+
+    if dense:
+        # written through a map, so the matrix is never held in memory
+        exposures = np.lib.format.open_memmap(os.path.join(directory, 'exposures.npy'), mode='w+',
+                                              dtype=np.float64, shape=(population.size(), population.size()))
+        exposures[population.rows, population.cols] = population.values
+        exposures.flush()
+        del exposures
+
+
+def load_population(directory):
+    '''
+    Population saved in directory. Its exposures stay in the mapped files,
+    read only.
+    '''
+    def load(name, mmap_mode=None):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+    indptr = load('indptr')
+    if os.path.exists(os.path.join(directory, 'rows.npy')):
+        rows = load('rows', 'r')
+    else:
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    population = Population([str(code) for code in load('codes')], load('cash'), load('external_asset'),
+                            load('equity'), rows, load('indices', 'r'), load('data', 'r'))
+    population.large_bank = load('large_bank')
+    population.directory = directory
+    return population
+
+
+def csr_exposures(directory):
+    '''
+    indptr, indices, data and the CSR index of the exposures, the index
+    None when the directory was saved without it. data is mapped
+    copy-on-write, so a model changing amounts only copies those pages,
+    the other arrays are mapped read only.
+    '''
+    def load(name, mmap_mode='r'):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode)
+
+    index = None
+    if all(os.path.exists(os.path.join(directory, name + '.npy')) for name in CSR_INDEX):
+        index = tuple(load(name) for name in CSR_INDEX)
+    return load('indptr'), load('indices'), load('data', 'c'), index
+
+
+def has_dense_exposures(directory):
+    return os.path.exists(os.path.join(directory, 'exposures.npy'))
+
+
+def dense_exposures(directory):
+    '''
+    Copy-on-write map of the dense exposures: the pages a model changes
+    become private to it, the file and the other models never see them.
+    '''
+    return np.load(os.path.join(directory, 'exposures.npy'), mmap_mode='c')
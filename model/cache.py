@@ -0,0 +1,185 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from data.generator import Population
+from model import CreditContagionModel, report_directory
+from scenarios import summarize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Sources whose changes make every cached result stale
+SOURCES = ['agents/*.py', 'data/*.py', 'model/*.py', 'utils/*.py', 'schedule.py']
+
+_code_version = None
+
+
+def code_version():
+    '''
+    Hash of the model sources, uncommitted changes included.
+    '''
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for pattern in SOURCES:
+            for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+                digest.update(os.path.relpath(path, ROOT).encode('utf-8'))
+                with open(path, 'rb') as source:
+                    digest.update(source.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def population_digest(population):
+    '''
+    Hash of the bank params and exposures of a population, either a
+    generated Population or (params, lending_borrowing_matrix).
+    '''
+    digest = hashlib.sha256()
+    if isinstance(population, Population):
+        for values in [population.cash, population.external_asset, population.equity, population.rows,
+                       population.cols, population.values]:
+            digest.update(np.ascontiguousarray(values).tobytes())
+        digest.update(json.dumps(population.codes).encode('utf-8'))
+    else:
+        digest.update(json.dumps(population, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def run_key(options, limit_step):
+    '''
+    Key of a run from the model arguments. Values that are not JSON, like
+    a Convergence, are keyed by their repr, so they never hit another run.
+    '''
+    options = dict(options)
+    description = {"population": population_digest(options.pop("population")), "options": options,
+                   "limit_step": limit_step, "code": code_version()}
+    return hashlib.sha256(json.dumps(description, sort_keys=True, default=repr).encode('utf-8')).hexdigest()[:32]
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(parent, name))
+               for parent, _, names in os.walk(directory) for name in names)
+
+
+class ResultCache(object):
+    '''
+    Content addressed store of finished runs. Entry <key>/ holds
+    summary.json and, under files/, the report files of the run. Reading an
+    entry marks it as used; once the store holds more than max_bytes the
+    least recently used entries are evicted, never the one just stored.
+    '''
+    def __init__(self, directory='statistic_reports/cache', max_bytes=1 << 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        summary_path = os.path.join(self.path(key), 'summary.json')
+        if not os.path.exists(summary_path):
+            return None
+        os.utime(summary_path, None)
+        with open(summary_path) as summary_file:
+            return json.load(summary_file)
+
+    def put(self, key, summary, files=None):
+        '''
+        Stores summary and a copy of the files directory. The entry is
+        built aside and renamed, so a reader never sees half of it.
+        '''
+        if os.path.exists(self.path(key)):
+            return
+        entry = tempfile.mkdtemp(prefix='.' + key, dir=self.directory)
+        try:
+            if files is not None and os.path.exists(files):
+                shutil.copytree(files, os.path.join(entry, 'files'))
+            with open(os.path.join(entry, 'summary.json'), 'w') as summary_file:
+                json.dump(summary, summary_file)
+            os.rename(entry, self.path(key))
+        except OSError:
+            # another process stored the same run first
+            if not os.path.exists(self.path(key)):
+                raise
+        finally:
+            shutil.rmtree(entry, ignore_errors=True)
+        self.evict(keep=key)
+
+    def restore(self, key, target):
+        '''
+        Replaces target with the cached report files, so no file of another
+        run is left next to them.
+        '''
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        files = os.path.join(self.path(key), 'files')
+        if os.path.exists(files):
+            shutil.copytree(files, target)
+        else:
+            os.makedirs(target)
+
+    def entries(self):
+        '''
+        (last use, size, key) of every entry, least recently used first.
+        '''
+        entries = []
+        for key in os.listdir(self.directory):
+            summary_path = os.path.join(self.path(key), 'summary.json')
+            if not key.startswith('.') and os.path.exists(summary_path):
+                entries.append((os.path.getmtime(summary_path), directory_size(self.path(key)), key))
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        '''
+        Removes the least recently used entries but keep until the store
+        holds max_bytes at most, or only keep.
+        '''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.path(key), ignore_errors=True)
+            total -= size
+
+
+def run_cached(cache, limit_step=1, **options):
+    '''
+    Summary of CreditContagionModel(**options).run_model(limit_step), with
+    its reports exported, or of the same run found in cache, whose report
+    files are then put back in place. Runs without a seed are not
+    reproducible, so they always run and are not cached.
+    '''
+    if options.get("population") is None:
+        from data.banks_1 import params, lending_borrowing_matrix
+        options["population"] = (params, lending_borrowing_matrix)
+    reports = options.get("reports", True)
+    directory = report_directory(options.get("shock_type", 'Type_1'), options.get("test_case", 0))
+
+    key = run_key(options, limit_step) if options.get("seed") is not None else None
+    summary = cache.get(key) if key is not None else None
+    if summary is not None:
+        if reports:
+            cache.restore(key, directory)
+        return summary
+
+    # stale files of an earlier run of the same test case would be cached along
+    if reports and os.path.exists(directory):
+        shutil.rmtree(directory)
+    model = CreditContagionModel(**options)
+    model.run_model(limit_step)
+    if reports:
+        model.export_report()
+    summary = summarize(model)
+    if key is not None:
+        cache.put(key, summary, directory if reports else None)
+    return summary
@@ -0,0 +1,203 @@
+import json
+import random
+
+import numpy as np
+
+from agents.bank import Bank
+from distributions import HAS_GENERATOR
+
+# Balance sheet and stage variables of a bank, besides its exposures
+BANK_FIELDS = ["cash", "deposit", "equity", "external_asset", "total_asset_target_amount",
+               "borrowing_target_amount", "lending_target_amount", "deposit_target_amount", "borrowing_amount",
+               "lending_amount", "lending_count", "ask_amount", "available_lending_amount", "shock_rate",
+               "lending_total", "borrowing_total"]
+BANK_FLAGS = ["bankrupted", "is_shocked", "is_affected_by_bankrupting"]
+SCORES = ["relation_score", "size_score", "total_score"]
+
+VERSION = 3
+
+
+def save_checkpoint(model, path):
+    '''
+    Writes the whole simulation state of model between two steps to a
+    compressed .npz file or file object: balance sheets, exposures,
+    repayment ladders, scores, scheduler time, run progress and the states
+    of the random number generators. Reports already collected are not
+    part of it.
+    '''
+    banks = model.banks
+    codes = [bank.code for bank in banks]
+    position = {code: i for i, code in enumerate(codes)}
+    arrays = {"codes": np.array(codes)}
+
+    for field in BANK_FIELDS:
+        arrays[field] = np.array([getattr(bank, field, 0) for bank in banks], dtype=float)
+    for flag in BANK_FLAGS:
+        arrays[flag] = np.array([bool(getattr(bank, flag)) for bank in banks])
+    # exposures as COO: values[k] lent by bank rows[k] to bank cols[k]
+    if model.state is not None:
+        rows, cols, values = model.state.exposure_coo()
+    else:
+        links = [(i, position[code], amount) for i, bank in enumerate(banks)
+                 for code, amount in sorted(bank.lendings.items()) if code in position and amount != 0]
+        rows, cols, values = zip(*links) if links else ([], [], [])
+    arrays["exposure_rows"] = np.array(rows, dtype=np.int64)
+    arrays["exposure_cols"] = np.array(cols, dtype=np.int64)
+    arrays["exposure_values"] = np.array(values, dtype=float)
+
+    # repayment ladders, flattened: ladder k of borrower rows[k] towards lender cols[k]
+    rows, cols, lengths, values = [], [], [], []
+    if model.ledger is not None:
+        rows, cols, ladders = model.ledger.export()
+        lengths = [model.ledger.depth] * len(rows)
+        values = ladders.ravel()
+    for i, bank in enumerate(banks if model.ledger is None else []):
+        for code, ladder in sorted(bank.scheduled_repayment_amount.items()):
+            rows.append(i)
+            cols.append(position[code])
+            lengths.append(len(ladder))
+            values.extend(ladder)
+    arrays["ladder_rows"] = np.array(rows, dtype=np.int64)
+    arrays["ladder_cols"] = np.array(cols, dtype=np.int64)
+    arrays["ladder_lengths"] = np.array(lengths, dtype=np.int64)
+    arrays["ladder_values"] = np.array(values, dtype=float)
+
+    engine = model.schedule.score_engine
+    if engine is not None:
+        for name in engine.FIELDS:
+            arrays["score_engine_" + name] = getattr(engine, name).copy()
+    else:
+        # agent scores, NaN where a bank has no score for the other
+        for name in SCORES:
+            arrays[name] = np.array([[getattr(bank, name).get(other, np.nan) for other in banks] for bank in banks],
+                                    dtype=float)
+
+    schedule = model.schedule
+    arrays["schedule_order"] = np.array([position[bank.code] for bank in schedule.agents_by_breed[Bank]])
+    arrays["schedule_live"] = np.array([schedule.bank_index.is_live(bank) for bank in banks])
+
+    version, python_state, gauss_next = random.getstate()
+    arrays["python_random"] = np.array(python_state, dtype=np.int64)
+    _, numpy_keys, numpy_position, has_gauss, cached_gaussian = np.random.get_state()
+    arrays["numpy_random"] = numpy_keys
+    stream = banks[0].random_stream if banks else None
+    if stream is not None:
+        arrays["stream_block"] = stream.block[stream.position:]
+    streams = None
+    if model.streams is not None:
+        streams = {"entropy": model.streams.entropy, "states": model.streams.get_state()}
+        if not HAS_GENERATOR:
+            # MT19937 keys as one array, the rest of every state in meta
+            states = streams["states"]
+            names = sorted(states)
+            arrays["stream_keys"] = np.array([states[name][1] for name in names], dtype=np.uint32).reshape(-1, 624)
+            streams["states"] = [[name, states[name][0]] + [float(value) for value in states[name][2:]]
+                                 for name in names]
+
+    meta = {
+        "version": VERSION,
+        "engine": model.engine,
+        "exposures": model.exposures,
+        "ledger": model.ledger is not None,
+        "scores": "matrix" if engine is not None else "agent",
+        "time": schedule.time,
+        "steps": schedule.steps,
+        "run_time": schedule.run_time,
+        "progress": model.progress,
+        "python_random": [version, gauss_next],
+        "numpy_random": [int(numpy_position), int(has_gauss), float(cached_gaussian)],
+        "streams": streams,
+    }
+    arrays["meta"] = np.array(json.dumps(meta))
+    if hasattr(path, 'write'):
+        np.savez_compressed(path, **arrays)
+    else:
+        with open(path, 'wb') as checkpoint:
+            np.savez_compressed(checkpoint, **arrays)
+
+
+def restore_checkpoint(model, path):
+    '''
+    Puts model back in the state saved by save_checkpoint. model must be
+    built like the checkpointed one: same banks, engine and scores.
+    '''
+    checkpoint = np.load(path)
+    meta = json.loads(str(checkpoint["meta"]))
+    codes = [str(code) for code in checkpoint["codes"]]
+    banks = model.banks
+    if meta["version"] != VERSION:
+        raise ValueError("Unsupported checkpoint version: %s" % meta["version"])
+    if codes != [bank.code for bank in banks]:
+        raise ValueError("The checkpoint holds other banks than the model")
+    engine = model.schedule.score_engine
+    exposures = meta.get("exposures", "dense")
+    if meta["engine"] != model.engine or meta["scores"] != ("matrix" if engine is not None else "agent") or \
+            meta["ledger"] != (model.ledger is not None) or exposures != model.exposures:
+        raise ValueError("The checkpoint was taken with engine=%s, scores=%s, ledger=%s and exposures=%s" %
+                         (meta["engine"], meta["scores"], meta["ledger"], exposures))
+    if (meta["streams"] is not None) != (model.streams is not None):
+        raise ValueError("The checkpoint was taken with other random streams than the model")
+
+    rows, cols, values = checkpoint["exposure_rows"], checkpoint["exposure_cols"], checkpoint["exposure_values"]
+    if model.state is not None:
+        model.state.load_exposures(rows, cols, values)
+    else:
+        for bank in banks:
+            bank.lendings, bank.borrowings = {}, {}
+        for i, j, amount in zip(rows, cols, values.tolist()):
+            banks[i].lendings[codes[j]] = amount
+            banks[j].borrowings[codes[i]] = amount
+    # after the exposures, the running totals are restored as they were rather than summed again
+    for field in BANK_FIELDS:
+        for bank, value in zip(banks, checkpoint[field]):
+            setattr(bank, field, float(value))
+    for flag in BANK_FLAGS:
+        for bank, value in zip(banks, checkpoint[flag]):
+            setattr(bank, flag, bool(value))
+
+    if model.ledger is not None:
+        model.ledger.load(checkpoint["ladder_rows"], checkpoint["ladder_cols"],
+                          checkpoint["ladder_values"].reshape(-1, model.ledger.depth))
+    else:
+        for bank in banks:
+            bank.scheduled_repayment_amount = {}
+        ends = np.cumsum(checkpoint["ladder_lengths"])
+        values = checkpoint["ladder_values"].tolist()
+        for row, col, end, length in zip(checkpoint["ladder_rows"], checkpoint["ladder_cols"], ends,
+                                         checkpoint["ladder_lengths"]):
+            banks[row].scheduled_repayment_amount[codes[col]] = values[end - length:end]
+
+    if engine is not None:
+        for name in engine.FIELDS:
+            getattr(engine, name)[:] = checkpoint["score_engine_" + name]
+    else:
+        for name in SCORES:
+            scores = checkpoint[name]
+            for i, bank in enumerate(banks):
+                setattr(bank, name, {other: float(scores[i, j]) for j, other in enumerate(banks)
+                                     if not np.isnan(scores[i, j])})
+
+    schedule = model.schedule
+    schedule.agents_by_breed[Bank][:] = [banks[i] for i in checkpoint["schedule_order"]]
+    schedule.bank_index.reindex()
+    schedule.bank_index.live = set(code for code, live in zip(codes, checkpoint["schedule_live"]) if live)
+    schedule.time, schedule.steps, schedule.run_time = meta["time"], meta["steps"], meta["run_time"]
+    model.progress = meta["progress"]
+
+    version, gauss_next = meta["python_random"]
+    random.setstate((version, tuple(int(value) for value in checkpoint["python_random"]), gauss_next))
+    numpy_position, has_gauss, cached_gaussian = meta["numpy_random"]
+    np.random.set_state(('MT19937', checkpoint["numpy_random"], numpy_position, has_gauss, cached_gaussian))
+    if "stream_block" in checkpoint.files and banks:
+        stream = banks[0].random_stream
+        stream.block = checkpoint["stream_block"].copy()
+        stream.position = 0
+    streams = meta["streams"]
+    if streams is not None:
+        states = streams["states"]
+        if not HAS_GENERATOR:
+            states = {name: (kind, keys, int(position), int(has_gauss), cached_gaussian)
+                      for (name, kind, position, has_gauss, cached_gaussian), keys
+                      in zip(states, checkpoint["stream_keys"])}
+        model.streams.set_state(streams["entropy"], states)
+    return model
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+def network_of(banks):
+    '''
+    Liabilities and net external assets of the banks for clearing_vector.
+    liabilities[i, j] is owed by bank i to bank j. Deposits are senior to
+    interbank debt, so they are deducted from the external assets.
+    '''
+    position = {bank.code: i for i, bank in enumerate(banks)}
+    liabilities = np.zeros((len(banks), len(banks)))
+    for i, bank in enumerate(banks):
+        for code in bank.counterparty_codes():
+            if code in position:
+                liabilities[i, position[code]] = bank.borrowings.get(code, 0)
+    external = np.array([bank.cash + bank.external_asset - bank.deposit for bank in banks], dtype=float)
+    return liabilities, external
+
+
+def clearing_vector(liabilities, external, tol=1e-9, max_iter=1000):
+    '''
+    Eisenberg-Noe clearing payments by fictitious default iteration:
+        p = min(p_bar, max(0, external + Pi^T p))
+    starting from full payment p = p_bar. Returns the payments, the
+    defaulted banks (paying less than they owe) and the number of rounds.
+    '''
+    liabilities = np.asarray(liabilities, dtype=float)
+    owed = liabilities.sum(axis=1)
+    relative = liabilities / np.where(owed > 0, owed, 1)[:, np.newaxis]
+
+    payments = owed.copy()
+    rounds = 0
+    for rounds in range(1, max_iter + 1):
+        updated = np.minimum(owed, np.maximum(0, external + relative.T.dot(payments)))
+        converged = np.abs(updated - payments).max() <= tol if len(payments) > 0 else True
+        payments = updated
+        if converged:
+            break
+    return payments, payments < owed - tol, rounds
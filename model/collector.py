@@ -0,0 +1,180 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+MODEL_COLUMNS = ["Step", "Banks", "Total_Asset", "Total_Equity", "Number_Of_Live_Banks",
+                 "Number_Of_Bankrupted_Banks", "Number_Of_Affected_Banks"]
+AGENT_COLUMNS = ["cash", "equity", "deposit", "external_asset", "lendings", "borrowings", "is_shocked",
+                 "is_bankrupted"]
+
+
+def agent_columns(banks):
+    '''
+    Per bank values of one step, one array per column in the order of banks.
+    '''
+    return {
+        "cash": np.array([bank.cash for bank in banks]),
+        "equity": np.array([bank.equity for bank in banks]),
+        "deposit": np.array([bank.deposit for bank in banks]),
+        "external_asset": np.array([bank.external_asset for bank in banks]),
+        "lendings": np.array([bank.total_lendings() for bank in banks]),
+        "borrowings": np.array([bank.total_borrowings() for bank in banks]),
+        "is_shocked": np.array([bank.is_shocked for bank in banks], dtype=bool),
+        "is_bankrupted": np.array([bank.bankrupted for bank in banks], dtype=bool),
+    }
+
+
+def state_columns(state, banks):
+    '''
+    Same as agent_columns, sliced straight out of a BankState.
+    '''
+    return {
+        "cash": state.cash.copy(),
+        "equity": state.equity.copy(),
+        "deposit": state.deposit.copy(),
+        "external_asset": state.external_asset.copy(),
+        "lendings": state.lending_total.copy(),
+        "borrowings": state.borrowing_total.copy(),
+        "is_shocked": np.array([bank.is_shocked for bank in banks], dtype=bool),
+        "is_bankrupted": state.bankrupted.copy(),
+    }
+
+
+class ColumnarCollector(object):
+    '''
+    Replacement of the mesa DataCollector that appends one typed array per
+    column and step and spills every chunk_size steps to disk, so memory
+    stays bounded whatever the length of the run.
+
+    Chunks are chunk_00000.npz files (or .parquet with format='parquet')
+    holding model columns of shape (steps,) and agent columns of shape
+    (steps, banks); meta.json records the bank codes and run description.
+    '''
+    def __init__(self, directory, codes, chunk_size=100, include_exposures=False, format='npz', meta=None):
+        if format not in ['npz', 'parquet']:
+            raise ValueError("Unknown collector format: %s" % format)
+        if format == 'parquet':
+            # fail early when parquet output is not available
+            import pyarrow
+        self.directory = directory
+        self.codes = list(codes)
+        self.chunk_size = chunk_size
+        self.include_exposures = include_exposures
+        self.format = format
+        self.meta = meta or {}
+        self.chunk_count = 0
+        self.reset_buffers()
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        for old_chunk in glob.glob(os.path.join(directory, 'chunk_*')):
+            os.remove(old_chunk)
+
+    def reset_buffers(self):
+        self.buffers = {column: [] for column in MODEL_COLUMNS + AGENT_COLUMNS}
+        self.buffers["exposures"] = []
+
+    def collect(self, model):
+        schedule = model.schedule
+        self.buffers["Step"].append(schedule.get_run_time())
+        self.buffers["Banks"].append(len(model.banks))
+        self.buffers["Total_Asset"].append(schedule.total_assets())
+        self.buffers["Total_Equity"].append(schedule.total_equity())
+        self.buffers["Number_Of_Live_Banks"].append(schedule.number_live_bank())
+        self.buffers["Number_Of_Bankrupted_Banks"].append(schedule.number_bankrupted_bank())
+        self.buffers["Number_Of_Affected_Banks"].append(schedule.number_affected_bank())
+
+        if model.state is not None:
+            columns = state_columns(model.state, model.banks)
+        else:
+            columns = agent_columns(model.banks)
+        for column in AGENT_COLUMNS:
+            self.buffers[column].append(columns[column])
+
+        if self.include_exposures:
+            self.buffers["exposures"].append(exposure_matrix(model))
+
+        if len(self.buffers["Step"]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffers["Step"]:
+            return
+        arrays = {column: np.array(self.buffers[column]) for column in MODEL_COLUMNS}
+        arrays.update({column: np.vstack(self.buffers[column]) for column in AGENT_COLUMNS})
+        if self.include_exposures:
+            arrays["exposures"] = np.stack(self.buffers["exposures"])
+
+        file_path = os.path.join(self.directory, 'chunk_%05d' % self.chunk_count)
+        if self.format == 'parquet':
+            write_parquet_chunk(file_path + '.parquet', arrays, self.codes)
+        else:
+            np.savez_compressed(file_path + '.npz', **arrays)
+        self.chunk_count += 1
+        self.reset_buffers()
+
+    def close(self):
+        self.flush()
+        meta = dict(self.meta, codes=self.codes, chunks=self.chunk_count, format=self.format,
+                    model_columns=MODEL_COLUMNS, agent_columns=AGENT_COLUMNS,
+                    include_exposures=self.include_exposures)
+        with open(os.path.join(self.directory, 'meta.json'), 'w') as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+
+def exposure_matrix(model):
+    '''
+    exposures[i, j] = lending of bank i to bank j, in the order of model.banks.
+    '''
+    if model.state is not None:
+        return model.state.exposure_matrix()
+    return np.array([[bank.lendings.get(other.code, 0) for other in model.banks] for bank in model.banks])
+
+
+def exposure_coo(model):
+    '''
+    rows, cols and values of the nonzero exposures, indices in the order of
+    model.banks. The dict engine walks the lendings of every bank.
+    '''
+    if model.state is not None:
+        return model.state.exposure_coo()
+    index = {bank.code: i for i, bank in enumerate(model.banks)}
+    links = [(i, index[code], amount) for i, bank in enumerate(model.banks)
+             for code, amount in bank.lendings.items() if amount != 0]
+    if not links:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    rows, cols, values = zip(*links)
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(values, dtype=float)
+
+
+def write_parquet_chunk(file_path, arrays, codes):
+    '''
+    Long format: one row per step and bank, model columns repeated per bank.
+    '''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    steps, banks = arrays["cash"].shape
+    table = {"code": np.tile(np.array(codes, dtype=object), steps)}
+    for column in MODEL_COLUMNS:
+        table[column] = np.repeat(arrays[column], banks)
+    for column in AGENT_COLUMNS:
+        table[column] = arrays[column].reshape(-1)
+    if "exposures" in arrays:
+        for j, code in enumerate(codes):
+            table["lending_to_" + str(code)] = arrays["exposures"][:, :, j].reshape(-1)
+    names = sorted(table)
+    pq.write_table(pa.Table.from_arrays([pa.array(table[name]) for name in names], names=names), file_path)
+
+
+def load_columns(directory):
+    '''
+    Concatenates the npz chunks written by ColumnarCollector into one array
+    per column.
+    '''
+    chunks = [np.load(path) for path in sorted(glob.glob(os.path.join(directory, 'chunk_*.npz')))]
+    if not chunks:
+        return {}
+    return {column: np.concatenate([chunk[column] for chunk in chunks]) for column in chunks[0].files}
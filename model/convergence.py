@@ -0,0 +1,80 @@
+from utils.logger import log
+
+
+class Convergence(object):
+    '''
+    Stopping rules of run_model, checked before every step. Any of them
+    ends the run:
+    - 'bankrupt_set': no bank went bankrupt for stable_count_limit steps
+      after the shock. Banks never recover, so an unchanged count is an
+      unchanged set.
+    - 'equity': the total equity moved by less than equity_tolerance,
+      relative, for stable_count_limit steps after the shock.
+    - 'max_steps': max_steps steps were run, shock or not.
+    - 'callback': callback(model) returned True after the shock.
+
+    quiet_tail=True makes the steps taken while waiting for stability
+    cheap: they export no interbank matrix and the mesa collector skips
+    them, so its model and agent reports stay aligned.
+    '''
+    def __init__(self, equity_tolerance=None, max_steps=None, callback=None, quiet_tail=False):
+        self.equity_tolerance = equity_tolerance
+        self.max_steps = max_steps
+        self.callback = callback
+        self.quiet_tail = quiet_tail
+
+    def start(self):
+        '''
+        Loop variables of run_model, kept in model.progress to resume a run.
+        '''
+        return {"step": 0, "i": 0, "stable_count": 0, "bankrupted_bank_count": 0,
+                "equity": None, "equity_stable_count": 0, "reason": None}
+
+    def observe(self, model, progress):
+        '''
+        Updates the stability counts with the state of model before a step.
+        '''
+        count = model.initial_bank - model.schedule.number_bankrupted_bank()
+        if progress["bankrupted_bank_count"] != count:
+            progress["stable_count"] = 0
+            progress["bankrupted_bank_count"] = count
+        else:
+            progress["stable_count"] += 1
+
+        if self.equity_tolerance is not None:
+            equity, previous = model.schedule.total_equity(), progress.get("equity")
+            if previous is not None and abs(equity - previous) <= self.equity_tolerance * max(abs(previous), 1e-12):
+                progress["equity_stable_count"] = progress.get("equity_stable_count", 0) + 1
+            else:
+                progress["equity_stable_count"] = 0
+            progress["equity"] = equity
+
+    def reason(self, model, progress, limit_step, stable_count_limit):
+        '''
+        Why the run stops now, None to go on.
+        '''
+        if self.max_steps is not None and progress["step"] + progress["i"] >= self.max_steps:
+            return 'max_steps'
+        if progress["step"] < limit_step:
+            return None
+        if progress["stable_count"] >= stable_count_limit:
+            return 'bankrupt_set'
+        if self.equity_tolerance is not None and progress.get("equity_stable_count", 0) >= stable_count_limit:
+            return 'equity'
+        if self.callback is not None and self.callback(model):
+            return 'callback'
+        return None
+
+    def stop(self, model, progress, limit_step, stable_count_limit):
+        reason = self.reason(model, progress, limit_step, stable_count_limit)
+        if reason is not None:
+            progress["reason"] = reason
+            log.info('converged', reason=reason, steps=progress["step"] + progress["i"])
+        return reason is not None
+
+    def quiet(self, progress, limit_step):
+        '''
+        Whether the next step only waits for stability: after the shock
+        and with no bank gone bankrupt since the previous step.
+        '''
+        return self.quiet_tail and progress["step"] > limit_step and progress["stable_count"] > 0
@@ -1,3 +1,119 @@
+import hashlib
 import random
 import numpy as np
 
+
+def derive_seed(*keys):
+    '''
+    Stable 32 bit seed for a run described by keys, e.g.
+    derive_seed(base_seed, shock_type, shocked_bank_number, test_case).
+    The same keys give the same seed in every process.
+    '''
+    digest = hashlib.sha256(repr(keys).encode('utf-8')).hexdigest()
+    return int(digest[:8], 16)
+
+
+def seed_all(seed):
+    '''
+    Seeds both random number generators used by the model.
+    '''
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+# numpy.random.Generator and SeedSequence only exist from NumPy 1.17 on
+HAS_GENERATOR = hasattr(np.random, 'SeedSequence')
+
+
+def new_generator(entropy, name):
+    '''
+    Generator of the stream name of a model with the given entropy.
+    '''
+    if HAS_GENERATOR:
+        sequence = np.random.SeedSequence(entropy, spawn_key=(derive_seed(name),))
+        return np.random.Generator(np.random.PCG64(sequence))
+    return np.random.RandomState(derive_seed(entropy, name))
+
+
+def get_generator_state(generator):
+    return generator.bit_generator.state if HAS_GENERATOR else generator.get_state()
+
+
+def set_generator_state(generator, state):
+    if HAS_GENERATOR:
+        generator.bit_generator.state = state
+    else:
+        generator.set_state(state)
+
+
+class RandomStreams(object):
+    '''
+    Independent random streams of a model: one per purpose ('schedule',
+    'shock', 'growth', 'decisions') and one per bank. A stream only depends
+    on the entropy of the model and its name, so it gives the same samples
+    whatever the other streams draw and in whichever process it runs.
+
+    Streams are numpy.random.Generator spawned from a SeedSequence when
+    NumPy has them, RandomState seeded by a hash of entropy and name
+    otherwise. Both share the normal, uniform, choice and shuffle methods
+    the model draws with.
+    '''
+    def __init__(self, entropy=None):
+        # fresh entropy when not given, recorded so the run can be reproduced
+        self.entropy = entropy if entropy is not None else random.SystemRandom().getrandbits(63)
+        self.generators = {}
+
+    def stream(self, *key):
+        return self.named('/'.join(str(part) for part in key))
+
+    def named(self, name):
+        generator = self.generators.get(name)
+        if generator is None:
+            generator = self.generators[name] = new_generator(self.entropy, name)
+        return generator
+
+    def reseed(self, entropy):
+        '''
+        Derives every stream from entropy again. The generators already
+        handed out are reseeded in place.
+        '''
+        self.entropy = entropy
+        for name, generator in self.generators.items():
+            set_generator_state(generator, get_generator_state(new_generator(entropy, name)))
+
+    def get_state(self):
+        return {name: get_generator_state(generator) for name, generator in self.generators.items()}
+
+    def set_state(self, entropy, states):
+        self.entropy = entropy
+        for name, state in states.items():
+            set_generator_state(self.named(name), state)
+
+    def describe(self):
+        return {"entropy": self.entropy, "generator": "PCG64" if HAS_GENERATOR else "MT19937"}
+
+
+class UniformStream(object):
+    '''
+    Hands out uniform [0, 1) samples from blocks drawn in advance, so that
+    many small batches cost one NumPy call per block_size samples.
+    '''
+    def __init__(self, block_size=4096, random_state=None):
+        self.block_size = block_size
+        self.random_state = random_state if random_state is not None else np.random
+        self.block = np.empty(0)
+        self.position = 0
+
+    def take(self, size):
+        if self.position + size > len(self.block):
+            remaining = self.block[self.position:]
+            fresh = self.random_state.uniform(size=max(self.block_size, size - len(remaining)))
+            self.block = np.concatenate([remaining, fresh])
+            self.position = 0
+        samples = self.block[self.position:self.position + size]
+        self.position += size
+        return samples
+
+
+# Shared by banks created outside of a model
+uniform_stream = UniformStream()
@@ -0,0 +1,118 @@
+import numpy as np
+
+SNAPSHOT = 0
+DELTA = 1
+
+
+class ExposureHistory(object):
+    '''
+    Appends the interbank exposure matrix of every step to a single file,
+    storing only the entries that changed since the previous step as sparse
+    COO records. With snapshot_every=k every k-th record holds all nonzero
+    entries, so reading a late step does not replay the whole run. Steps
+    are given as the COO of their nonzero entries, so recording follows
+    the links of the network rather than N^2 cells.
+
+    File layout, a sequence of np.save arrays:
+        codes
+        per record: header [kind, step, nnz], rows, cols, values
+    '''
+    def __init__(self, file_path, codes, snapshot_every=0):
+        self.file_path = file_path
+        self.snapshot_every = snapshot_every
+        self.size = len(codes)
+        # sorted keys rows * size + cols and values of the previous record
+        self.previous = None
+        self.record_count = 0
+        self.file = open(file_path, 'wb')
+        np.save(self.file, np.array([str(code) for code in codes]))
+
+    def record(self, step, matrix):
+        matrix = np.asarray(matrix, dtype=float)
+        rows, cols = np.nonzero(matrix)
+        self.record_coo(step, rows, cols, matrix[rows, cols])
+
+    def record_coo(self, step, rows, cols, values):
+        '''
+        Records the exposures of a step given as values[k] lent by bank
+        rows[k] to bank cols[k], zeros allowed.
+        '''
+        keys = np.asarray(rows, dtype=np.int64) * self.size + np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(keys, kind='mergesort')
+        keys, values = keys[order], values[order]
+        keep = values != 0
+        keys, values = keys[keep], values[keep]
+
+        snapshot = self.previous is None or \
+            (self.snapshot_every > 0 and self.record_count % self.snapshot_every == 0)
+        if snapshot:
+            changed_keys, changed_values = keys, values
+        else:
+            previous_keys, previous_values = self.previous
+            # entries that are new or changed, then the ones gone back to zero
+            k = np.minimum(np.searchsorted(previous_keys, keys), max(len(previous_keys) - 1, 0))
+            same = (previous_keys[k] == keys) & (previous_values[k] == values) if len(previous_keys) else \
+                np.zeros(len(keys), dtype=bool)
+            gone = ~np.in1d(previous_keys, keys)
+            changed_keys = np.concatenate([keys[~same], previous_keys[gone]])
+            changed_values = np.concatenate([values[~same], np.zeros(gone.sum())])
+        self.write(SNAPSHOT if snapshot else DELTA, step, changed_keys // self.size, changed_keys % self.size,
+                   changed_values)
+        self.previous = keys, values
+        self.record_count += 1
+
+    def write(self, kind, step, rows, cols, values):
+        np.save(self.file, np.array([kind, step, len(values)], dtype=np.int64))
+        np.save(self.file, rows.astype(np.int32))
+        np.save(self.file, cols.astype(np.int32))
+        np.save(self.file, values.astype(np.float64))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ExposureHistoryReader(object):
+    '''
+    Rebuilds the exposure matrix of any recorded step.
+    '''
+    def __init__(self, file_path):
+        self.file_path = file_path
+        # (kind, step, offset) of every record
+        self.records = []
+        with open(file_path, 'rb') as history:
+            self.codes = [str(code) for code in np.load(history)]
+            while True:
+                offset = history.tell()
+                try:
+                    kind, step, _ = np.load(history)
+                except (EOFError, IOError, ValueError):
+                    break
+                for _ in range(3):
+                    np.load(history)
+                self.records.append((int(kind), int(step), offset))
+
+    def steps(self):
+        return [step for _, step, _ in self.records]
+
+    def matrix_at(self, step):
+        '''
+        Exposure matrix at the last record whose step is <= step.
+        '''
+        last = max([i for i, (_, record_step, _) in enumerate(self.records) if record_step <= step] or [-1])
+        if last < 0:
+            raise KeyError("No exposure record at or before step %s" % step)
+        first = max(i for i in range(last + 1) if self.records[i][0] == SNAPSHOT)
+
+        size = len(self.codes)
+        matrix = np.zeros((size, size))
+        with open(self.file_path, 'rb') as history:
+            history.seek(self.records[first][2])
+            for i in range(first, last + 1):
+                kind, _, _ = np.load(history)
+                rows, cols, values = np.load(history), np.load(history), np.load(history)
+                if kind == SNAPSHOT:
+                    matrix[:] = 0
+                matrix[rows, cols] = values
+        return matrix
@@ -10,6 +10,20 @@ def size_score(Aj, A, I):
     Sij = math.log(Aj) - (np.dot(np.log(A), I) / sum(I) if sum(I) != 0 else 0)
     return Sij
 
+# Vectorized size_score of every bank i with every bank j
+# A    : total asset of all banks
+# I    : indicators, I[i, j] = relation indicator of Bank i with Bank j
+# live : banks taking part in the scoring, Sij = 0 for the others and i == j
+def size_score_matrix(A, I, live):
+    log_A = np.log(np.where(live, A, 1.0))
+    W = I * live[np.newaxis, :]
+    np.fill_diagonal(W, 0)
+    count = W.sum(axis=1)
+    mean = W.dot(log_A) / np.where(count != 0, count, 1)
+    S = log_A[np.newaxis, :] - mean[:, np.newaxis]
+    mask = live[np.newaxis, :] & ~np.eye(len(A), dtype=bool)
+    return np.where(mask, S, 0)
+
 # pSij :
 # Sij  :
 # X    :
@@ -26,4 +40,11 @@ def total_score(weight, score):
 
 def lending_decision(score, alpha, beta):
     p = 1.0 / (1 + alpha * math.exp(beta * score))
+    return p
+
+# Vectorized lending_decision over arrays of scores, alphas and betas.
+# An overflowing exp gives p = 0 and a nan score gives p = nan.
+def lending_decisions(score, alpha, beta):
+    with np.errstate(over='ignore', invalid='ignore'):
+        p = 1.0 / (1 + alpha * np.exp(beta * np.asarray(score, dtype=float)))
     return p
\ No newline at end of file
@@ -0,0 +1,99 @@
+import numpy as np
+
+from utils.logger import log, DEBUG
+
+# Stage 1 fields of a bank kept as Python attributes by both engines
+TARGET_FIELDS = ["total_asset_target_amount", "lending_target_amount", "available_lending_amount",
+                 "deposit_target_amount", "borrowing_target_amount"]
+
+
+class GrowthEngine(object):
+    '''
+    Vectorized Bank.stage_1 of every bank: external asset growth or shock,
+    target amounts, deposit and cash. Stage 1 of a bank never looks at the
+    other banks, so all of them are updated at once from samples drawn in
+    one call per distribution.
+    '''
+    def __init__(self, banks, state=None):
+        self.banks = list(banks)
+        self.state = state
+        self.position = {bank.code: i for i, bank in enumerate(self.banks)}
+        # random stream of the samples, the global NumPy generator by default
+        self.random = np.random
+
+        self.growth_mean = np.array([bank.growth_rate["external_asset"]["mean"] for bank in self.banks], dtype=float)
+        self.growth_var = np.array([bank.growth_rate["external_asset"]["var"] for bank in self.banks], dtype=float)
+        self.external_asset_target_rate = np.array([bank.external_asset_target_rate for bank in self.banks],
+                                                   dtype=float)
+        self.lending_target_rate = np.array([bank.lending_target_rate for bank in self.banks], dtype=float)
+        self.borrowing_target_rate = np.array([bank.borrowing_target_rate for bank in self.banks], dtype=float)
+        self.deposit_target_rate = np.array([bank.deposit_target_rate for bank in self.banks], dtype=float)
+
+    def draw(self, rows):
+        '''
+        External asset growth rates and deposit noise rates of the banks at
+        rows, as Bank.external_asset_growth_rate and Bank.deposit_noise_rate.
+        '''
+        growth = self.random.normal(self.growth_mean[rows], self.growth_var[rows])
+        noise = self.random.uniform(-0.02, 0.02, len(rows))
+        return growth, noise
+
+    def step(self, banks):
+        rows = np.array([self.position[bank.code] for bank in banks], dtype=np.int64)
+        growth, noise = self.draw(rows)
+        self.apply(banks, rows, growth, noise)
+
+    def apply(self, banks, rows, growth, noise):
+        '''
+        Stage 1 of banks, at rows, with the given samples.
+        '''
+        if self.state is not None:
+            state = self.state
+            external_asset, equity = state.external_asset[rows], state.equity[rows]
+            lendings, borrowings = state.lending_total[rows], state.borrowing_total[rows]
+        else:
+            external_asset = np.array([bank.external_asset for bank in banks], dtype=float)
+            equity = np.array([bank.equity for bank in banks], dtype=float)
+            lendings = np.array([bank.total_lendings() for bank in banks], dtype=float)
+            borrowings = np.array([bank.total_borrowings() for bank in banks], dtype=float)
+
+        shocked = np.array([bank.is_shocked for bank in banks], dtype=bool)
+        shock_rate = np.zeros(len(banks))
+        for k in np.flatnonzero(shocked):
+            shock_rate[k] = banks[k].get_shock_rate()
+            log.info('shock', code=banks[k].code, external_asset=float(external_asset[k]),
+                     shock_rate=shock_rate[k], new_external_asset=float(external_asset[k] * (1 - shock_rate[k])))
+
+        new_external_asset = np.where(shocked, external_asset * (1 - shock_rate), external_asset * np.exp(growth))
+        equity = equity - np.where(shocked, external_asset * shock_rate, 0)
+
+        total_asset_target_amount = new_external_asset / self.external_asset_target_rate[rows]
+        lending_target_amount = total_asset_target_amount * self.lending_target_rate[rows]
+        available_lending_amount = np.maximum(lending_target_amount - lendings, 0)
+        deposit_target_amount = total_asset_target_amount * self.deposit_target_rate[rows]
+        borrowing_target_amount = np.maximum(total_asset_target_amount * self.borrowing_target_rate[rows] - borrowings,
+                                             0)
+        deposit = deposit_target_amount * (1 + noise)
+        cash = deposit + borrowings + equity - lendings - new_external_asset
+
+        if self.state is not None:
+            state.external_asset[rows] = new_external_asset
+            state.equity[rows] = equity
+            state.deposit[rows] = deposit
+            state.cash[rows] = cash
+        else:
+            for k, bank in enumerate(banks):
+                bank.external_asset = float(new_external_asset[k])
+                bank.equity = float(equity[k])
+                bank.deposit = float(deposit[k])
+                bank.cash = float(cash[k])
+        for field, values in zip(TARGET_FIELDS, [total_asset_target_amount, lending_target_amount,
+                                                 available_lending_amount, deposit_target_amount,
+                                                 borrowing_target_amount]):
+            for bank, value in zip(banks, values.tolist()):
+                setattr(bank, field, value)
+
+        log.debug('stage_1', banks=len(banks), shocked=int(shocked.sum()))
+        if log.enabled(DEBUG):
+            for bank in banks:
+                bank.log_stage(1)
@@ -0,0 +1,127 @@
+import numpy as np
+
+from utils.logger import log
+
+
+class RepaymentLedger(object):
+    '''
+    Scheduled repayments of every loan relation as a ring buffer.
+
+    Relation k (borrower borrowers[k] towards lender lenders[k]) owns the
+    row amounts[k] of term + 1 periods; the period due now is the column
+    at pointer. Scheduling a loan adds into a slice of the row, taking a
+    repayment zeroes its cell, and advancing a period shifts the pointer.
+    Rows only exist for pairs that ever had a loan, so the ledger grows
+    with the relations, not with N^2.
+
+    Every borrower takes its repayments in its own stage 3, in the order
+    the repayment lists were popped, so lenders are paid before they are
+    checked for bankruptcy just as before. A relation that was not repaid
+    in a period keeps its dues for the next one, like a list that was not
+    popped.
+    '''
+    def __init__(self, codes, term):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.depth = term + 1
+        self.pointer = 0
+        # (borrower, lender) -> row, and the rows of every borrower
+        self.rows = {}
+        self.rows_of = {}
+        self.count = 0
+        self.borrowers = np.zeros(16, dtype=np.int64)
+        self.lenders = np.zeros(16, dtype=np.int64)
+        self.amounts = np.zeros((16, self.depth))
+        self.repaid = np.zeros(16, dtype=bool)
+
+    def row(self, borrower_code, lender_code):
+        key = (self.index[borrower_code], self.index[lender_code])
+        row = self.rows.get(key)
+        if row is None:
+            if self.count == len(self.borrowers):
+                self.grow()
+            row = self.count
+            self.count += 1
+            self.borrowers[row], self.lenders[row] = key
+            self.rows[key] = row
+            self.rows_of.setdefault(borrower_code, {})[lender_code] = row
+        return row
+
+    def grow(self):
+        capacity = 2 * len(self.borrowers)
+        self.borrowers = np.resize(self.borrowers, capacity)
+        self.lenders = np.resize(self.lenders, capacity)
+        amounts = np.zeros((capacity, self.depth))
+        amounts[:self.count] = self.amounts[:self.count]
+        self.amounts = amounts
+        self.repaid = np.resize(self.repaid, capacity)
+        self.repaid[self.count:] = False
+
+    def schedule(self, borrower_code, lender_code, payments):
+        '''
+        Adds payments[t] to the repayment due in t periods, t = 0 now.
+        '''
+        if len(payments) > self.depth:
+            raise ValueError("A repayment schedule is longer than the ledger: %d > %d" % (len(payments), self.depth))
+        row = self.row(borrower_code, lender_code)
+        self.amounts[row, (self.pointer + np.arange(len(payments))) % self.depth] += payments
+
+    def clear(self, borrower_code, lender_code):
+        row = self.rows_of.get(borrower_code, {}).get(lender_code)
+        if row is not None:
+            self.amounts[row] = 0
+
+    def ladder(self, row):
+        return np.roll(self.amounts[row], -self.pointer).tolist()
+
+    def ladders(self, borrower_code):
+        '''
+        Repayments of borrower per lender, due now first, like the old
+        scheduled_repayment_amount lists.
+        '''
+        return {lender_code: self.ladder(row) for lender_code, row in self.rows_of.get(borrower_code, {}).items()}
+
+    def due(self):
+        return self.amounts[:self.count, self.pointer]
+
+    def take(self, borrower_code, lender_code):
+        '''
+        The repayment due now from borrower to lender, None without a
+        schedule. The relation moves on to its next period with advance().
+        '''
+        row = self.rows_of.get(borrower_code, {}).get(lender_code)
+        if row is None:
+            return None
+        amount = float(self.amounts[row, self.pointer])
+        self.amounts[row, self.pointer] = 0
+        self.repaid[row] = True
+        return amount
+
+    def advance(self):
+        '''
+        Shifts the pointer a period. The rows that were not repaid are
+        rolled along, so their due period is still the first one.
+        '''
+        kept = np.flatnonzero(~self.repaid[:self.count])
+        self.amounts[kept] = np.roll(self.amounts[kept], 1, axis=1)
+        self.amounts[:self.count, self.pointer] = 0
+        self.pointer = (self.pointer + 1) % self.depth
+        self.repaid[:] = False
+        log.debug('advance', relations=self.count, kept=len(kept))
+
+    # ===================================================================
+
+    def export(self):
+        '''
+        borrowers, lenders and amounts with the due period first.
+        '''
+        return (self.borrowers[:self.count].copy(), self.lenders[:self.count].copy(),
+                np.roll(self.amounts[:self.count], -self.pointer, axis=1))
+
+    def load(self, borrowers, lenders, amounts):
+        self.pointer = 0
+        self.rows, self.rows_of, self.count = {}, {}, 0
+        self.amounts[:] = 0
+        self.repaid[:] = False
+        for borrower, lender, ladder in zip(borrowers, lenders, amounts):
+            self.schedule(self.codes[borrower], self.codes[lender], ladder)
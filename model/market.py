@@ -0,0 +1,133 @@
+import numpy as np
+
+from utils.logger import log
+
+
+class InterbankMarket(object):
+    '''
+    Clears the stage 2 interbank market for all borrowers of a stage.
+
+    open() ranks the live lenders once per stage by total asset. That is the
+    order of the total scores of a borrower as long as its relation score is
+    the same with all lenders and the size score has a positive weight, as
+    the size score is increasing in the asset of the lender. match() checks
+    the scores of every borrower against the ranking and asks the lenders in
+    the order of the borrower's own total scores when they differ.
+
+    Lenders that are bankrupted or have no lending capacity left are removed
+    from the ranking for the rest of the stage; a skip list with path
+    compression jumps over them, so they are never visited again.
+    '''
+    def __init__(self, score_engine=None, batch_size=16):
+        self.score_engine = score_engine
+        self.batch_size = batch_size
+        self.lenders = []
+        self.rows = np.zeros(0, dtype=int)
+        self.skip = np.zeros(1, dtype=int)
+
+    def open(self, banks):
+        if self.score_engine is not None:
+            live = [bank for bank in banks if self.score_engine.live[self.score_engine.position[bank.code]]]
+        else:
+            live = [bank for bank in banks if round(bank.total_asset(), 0) > 0]
+        self.lenders = sorted(live, key=lambda bank: (-bank.total_asset(), bank.code))
+        if self.score_engine is not None:
+            self.rows = np.array([self.score_engine.position[bank.code] for bank in self.lenders], dtype=int)
+        # skip[k] = k while lender k is available, otherwise a position after it
+        self.skip = np.arange(len(self.lenders) + 1)
+        for k, lender in enumerate(self.lenders):
+            if lender.is_bankrupted() or lender.lending_capacity() <= 0:
+                self.remove(k)
+
+    def remove(self, k):
+        self.skip[k] = k + 1
+
+    def next_lender(self, k):
+        '''
+        Position of the first available lender at or after k.
+        '''
+        root = k
+        while self.skip[root] != root:
+            root = self.skip[root]
+        while self.skip[k] != root and k != root:
+            self.skip[k], k = root, self.skip[k]
+        return root
+
+    def scores_of(self, borrower):
+        '''
+        Total score of borrower with every ranked lender, as its total_score held them.
+        '''
+        if self.score_engine is not None:
+            return self.score_engine.scores('total', self.score_engine.position[borrower.code], self.rows)
+        return np.array([borrower.total_score.get(lender, -np.inf) for lender in self.lenders], dtype=float)
+
+    def own_order(self, borrower):
+        '''
+        Positions of the ranked lenders in the order of the total scores of
+        borrower, or None when the ranking already is that order.
+        '''
+        engine = self.score_engine
+        if engine is not None and engine.uniform_relations and engine.weight[1] > 0:
+            return None
+        scores = self.scores_of(borrower)
+        if self.score_engine is not None:
+            others = self.rows != self.score_engine.position[borrower.code]
+        else:
+            others = np.array([lender is not borrower for lender in self.lenders], dtype=bool)
+        if not np.any(np.diff(scores[others]) > 0):
+            return None
+        positions = np.flatnonzero(others)
+        return positions[np.argsort(-scores[others], kind='mergesort')]
+
+    def available(self, order=None):
+        '''
+        Positions of the available lenders, in rank order or in order.
+        '''
+        if order is None:
+            k = self.next_lender(0)
+            while k < len(self.lenders):
+                yield k
+                k = self.next_lender(k + 1)
+        else:
+            for k in order:
+                if self.skip[k] == k:
+                    yield k
+
+    def match(self, borrower, term):
+        '''
+        Lends to borrower up to its ask_amount, asking the available lenders
+        in the order of its total scores and deciding for batch_size of them
+        at a time. Returns the borrowed amount.
+        '''
+        borrowed_amount = 0
+        positions = self.available(self.own_order(borrower))
+        while borrower.ask_amount > 0:
+            candidates = []
+            for k in positions:
+                lender = self.lenders[k]
+                if lender.is_bankrupted() or lender.lending_capacity() <= 0:
+                    self.remove(k)
+                elif lender is not borrower:
+                    candidates.append(k)
+                if len(candidates) == self.batch_size:
+                    break
+            if len(candidates) == 0:
+                break
+
+            decisions = borrower.lending_decisions([self.lenders[position] for position in candidates])
+            for position, accepted in zip(candidates, decisions):
+                if not accepted:
+                    continue
+                lender = self.lenders[position]
+                amount = round(min(borrower.ask_amount, lender.lending_capacity(), lender.lending_target_amount / 5), 5)
+                log.debug('loan', code=borrower.code, bank=lender.code, amount=amount,
+                          remaining=borrower.ask_amount - amount)
+                if amount > 0:
+                    borrower.take_loan(lender, amount, term)
+                    borrower.ask_amount -= amount
+                    borrowed_amount += amount
+                if lender.lending_capacity() <= 0:
+                    self.remove(position)
+                if borrower.ask_amount <= 0:
+                    break
+        return borrowed_amount
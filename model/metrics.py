@@ -0,0 +1,194 @@
+import json
+import resource
+import sys
+import time
+from collections import defaultdict
+
+import fomulas as fl
+
+try:
+    # Python 3 only
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Formulas counted per call once a model is instrumented
+FORMULAS = ['size_score', 'size_score_matrix', 'lending_decision', 'lending_decisions']
+
+# ru_maxrss is in bytes on macOS, in kilobytes elsewhere
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+def tracing():
+    return tracemalloc is not None and tracemalloc.is_tracing()
+
+
+def peak_rss():
+    '''
+    Peak resident memory of the process in bytes.
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+
+
+def reset_peak():
+    '''
+    Lowers the peak resident memory of the process to the current one,
+    which Linux allows through /proc/self/clear_refs. False when the peak
+    cannot be reset.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def resident_memory():
+    '''
+    Current and peak (since the last reset_peak) resident memory of the
+    process in bytes, from /proc/self/status.
+    '''
+    memory = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                name, value = line.split(':')
+                memory[name] = int(value.split()[0]) * 1024
+    return memory['VmRSS'], memory['VmHWM']
+
+
+class PeakMemory(object):
+    '''
+    Memory growth of nested sections. With tracemalloc running, the growth
+    of the traced bytes (traced). Where the peak can be reset, the peak
+    resident memory during the section over the resident memory at its
+    start (peak). Otherwise how much the section raised the peak of the
+    process (peak_rss), which is 0 for any section after a higher one.
+    '''
+    def __init__(self):
+        self.mode = 'traced' if tracing() else 'peak' if reset_peak() else 'peak_rss'
+        self.open = []
+
+    def enter(self):
+        if self.mode == 'traced':
+            self.open.append(tracemalloc.get_traced_memory()[0])
+        elif self.mode == 'peak_rss':
+            self.open.append(peak_rss())
+        else:
+            # the open sections keep the peak so far, the new one starts from here
+            self.raise_peaks()
+            reset_peak()
+            current = resident_memory()[0]
+            self.open.append([current, current])
+
+    def exit(self):
+        '''
+        Growth in bytes of the last entered section, which is closed.
+        '''
+        if self.mode == 'traced':
+            return tracemalloc.get_traced_memory()[0] - self.open.pop()
+        if self.mode == 'peak_rss':
+            return peak_rss() - self.open.pop()
+        self.raise_peaks()
+        start, peak = self.open.pop()
+        return peak - start
+
+    def raise_peaks(self):
+        peak = resident_memory()[1]
+        for section in self.open:
+            section[1] = max(section[1], peak)
+
+
+class CountedFormulas(object):
+    '''
+    The formulas of one instrumented model: the FORMULAS are counted by
+    its metrics, the others are the fomulas module ones.
+    '''
+    def __init__(self, metrics):
+        for name in FORMULAS:
+            setattr(self, name, metrics.wrap(name, getattr(fl, name), memory=False))
+
+    def __getattr__(self, name):
+        return getattr(fl, name)
+
+
+class RunMetrics(object):
+    '''
+    Wall time, call count and memory growth (see PeakMemory) per section
+    of a run: the stages, the bankrupting
+    cascades, the report collection and exports, and the score formulas.
+    Every cascade is also timed on its own by the processor. Nothing is measured unless a model is
+    instrumented with attach, which wraps the methods in place, so a model
+    without metrics pays nothing.
+    '''
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.memory = defaultdict(int)
+        self.peak_memory = PeakMemory()
+        self.cascades = []
+
+    def wrap(self, section, function, memory=True):
+        '''
+        function measured under section, or under section(*args) when it
+        is callable.
+        '''
+        def timed(*args, **kwargs):
+            start = time.time()
+            if memory:
+                self.peak_memory.enter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                name = section(*args) if callable(section) else section
+                self.seconds[name] += time.time() - start
+                self.calls[name] += 1
+                if memory:
+                    self.memory[name] += self.peak_memory.exit()
+        return timed
+
+    def attach(self, model):
+        model.run_model = self.wrap('run_model', model.run_model)
+        model.export_report = self.wrap('report', model.export_report)
+        schedule = model.schedule
+        schedule.step_bank = self.wrap(lambda stage: 'stage_%d' % stage, schedule.step_bank)
+        schedule.step_bankrupting = self.measure_cascades(model.bankrupting_processor, schedule.step_bankrupting)
+        model.data_collector.collect = self.wrap('collect', model.data_collector.collect)
+        model.export_interbank_matrix = self.wrap('report', model.export_interbank_matrix)
+        if model.interbank_history is not None:
+            model.interbank_history.record_coo = self.wrap('report', model.interbank_history.record_coo)
+        # the banks and the score engine of this model only, the fomulas module is shared
+        formulas = CountedFormulas(self)
+        for bank in model.banks:
+            bank.formulas = formulas
+        if schedule.score_engine is not None:
+            schedule.score_engine.formulas = formulas
+
+    def measure_cascades(self, processor, step_bankrupting):
+        '''
+        The processor times every cascade itself, the section 'cascade'
+        holds the whole calls.
+        '''
+        processor.clock = time.time
+        step_bankrupting = self.wrap('cascade', step_bankrupting)
+
+        def measured():
+            count = len(processor.cascades)
+            step_bankrupting()
+            self.cascades.extend(dict(cascade) for cascade in processor.cascades[count:])
+        return measured
+
+    def summary(self):
+        mode = self.peak_memory.mode
+        memory = {"traced": "memory", "peak": "peak_growth", "peak_rss": "peak_rss_growth"}[mode]
+        return {
+            "sections": {name: {"seconds": self.seconds[name], "calls": self.calls[name],
+                                memory: self.memory.get(name, 0)} for name in sorted(self.seconds)},
+            "cascades": self.cascades,
+            "memory": mode,
+        }
+
+    def write(self, path):
+        with open(path, 'w') as metrics_file:
+            json.dump(self.summary(), metrics_file, indent=2)
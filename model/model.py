@@ -6,93 +6,332 @@ from mesa.space import MultiGrid
 from mesa.datacollection import DataCollector
 
 from agents.bank import Bank
+from agents.array_bank import ArrayBank
 from agents.bankrupting_processor import BankruptingProcessor
 
-from data.banks_1 import params, lending_borrowing_matrix
+from data.generator import Population
+from data.store import has_dense_exposures, dense_exposures, csr_exposures
+from state import BankState
+from sparse import SparseBankState, SparseExposures
+from checkpoint import save_checkpoint, restore_checkpoint
+from collector import ColumnarCollector, exposure_coo
+from exposure_history import ExposureHistory
+from scores import ScoreEngine, LinkScoreEngine
+from market import InterbankMarket
+from ledger import RepaymentLedger
+from growth import GrowthEngine
+from convergence import Convergence
+from metrics import RunMetrics
+from parameters import model_parameters
+from distributions import seed_all, RandomStreams, UniformStream
 from schedule import RandomActivationByBreed
+from utils.logger import log, open_sink, parse_level, TextSink, DEBUG, INFO, OFF
 
 import csv
 import os
 
+import numpy as np
+
+
+def report_directory(shock_type, test_case):
+    return 'statistic_reports/' + shock_type + '/' + str(test_case)
+
+
 class CreditContagionModel(Model):
 
     initial_bank = 100
 
     ### To do
-    def __init__(self, shock_type='Type_1', shocked_bank_number=1, initial_bank=20, stable_count_limit=10, test_case=0):
+    def __init__(self, shock_type='Type_1', shocked_bank_number=1, initial_bank=20, stable_count_limit=10, test_case=0,
+                 engine='dict', verbose=False, log_level=None, trace=None, seed=None, reports=True,
+                 check_aggregates=False, collector='mesa', chunk_size=100, interbank='csv', snapshot_every=0,
+                 scores='agent', clearing=False, population=None, ledger=False, market=False,
+                 stage_1='agent', rng='global', convergence=None, metrics=False, parameters=None,
+                 exposures='dense'):
         self.name = "Credit Contagion Model"
+        self.shock_type = shock_type
+        self.test_case = test_case
 
         # Set parameters
+        self.seed = seed
+        if seed is not None:
+            seed_all(seed)
+        # rng = 'streams' gives the scheduler, the shocks, stage 1, the lending decisions and every bank
+        # their own stream derived from seed (fresh entropy when None),
+        # rng = 'global' draws everything from the global random and np.random generators
+        self.streams = RandomStreams(seed) if rng == 'streams' else None
+        # reports = False skips the per step interbank matrix files
+        self.reports = reports
         self.initial_bank = initial_bank
-        self.verbose = True
+        self.verbose = verbose
+        # behavioural parameters of the banks, model.parameters.DEFAULTS with the given overrides
+        self.parameters = model_parameters(parameters)
+        self.configure_log(verbose, log_level, trace)
 
-        self.schedule = RandomActivationByBreed(self)
+        # population = (params, lending_borrowing_matrix) or a generated Population,
+        # data.banks_1 by default. A Population sets the number of banks.
+        if population is None:
+            from data.banks_1 import params, lending_borrowing_matrix
+            population = (params, lending_borrowing_matrix)
+        if isinstance(population, Population):
+            self.initial_bank = population.size()
+            codes = population.codes
+        else:
+            codes = [population[0][i]["code"] for i in range(self.initial_bank)]
 
-        self.data_collector = self.create_data_collector()
+        # engine = 'dict' keeps one balance sheet per Bank object,
+        # engine = 'array' keeps all balance sheets in a shared BankState
+        self.engine = engine
+        # exposures = 'dense' keeps the exposures of the array engine in an N x N array,
+        # exposures = 'sparse' in CSR with the lenders and borrowers of every bank, as large as the links
+        if exposures == 'sparse' and engine != 'array':
+            raise ValueError("exposures='sparse' needs engine='array'")
+        self.exposures = exposures
+        self.mapped_exposures = False
+        self.state = self.create_state(codes, population) if engine == 'array' else None
 
-        bankrupting_processor = BankruptingProcessor()
+        self.schedule = RandomActivationByBreed(self, self.state)
+
+        # clearing = True compares every default cascade with its Eisenberg-Noe clearing
+        bankrupting_processor = BankruptingProcessor(clearing=clearing)
+        random_stream = UniformStream(random_state=self.streams.stream('decisions')) if self.streams is not None \
+            else UniformStream()
+        self.random_stream = random_stream
+        # market = True clears stage 2 for all borrowers with one InterbankMarket,
+        # market = False lets every borrower ask the others in the order of its total scores
+        market = InterbankMarket() if market else None
+        # ledger = True keeps the repayment schedules of all banks in one RepaymentLedger,
+        # ledger = False in a list per bank and relation
+        self.ledger = RepaymentLedger(codes, self.parameters["loan_term"]) if ledger else None
         self.shocked_bank_number = shocked_bank_number
+        # shock rate and codes of the shocked banks, None for the bank default and random banks
+        self.shock_rate = None
+        self.shocked_codes = None
         agents = []
-        for i in range(self.initial_bank):
-            params[i]["lendings"] = lending_borrowing_matrix[params[i]["code"]]
-            params[i]["borrowings"] = { bank: lending_borrowing_matrix[bank][params[i]["code"]] for bank in lending_borrowing_matrix }
-            params[i]["bankrupting_processor"] = bankrupting_processor
-            agent = Bank(params[i])
+        for bank_params in self.bank_params(population):
+            bank_params["bankrupting_processor"] = bankrupting_processor
+            bank_params["check_aggregates"] = check_aggregates
+            bank_params["random_stream"] = random_stream
+            bank_params["market"] = market
+            bank_params["ledger"] = self.ledger
+            bank_params.update(self.parameters)
+            if self.streams is not None:
+                bank_params["random"] = self.streams.stream('bank', bank_params["code"])
+            agent = ArrayBank(bank_params, self.state) if self.state is not None else Bank(bank_params)
             agents.append(agent)
 
+        # scores = 'matrix' scores all banks at once per stage with a ScoreEngine,
+        # or a LinkScoreEngine as large as the links with sparse exposures,
+        # scores = 'agent' lets every bank score the others on its own
+        if scores == 'matrix':
+            score_class = LinkScoreEngine if exposures == 'sparse' else ScoreEngine
+            score_engine = score_class(agents, self.state, self.parameters["total_score_weight"])
+            for agent in agents:
+                agent.attach_score_engine(score_engine)
+            score_engine.init_scores()
+            self.schedule.score_engine = score_engine
+            if market is not None:
+                market.score_engine = score_engine
+        self.schedule.market = market
+        # stage_1 = 'bulk' updates the balance sheets of all banks at once with a GrowthEngine,
+        # stage_1 = 'agent' lets every bank draw its own samples
+        if stage_1 == 'bulk':
+            self.schedule.growth_engine = GrowthEngine(agents, self.state)
+        if self.streams is not None:
+            self.schedule.random = self.streams.stream('schedule')
+            if self.schedule.growth_engine is not None:
+                self.schedule.growth_engine.random = self.streams.stream('growth')
+        self.schedule.ledger = self.ledger
+
         for agent in agents:
-            other_agents = agent.other_agents(agents)
-            agent.init_scores(other_agents)
             self.schedule.add(agent)
+        if scores != 'matrix':
+            for agent in agents:
+                agent.init_scores(self.schedule.bank_index.others(agent))
 
         bankrupting_processor.set_context({"banks": agents})
         self.schedule.add(bankrupting_processor)
+        self.bankrupting_processor = bankrupting_processor
+        # Banks in construction order, the schedule shuffles its own list
+        self.banks = agents
+
+        # collector = 'mesa' keeps every report in memory until export_report,
+        # collector = 'columnar' (npz) or 'parquet' streams typed arrays to disk in chunks
+        self.collector = collector
+        if collector in ['columnar', 'parquet']:
+            self.data_collector = ColumnarCollector(self.build_directory('columnar'), [bank.code for bank in agents],
+                                                    chunk_size=chunk_size,
+                                                    format='parquet' if collector == 'parquet' else 'npz',
+                                                    meta={"shock_type": shock_type, "test_case": test_case,
+                                                          "seed": seed, "rng": self.describe_rng()})
+        else:
+            self.data_collector = self.create_data_collector()
+
+        # interbank = 'csv' writes a dense matrix file per step,
+        # interbank = 'history' appends sparse changes to a single file
+        self.interbank = interbank
+        self.interbank_history = None
+        if reports and interbank == 'history':
+            self.interbank_history = ExposureHistory(self.build_file_path('interbank_history').replace('.csv', '.npy'),
+                                                     [bank.code for bank in agents], snapshot_every)
 
-        self.shock_type = shock_type
         self.stable_count_limit = stable_count_limit
-        self.test_case = test_case
+        # stopping rules of run_model, by default when no bank went bankrupt for stable_count_limit steps
+        self.convergence = convergence if convergence is not None else Convergence()
+        # loop variables of run_model, kept to resume a run
+        self.progress = None
+
+        # metrics = True measures the stages, cascades, reports and formula calls in a RunMetrics,
+        # written next to the reports by export_report
+        self.metrics = None
+        if metrics:
+            self.metrics = RunMetrics()
+            self.metrics.attach(self)
+
+    def create_state(self, codes, population):
+        '''
+        The exposures of a population saved by data.store are mapped
+        copy-on-write instead of loaded, so the models of every process
+        share the pages none of them changed.
+        '''
+        directory = population.directory if isinstance(population, Population) else None
+        if self.exposures == 'sparse':
+            self.mapped_exposures = directory is not None
+            return SparseBankState(codes, SparseExposures(len(codes), *csr_exposures(directory))
+                                   if self.mapped_exposures else None)
+        self.mapped_exposures = directory is not None and has_dense_exposures(directory)
+        return BankState(codes, dense_exposures(directory) if self.mapped_exposures else None)
+
+    def bank_params(self, population):
+        '''
+        New params of every bank, the population itself is never modified.
+        The array engine loads the exposures of a Population in one pass and
+        its banks get no interbank dicts at all.
+        '''
+        if isinstance(population, Population):
+            if self.state is not None:
+                if not self.mapped_exposures:
+                    self.state.load_exposures(population.rows, population.cols, population.values)
+                return [population.bank_params(i) for i in range(population.size())]
+            population = population.to_params()
 
-    def step(self, i_step, shock=False):
-        if shock:
-            self.shocked_bank(self.shocked_bank_number)
-        self.data_collector.collect(self)
-        self.export_interbank_matrix(i_step)
-
-        stages = [1, 2, 3, 4]
-        for stage in stages:
-            self.schedule.step(stage, cycle_stage=stages.__len__())
-
-        if self.verbose:
-            print([self.schedule.time,
-                   self.schedule.get_breed_count(Bank)])
-
-    def run_model(self, limit_step=1, stable_count_limit=10):
-        self.stable_count_limit = self.stable_count_limit or stable_count_limit
-        if self.verbose:
-            print('Project Name: ' + self.name)
-            print('Initial number banks: ',
-                  self.schedule.get_breed_count(Bank))
-
-        step, i, stable_count, bankrupted_bank_count = 0, 0, 0, 0
-        while step < limit_step or stable_count < self.stable_count_limit:
-            self.schedule.set_run_time(step + i)
-            count = self.initial_bank - self.schedule.number_bankrupted_bank()
-            if bankrupted_bank_count != count:
-                stable_count = 0
-                bankrupted_bank_count = count
-            else:
-                stable_count += 1
-
-            step, i = (step + 1, i) if step <= limit_step else (step, i + 1)
-            if step == limit_step:
-                self.step(step + i, True)
-            else:
-                self.step(step + i)
+        params, lending_borrowing_matrix = population
+        if isinstance(self.state, SparseBankState):
+            # loaded in one pass, inserting the links bank by bank would rebuild the CSR over and over
+            index = self.state.index
+            links = [(index[lender], index[borrower], amount) for lender in lending_borrowing_matrix if lender in index
+                     for borrower, amount in lending_borrowing_matrix[lender].items()
+                     if borrower in index and borrower != lender and amount != 0]
+            rows, cols, values = [np.array(column) for column in zip(*links)] if links else [np.zeros(0)] * 3
+            self.state.load_exposures(rows.astype(np.int64), cols.astype(np.int64), values)
+            return [dict(params[i]) for i in range(self.initial_bank)]
+        borrowings = {}
+        for lender in lending_borrowing_matrix:
+            for borrower, amount in lending_borrowing_matrix[lender].items():
+                borrowings.setdefault(borrower, {})[lender] = amount
+        return [dict(params[i], lendings=lending_borrowing_matrix[params[i]["code"]],
+                     borrowings=borrowings.get(params[i]["code"], {})) for i in range(self.initial_bank)]
+
+    def step(self, i_step, shock=False, quiet=False):
+        '''
+        quiet=True skips the interbank export and the mesa collector, for
+        steps only waiting for stability. Its model and agent reports keep
+        one row per collected step, the Step column tells which.
+        '''
+        with log.using(self.log_level, self.log_sinks):
+            if shock:
+                self.shocked_bank(self.shocked_bank_number, self.shock_rate, self.shocked_codes)
+            if not quiet or self.collector != 'mesa':
+                self.data_collector.collect(self)
+            if not quiet:
+                if self.interbank_history is not None:
+                    self.interbank_history.record_coo(i_step, *exposure_coo(self))
+                elif self.reports:
+                    self.export_interbank_matrix(i_step)
+
+            stages = [1, 2, 3, 4]
+            for stage in stages:
+                self.schedule.step(stage, cycle_stage=stages.__len__())
+
+            log.info('step', time=self.schedule.time, banks=self.schedule.get_breed_count(Bank))
+
+    def configure_log(self, verbose, log_level, trace):
+        '''
+        verbose prints INFO events, trace is a .jsonl or binary file receiving
+        DEBUG events unless log_level, a level or its name, says otherwise.
+        Silent by default. The level and sinks belong to this model: they
+        are only put on the shared log while it steps, so models built
+        later never close or steal its trace.
+        '''
+        sinks = [TextSink()] if verbose else []
+        if trace is not None:
+            sinks.append(open_sink(trace))
+        if log_level is None:
+            log_level = DEBUG if trace is not None else INFO if verbose else OFF
+        self.log_level = parse_level(log_level)
+        if self.log_level < OFF and not sinks:
+            sinks = [TextSink()]
+        self.log_sinks = sinks
+
+    def close_log(self):
+        for sink in self.log_sinks:
+            sink.close()
+        self.log_sinks = []
+
+    def run_model(self, limit_step=1, stable_count_limit=10, stop_before_shock=False):
+        '''
+        Runs until the convergence rules stop it, by default when the
+        number of live banks is stable. The shock hits at step limit_step.
+        stop_before_shock=True returns right before it, so the model can be
+        checkpointed; calling run_model again resumes.
+        '''
+        with log.using(self.log_level, self.log_sinks):
+            self.stable_count_limit = self.stable_count_limit or stable_count_limit
+            convergence = self.convergence
+            if self.progress is None:
+                log.info('model', project=self.name, banks=self.schedule.get_breed_count(Bank))
+                self.progress = convergence.start()
+
+            progress = self.progress
+            while not convergence.stop(self, progress, limit_step, self.stable_count_limit):
+                if stop_before_shock and progress["step"] + 1 == limit_step:
+                    break
+                step, i = progress["step"], progress["i"]
+                self.schedule.set_run_time(step + i)
+                convergence.observe(self, progress)
+
+                step, i = (step + 1, i) if step <= limit_step else (step, i + 1)
+                progress["step"], progress["i"] = step, i
+                self.step(step + i, step == limit_step, convergence.quiet(progress, limit_step))
+
+            log.flush()
+
+    def describe_rng(self):
+        return self.streams.describe() if self.streams is not None else {"seed": self.seed, "generator": "global"}
+
+    def reseed(self, seed):
+        '''
+        Seeds every generator of the model again, dropping the decision
+        uniforms drawn in advance.
+        '''
+        self.seed = seed
+        seed_all(seed)
+        if self.streams is not None:
+            self.streams.reseed(seed)
+        self.random_stream.block = self.random_stream.block[:0]
+        self.random_stream.position = 0
+
+    def checkpoint(self, path):
+        save_checkpoint(self, path)
+
+    def restore(self, path):
+        return restore_checkpoint(self, path)
 
     def create_data_collector(self):
         model_reporters = {
             "Type_Test": lambda m: "Type 1",
             "Test_Case": lambda m: m.test_case,
+            "Entropy": lambda m: m.streams.entropy if m.streams is not None else m.seed,
             "Step": lambda m: m.schedule.get_run_time(),
             "Banks": lambda m: m.schedule.get_breed_count(Bank),
             "Total_Asset": lambda m: m.schedule.total_assets(),
@@ -108,12 +347,19 @@ class CreditContagionModel(Model):
             "external_asset": lambda bank: str(round(bank.external_asset, 5)) + ('(shocked)' if bank.is_shocked else ""),
             "scheduled_repayment_amount": lambda bank: copy.deepcopy(bank.round_scheduled_repayment_amount()),
             "lendings": lambda bank: copy.deepcopy({_: round(bank.lendings[_], 5) for _ in bank.lendings}),
-            "borrowings": lambda bank: copy.deepcopy({_: round(bank.lendings[_], 5) for _ in bank.borrowings}),
+            "borrowings": lambda bank: copy.deepcopy({_: round(bank.borrowings[_], 5) for _ in bank.borrowings}),
             "is_bankrupted": lambda bank: bank.bankrupted
         }
         return DataCollector(model_reporters, agent_reporters)
 
     def export_report(self):
+        if self.metrics is not None:
+            self.metrics.write(self.build_file_path('metrics').replace('.csv', '.json'))
+        if self.interbank_history is not None:
+            self.interbank_history.close()
+        if self.collector in ['columnar', 'parquet']:
+            self.data_collector.close()
+            return
         self.export_agent_vars()
         self.export_model_vars()
 
@@ -146,18 +392,27 @@ class CreditContagionModel(Model):
             for interbank_row in interbank_matrix:
                 spamwriter.writerow(interbank_row)
 
+    def build_directory(self, report_type):
+        return report_directory(self.shock_type, self.test_case) + '/' + report_type
+
     def build_file_path(self, report_type):
-        file_path = 'statistic_reports/' + self.shock_type + '/' + str(self.test_case) + '/' + report_type + '.csv'
+        file_path = report_directory(self.shock_type, self.test_case) + '/' + report_type + '.csv'
         directory = os.path.dirname(file_path)
         if not os.path.exists(directory):
             os.makedirs(directory)
         return file_path
 
-    def shocked_bank(self, number_of_banks):
+    def shocked_bank(self, number_of_banks, shock_rate=None, codes=None):
+        if codes is not None:
+            for bank in self.banks:
+                if bank.code in codes and not bank.is_bankrupted():
+                    bank.set_shock(shock_rate=shock_rate)
+            return
         shock_count = 0
         banks = self.schedule.agents_by_breed[Bank]
         while shock_count < number_of_banks:
-            bank_index = random.randint(0, self.initial_bank - 1)
+            bank_index = random.randint(0, self.initial_bank - 1) if self.streams is None \
+                else int(self.streams.stream('shock').choice(self.initial_bank))
             if not banks[bank_index].is_bankrupted():
                 shock_count += 1
-                banks[bank_index].set_shock()
\ No newline at end of file
+                banks[bank_index].set_shock(shock_rate=shock_rate)
\ No newline at end of file
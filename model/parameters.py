@@ -0,0 +1,27 @@
+from data.contanst import ALPHA_RANGE, LARGE_BANK_ALPHA_RANGE, BETA_RANGE, LOAN_TERM, TOTAL_SCORE_WEIGHT
+
+# Behavioural parameters a model can override, with the defaults banks fall back to
+DEFAULTS = {
+    "alpha_range": ALPHA_RANGE,
+    "large_bank_alpha_range": LARGE_BANK_ALPHA_RANGE,
+    "beta_range": BETA_RANGE,
+    "loan_term": LOAN_TERM,
+    "total_score_weight": TOTAL_SCORE_WEIGHT,
+    "shock_rate": 0.5,
+}
+
+
+def model_parameters(parameters=None):
+    '''
+    DEFAULTS with the given overrides, checked. Only the model receiving
+    them is affected, data.contanst is never modified.
+    '''
+    parameters = dict(parameters or {})
+    unknown = sorted(set(parameters) - set(DEFAULTS))
+    if unknown:
+        raise ValueError("Unknown model parameters: %s" % ", ".join(unknown))
+    if int(parameters.get("loan_term", LOAN_TERM)) < 1:
+        raise ValueError("loan_term must be at least 1")
+    if "loan_term" in parameters:
+        parameters["loan_term"] = int(parameters["loan_term"])
+    return dict(DEFAULTS, **parameters)
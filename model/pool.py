@@ -0,0 +1,35 @@
+import multiprocessing
+
+
+def call(task):
+    index, function, argument = task
+    return index, function(argument)
+
+
+def run_pool(function, tasks, processes=None, progress=None):
+    '''
+    function(task) of every task, in the order of tasks. processes=1 runs
+    them in the current process, otherwise they run over a pool of forked
+    workers, so function must be a module level function. progress(done,
+    total) is called after every finished task.
+    '''
+    results = [None] * len(tasks)
+    if processes == 1:
+        for index, task in enumerate(tasks):
+            results[index] = function(task)
+            if progress is not None:
+                progress(index + 1, len(tasks))
+        return results
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        done = 0
+        for index, result in pool.imap_unordered(call, [(index, function, task) for index, task in enumerate(tasks)]):
+            results[index] = result
+            done += 1
+            if progress is not None:
+                progress(done, len(tasks))
+    finally:
+        pool.close()
+        pool.join()
+    return results
@@ -0,0 +1,98 @@
+import itertools
+from io import BytesIO
+
+from checkpoint import save_checkpoint, restore_checkpoint
+from distributions import derive_seed
+from pool import run_pool
+
+# Values of a finished run, as summarize gives them
+SUMMARY_VALUES = ['steps', 'live_banks', 'bankrupted_banks', 'affected_banks', 'total_asset', 'total_equity',
+                  'defaults']
+SUMMARY_FIELDS = ['scenario', 'shocked_bank_number', 'shock_rate', 'shocked_codes', 'seed'] + SUMMARY_VALUES
+
+# ScenarioRunner of the current batch, inherited by forked workers
+_runner = None
+
+
+def build_scenarios(shocked_bank_numbers=(1,), shock_rates=(None,), shocked_codes=(None,), replications=1,
+                    base_seed=None):
+    '''
+    One scenario per combination. With base_seed=None every scenario goes
+    on with the random streams of the burn-in (common random numbers), so
+    scenarios only differ by their shock; otherwise each replication gets
+    its own derived seed.
+    '''
+    scenarios = []
+    for number, rate, codes, replication in itertools.product(shocked_bank_numbers, shock_rates, shocked_codes,
+                                                              range(replications)):
+        scenarios.append({
+            "scenario": len(scenarios),
+            "shocked_bank_number": number,
+            "shock_rate": rate,
+            "shocked_codes": list(codes) if codes is not None else None,
+            "seed": derive_seed(base_seed, number, rate, codes, replication) if base_seed is not None else None,
+        })
+    return scenarios
+
+
+def summarize(model):
+    schedule = model.schedule
+    return {
+        "steps": schedule.get_run_time(),
+        "live_banks": schedule.number_live_bank(),
+        "bankrupted_banks": schedule.number_bankrupted_bank(),
+        "affected_banks": schedule.number_affected_bank(),
+        "total_asset": schedule.total_assets(),
+        "total_equity": schedule.total_equity(),
+        "defaults": sum(cascade["defaults"] for cascade in model.bankrupting_processor.cascades),
+    }
+
+
+class ScenarioRunner(object):
+    '''
+    Runs the burn-in of model once, up to the step before the shock, and
+    keeps it as an in memory checkpoint. Every scenario restores that
+    checkpoint into the same Bank objects and state arrays, nothing is
+    deep copied. Parallel workers are forked after the burn-in, so they
+    share its memory copy-on-write.
+
+    Build the model with reports=False: report files are not scenario aware.
+    '''
+    def __init__(self, model, limit_step=1):
+        self.model = model
+        self.limit_step = limit_step
+        model.run_model(limit_step, stop_before_shock=True)
+        snapshot = BytesIO()
+        save_checkpoint(model, snapshot)
+        self.snapshot = snapshot.getvalue()
+
+    def run(self, scenario):
+        model = self.model
+        restore_checkpoint(model, BytesIO(self.snapshot))
+        if scenario.get("seed") is not None:
+            model.reseed(scenario["seed"])
+        model.shocked_bank_number = scenario.get("shocked_bank_number", model.shocked_bank_number)
+        model.shock_rate = scenario.get("shock_rate")
+        model.shocked_codes = scenario.get("shocked_codes")
+        model.bankrupting_processor.cascades = []
+        if model.collector == 'mesa':
+            model.data_collector = model.create_data_collector()
+
+        model.run_model(self.limit_step)
+        return dict(scenario, **summarize(model))
+
+    def run_all(self, scenarios, processes=1, progress=None):
+        '''
+        Summaries of the scenarios, in order. processes > 1 runs them in
+        forked workers.
+        '''
+        global _runner
+        _runner = self
+        try:
+            return run_pool(run_forked, scenarios, processes, progress)
+        finally:
+            _runner = None
+
+
+def run_forked(scenario):
+    return _runner.run(scenario)
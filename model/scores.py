@@ -0,0 +1,219 @@
+import numpy as np
+
+import fomulas as fl
+from data.contanst import TOTAL_SCORE_WEIGHT
+
+
+class ScoreEngine(object):
+    '''
+    Size, relation and total scores of every bank with every other bank as
+    NxN matrices. Row i holds the scores of bank i, recomputed for all banks
+    in one pass per stage by update().
+    '''
+    # arrays of a checkpoint
+    FIELDS = ["relation", "size", "total", "live"]
+    # whether every bank has the same relation score with all the others
+    uniform_relations = False
+    # the formulas module, or the counted formulas of an instrumented model
+    formulas = fl
+
+    def __init__(self, banks, state=None, weight=TOTAL_SCORE_WEIGHT):
+        self.banks = list(banks)
+        self.state = state
+        self.weight = weight
+        self.position = {bank.code: i for i, bank in enumerate(self.banks)}
+
+        size = len(self.banks)
+        if state is not None:
+            # relation indicators are the initial lendings
+            rows, cols, values = state.exposure_coo()
+            self.indicators = np.zeros((size, size))
+            self.indicators[rows, cols] = values > 0
+            np.fill_diagonal(self.indicators, 0)
+        else:
+            self.indicators = np.array([[bank.relation_indicators.get(other.code, 0) for other in self.banks]
+                                        for bank in self.banks], dtype=float).reshape(size, size)
+        self.relation = np.zeros((size, size))
+        self.size = np.zeros((size, size))
+        self.total = np.zeros((size, size))
+        self.live = np.zeros(size, dtype=bool)
+
+    def total_assets(self):
+        if self.state is not None:
+            return self.state.total_asset()
+        return np.array([bank.total_asset() for bank in self.banks])
+
+    def init_scores(self):
+        '''
+        Vectorized Bank.init_scores of every bank.
+        '''
+        total_borrowings = np.array([bank.total_borrowings() for bank in self.banks])
+        self.relation[:] = np.where(total_borrowings > 0, np.log(np.where(total_borrowings > 0, total_borrowings, 1)),
+                                    0)[:, np.newaxis]
+        np.fill_diagonal(self.relation, 0)
+        self.update()
+
+    def update(self):
+        '''
+        Vectorized Bank.update_size_score and update_total_score of every bank.
+        '''
+        total_assets = self.total_assets()
+        self.live = np.round(total_assets, 0) > 0
+        scores = self.formulas.size_score_matrix(np.maximum(total_assets, 0), self.indicators, self.live)
+        max_scores = np.abs(scores).max(axis=1) if len(scores) > 0 else np.zeros(0)
+        self.size = 5 * scores / np.where(max_scores != 0, max_scores, 1)[:, np.newaxis]
+        self.total = self.weight[0] * self.relation + self.weight[1] * self.size
+
+    def update_relation(self, bank, borrowed_amount):
+        '''
+        Bank.update_relation_score of one bank with all live banks.
+        '''
+        i = self.position[bank.code]
+        live = self.live.copy()
+        live[i] = False
+        self.relation[i, live] = self.formulas.relation_score(self.relation[i, live], borrowed_amount)
+
+    def live_banks(self, bank, banks):
+        '''
+        The banks of a stage that bank can trade with, as update_size_score returned.
+        '''
+        return LiveBanks(self, bank, banks)
+
+    def scores(self, name, rows, cols):
+        '''
+        Scores called name ('relation', 'size' or 'total') of banks rows with
+        banks cols, positions broadcast against each other.
+        '''
+        return getattr(self, name)[rows, cols]
+
+    def scores_towards(self, bank, lenders):
+        '''
+        Total score of every lender with bank, as an array.
+        '''
+        rows = np.array([self.position[lender.code] for lender in lenders], dtype=int)
+        return self.scores('total', rows, self.position[bank.code])
+
+
+class LinkScoreEngine(ScoreEngine):
+    '''
+    The scores of ScoreEngine in memory as large as the links, for sparse
+    exposures.
+
+    A relation score row only ever changes as a whole, so one relation
+    score per bank holds it. The size score of bank i with bank j is
+    5 * (log A_j - mean_i) / scale_i, where mean_i averages the log assets
+    of the live banks i first lent to and scale_i is the largest distance
+    of a live log asset from mean_i. update() computes these per bank from
+    the links and the extreme assets; the scores of a pair are computed
+    when they are asked for. Like the total matrix, total scores use the
+    relation scores as of the last update().
+    '''
+    FIELDS = ["relation", "total_relation", "mean", "scale", "log_assets", "live"]
+    uniform_relations = True
+
+    def __init__(self, banks, state=None, weight=TOTAL_SCORE_WEIGHT):
+        self.banks = list(banks)
+        self.state = state
+        self.weight = weight
+        self.position = {bank.code: i for i, bank in enumerate(self.banks)}
+
+        size = len(self.banks)
+        if state is not None:
+            rows, cols, values = state.exposure_coo()
+        else:
+            links = [(i, self.position[code]) for i, bank in enumerate(self.banks)
+                     for code, indicator in bank.relation_indicators.items() if indicator and code in self.position]
+            rows, cols = (np.array(_, dtype=int) for _ in zip(*links)) if links else (np.zeros(0, dtype=int),) * 2
+            values = np.ones(len(rows))
+        keep = (values > 0) & (rows != cols)
+        # relation indicators, the initial lendings
+        self.links = (rows[keep], cols[keep])
+        self.relation = np.zeros(size)
+        self.total_relation = np.zeros(size)
+        self.mean = np.zeros(size)
+        self.scale = np.ones(size)
+        self.log_assets = np.zeros(size)
+        self.live = np.zeros(size, dtype=bool)
+
+    def init_scores(self):
+        total_borrowings = np.array([bank.total_borrowings() for bank in self.banks])
+        self.relation[:] = np.where(total_borrowings > 0, np.log(np.where(total_borrowings > 0, total_borrowings, 1)),
+                                    0)
+        self.update()
+
+    def update(self):
+        total_assets = self.total_assets()
+        self.live = np.round(total_assets, 0) > 0
+        self.log_assets = np.log(np.where(self.live, np.maximum(total_assets, 0), 1.0))
+        size = len(self.banks)
+        rows, cols = self.links
+        linked = self.live[cols]
+        count = np.bincount(rows, weights=linked, minlength=size)
+        total = np.bincount(rows, weights=np.where(linked, self.log_assets[cols], 0), minlength=size)
+        self.mean = total / np.where(count != 0, count, 1)
+
+        # the live log assets farthest from mean_i, leaving bank i out
+        scale = np.zeros(size)
+        live = np.flatnonzero(self.live)
+        if len(live) > 0:
+            order = live[np.argsort(self.log_assets[live], kind='mergesort')]
+            for extreme, second in [(order[-1], order[-2:-1]), (order[0], order[1:2])]:
+                values = np.full(size, self.log_assets[extreme])
+                # the extreme bank itself is farthest from the next one, if any
+                values[extreme] = self.log_assets[second[0]] if len(second) > 0 else self.mean[extreme]
+                scale = np.maximum(scale, np.abs(values - self.mean))
+        self.scale = np.where(scale != 0, scale, 1)
+        self.total_relation = self.relation.copy()
+
+    def update_relation(self, bank, borrowed_amount):
+        i = self.position[bank.code]
+        self.relation[i] = self.formulas.relation_score(self.relation[i], borrowed_amount)
+
+    def scores(self, name, rows, cols):
+        rows, cols = np.broadcast_arrays(rows, cols)
+        others = rows != cols
+        if name == 'relation':
+            return np.where(others, self.relation[rows], 0)
+        size = np.where(others & self.live[cols], 5 * (self.log_assets[cols] - self.mean[rows]) / self.scale[rows],
+                        0)
+        if name == 'size':
+            return size
+        return self.weight[0] * np.where(others, self.total_relation[rows], 0) + self.weight[1] * size
+
+
+class LiveBanks(object):
+    '''
+    The live banks of banks but bank, filtered while iterated: a borrower
+    served by the InterbankMarket never walks all of them.
+    '''
+    def __init__(self, engine, bank, banks):
+        self.engine = engine
+        self.code = bank.code
+        self.banks = banks
+
+    def __iter__(self):
+        live, position = self.engine.live, self.engine.position
+        return (other for other in self.banks if live[position[other.code]] and other.code != self.code)
+
+
+class ScoreRow(object):
+    '''
+    Read only view of one row of a score matrix keyed by Bank, standing in
+    for the per bank score dicts.
+    '''
+    def __init__(self, engine, name, bank):
+        self.engine = engine
+        self.name = name
+        self.index = engine.position[bank.code]
+
+    def __getitem__(self, bank):
+        return float(self.engine.scores(self.name, self.index, self.engine.position[bank.code]))
+
+    def __contains__(self, bank):
+        j = self.engine.position.get(bank.code)
+        return j is not None and j != self.index and self.engine.live[j]
+
+    def get(self, bank, default=None):
+        if bank in self:
+            return self[bank]
+        return default
@@ -0,0 +1,238 @@
+import numpy as np
+
+from state import BankState
+
+
+def csr_index(size, indptr, indices):
+    '''
+    rows, keys, order and col_indptr of a CSR, the arrays SparseExposures
+    searches links with. data.store saves them next to the CSR.
+    '''
+    rows = np.repeat(np.arange(size, dtype=np.int64), np.diff(indptr))
+    # rows * size + indices, sorted, to find many links at once
+    keys = rows * size + indices
+    order = np.argsort(indices, kind='mergesort')
+    col_indptr = np.searchsorted(indices[order], np.arange(size + 1))
+    return rows, keys, order, col_indptr
+
+
+class SparseExposures(object):
+    '''
+    Exposure matrix in CSR: the borrowers of bank i are
+    indices[indptr[i]:indptr[i + 1]], sorted, with the amounts lent at the
+    same positions of data. order holds the positions column by column
+    (CSC), so the lenders of a bank are found in its degree as well.
+
+    Links made after the CSR was built go to per row dicts, with the rows
+    of every column in per column sets, until there are enough of them for
+    compact() to merge them in. The CSR arrays may be maps of a file:
+    indptr, indices and the csr_index arrays are only read, data is
+    written in place.
+    '''
+    def __init__(self, size, indptr, indices, data, index=None):
+        self.size = size
+        self.build(indptr, indices, data, index)
+
+    def build(self, indptr, indices, data, index=None):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.rows, self.keys, self.order, self.col_indptr = index if index is not None else \
+            csr_index(self.size, indptr, indices)
+        # row -> {col: amount} and col -> set of rows of the links outside the CSR
+        self.added_rows = {}
+        self.added_cols = {}
+        self.added = 0
+
+    @classmethod
+    def from_coo(cls, size, rows, cols, values):
+        '''
+        values[k] lent by rows[k] to cols[k]; zeros are dropped and the last
+        of duplicate links is kept.
+        '''
+        rows, cols, values = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64), \
+            np.asarray(values, dtype=float)
+        keys = rows * size + cols
+        order = np.argsort(keys, kind='mergesort')
+        last = np.append(keys[order][1:] != keys[order][:-1], True) if len(keys) > 0 else np.zeros(0, dtype=bool)
+        order = order[last & (values[order] != 0)]
+        indptr = np.searchsorted(rows[order], np.arange(size + 1))
+        return cls(size, indptr, cols[order], values[order])
+
+    def position(self, i, j):
+        key = i * self.size + j
+        k = int(np.searchsorted(self.keys, key))
+        return k if k < len(self.keys) and self.keys[k] == key else -1
+
+    def locate(self, rows, cols):
+        '''
+        Positions in data of many links and whether each one is in the CSR.
+        '''
+        keys = rows * self.size + cols
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+        k = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return k, self.keys[k] == keys
+
+    def get(self, i, j):
+        k = self.position(i, j)
+        if k >= 0:
+            return float(self.data[k])
+        return self.added_rows.get(i, {}).get(j, 0.0)
+
+    def set(self, i, j, amount):
+        '''
+        Sets the amount lent by bank i to bank j, returns the previous one.
+        '''
+        k = self.position(i, j)
+        if k >= 0:
+            previous = float(self.data[k])
+            self.data[k] = amount
+            return previous
+        row = self.added_rows.setdefault(i, {})
+        previous = row.get(j, 0.0)
+        if amount != 0:
+            if j not in row:
+                self.added_cols.setdefault(j, set()).add(i)
+                self.added += 1
+            row[j] = amount
+            if self.added > max(1024, len(self.keys) // 4):
+                self.compact()
+        elif j in row:
+            del row[j]
+            self.added_cols[j].discard(i)
+            self.added -= 1
+        return previous
+
+    def get_many(self, rows, cols):
+        k, found = self.locate(rows, cols)
+        values = np.where(found, self.data[k] if len(self.keys) > 0 else 0, 0.0)
+        if self.added:
+            for m in np.flatnonzero(~found):
+                values[m] = self.added_rows.get(rows[m], {}).get(cols[m], 0.0)
+        return values
+
+    def add_many(self, rows, cols, amounts):
+        '''
+        Adds amounts to distinct links.
+        '''
+        k, found = self.locate(rows, cols)
+        self.data[k[found]] += amounts[found]
+        for m in np.flatnonzero(~found):
+            self.set(rows[m], cols[m], self.get(rows[m], cols[m]) + amounts[m])
+
+    def row(self, i):
+        '''
+        Borrowers of bank i and the amounts lent to them, by index.
+        '''
+        start, end = self.indptr[i], self.indptr[i + 1]
+        indices, values = self.indices[start:end], self.data[start:end]
+        added = self.added_rows.get(i)
+        if added:
+            indices = np.concatenate([indices, np.array(list(added.keys()), dtype=np.int64)])
+            values = np.concatenate([values, np.array(list(added.values()), dtype=float)])
+            order = np.argsort(indices, kind='mergesort')
+            indices, values = indices[order], values[order]
+        return indices, values
+
+    def column(self, j):
+        '''
+        Lenders of bank j and the amounts they lent to it, by index.
+        '''
+        positions = self.order[self.col_indptr[j]:self.col_indptr[j + 1]]
+        indices, values = self.rows[positions], self.data[positions]
+        added = self.added_cols.get(j)
+        if added:
+            lenders = sorted(added)
+            indices = np.concatenate([indices, np.array(lenders, dtype=np.int64)])
+            values = np.concatenate([values, np.array([self.added_rows[i][j] for i in lenders], dtype=float)])
+            order = np.argsort(indices, kind='mergesort')
+            indices, values = indices[order], values[order]
+        return indices, values
+
+    def coo(self):
+        '''
+        rows, cols and values of the nonzero links, in row order.
+        '''
+        keep = self.data != 0
+        rows, cols, values = self.rows[keep], self.indices[keep], self.data[keep]
+        if self.added:
+            added = [(i, j, amount) for i, row in self.added_rows.items() for j, amount in row.items()]
+            added_rows, added_cols, added_values = [np.array(column) for column in zip(*added)]
+            rows = np.concatenate([rows, added_rows.astype(np.int64)])
+            cols = np.concatenate([cols, added_cols.astype(np.int64)])
+            values = np.concatenate([values, added_values.astype(float)])
+            order = np.lexsort((cols, rows))
+            rows, cols, values = rows[order], cols[order], values[order]
+        return rows, cols, values
+
+    def compact(self):
+        '''
+        Rebuilds the CSR with the added links, dropping the zeros.
+        '''
+        self.build(*SparseExposures.from_coo(self.size, *self.coo()).csr())
+
+    def csr(self):
+        return self.indptr, self.indices, self.data
+
+    def sums(self):
+        '''
+        Lendings and borrowings of every bank.
+        '''
+        rows, cols, values = self.coo()
+        return np.bincount(rows, weights=values, minlength=self.size), \
+            np.bincount(cols, weights=values, minlength=self.size)
+
+    def toarray(self):
+        matrix = np.zeros((self.size, self.size))
+        rows, cols, values = self.coo()
+        matrix[rows, cols] = values
+        return matrix
+
+
+class SparseBankState(BankState):
+    '''
+    BankState keeping the exposures in a SparseExposures: their memory and
+    the work of reading or updating the exposures of a bank follow the
+    links of the network instead of N^2. The balance sheet arrays are the
+    same. Models with sparse exposures score through a LinkScoreEngine,
+    which does not hold N x N matrices either.
+    '''
+    def __init__(self, codes, exposures=None):
+        size = len(codes)
+        if exposures is None:
+            exposures = SparseExposures(size, np.zeros(size + 1, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                                        np.zeros(0))
+        BankState.__init__(self, codes, exposures)
+
+    def exposure(self, lender, borrower):
+        return self.exposures.get(lender, borrower)
+
+    def set_exposure(self, lender, borrower, amount):
+        delta = amount - self.exposures.set(lender, borrower, amount)
+        self.lending_total[lender] += delta
+        self.borrowing_total[borrower] += delta
+
+    def exposure_values(self, lenders, borrowers):
+        return self.exposures.get_many(lenders, borrowers)
+
+    def add_exposures(self, lenders, borrowers, amounts):
+        self.exposures.add_many(lenders, borrowers, amounts)
+        np.add.at(self.lending_total, lenders, amounts)
+        np.add.at(self.borrowing_total, borrowers, amounts)
+
+    def linked(self, index, axis=0):
+        indices, values = self.exposures.row(index) if axis == 0 else self.exposures.column(index)
+        keep = (values != 0) & (indices != index)
+        return indices[keep], values[keep]
+
+    def exposure_coo(self):
+        return self.exposures.coo()
+
+    def exposure_matrix(self):
+        return self.exposures.toarray()
+
+    def exposure_sums(self):
+        return self.exposures.sums()
+
+    def load_exposures(self, rows, cols, values):
+        self.exposures = SparseExposures.from_coo(self.size(), rows, cols, values)
+        self.refresh_totals()
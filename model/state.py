@@ -0,0 +1,193 @@
+import numpy as np
+
+
+class BankState(object):
+    '''
+    Balance sheets of every bank in the system kept as NumPy arrays.
+
+    Bank i lives at row i. exposures[i, j] is the amount bank i has lent to
+    bank j, so row i holds the lendings of bank i and column i its borrowings.
+    '''
+    def __init__(self, codes, exposures=None):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+
+        size = len(self.codes)
+        self.cash = np.zeros(size)
+        self.deposit = np.zeros(size)
+        self.equity = np.zeros(size)
+        self.external_asset = np.zeros(size)
+        # exposures given, e.g. a map of a file, are used in place
+        self.exposures = exposures if exposures is not None else np.zeros((size, size))
+        self.bankrupted = np.zeros(size, dtype=bool)
+
+        # Row and column sums of exposures, kept up to date by ExposureView
+        self.lending_total = np.zeros(size)
+        self.borrowing_total = np.zeros(size)
+        if exposures is not None:
+            self.refresh_totals()
+
+    def size(self):
+        return len(self.codes)
+
+    # ===================================================================
+
+    def total_lendings(self):
+        return self.lending_total
+
+    def total_borrowings(self):
+        return self.borrowing_total
+
+    def total_asset(self):
+        return self.cash + self.total_lendings() + self.external_asset
+
+    def total_liability(self):
+        return self.deposit + self.total_borrowings() + self.equity
+
+    # ===================================================================
+
+    def update_bankrupted(self):
+        '''
+        Vectorized Bank.is_bankrupted: flags every bank whose equity or cash
+        became negative and returns the flags.
+        '''
+        total_lendings = self.lending_total
+        total_borrowings = self.borrowing_total
+        total_asset = self.cash + total_lendings + self.external_asset
+        total_liability = self.deposit + total_borrowings + self.equity
+        # In case equity < 0
+        self.bankrupted |= total_asset < self.deposit + total_borrowings
+        # In case cash < 0
+        self.bankrupted |= total_liability < self.external_asset + total_lendings
+        return self.bankrupted
+
+    def number_bankrupted(self):
+        return int(self.update_bankrupted().sum())
+
+    def number_live(self):
+        return self.size() - self.number_bankrupted()
+
+    # ===================================================================
+    # Exposures are only read and written through these methods, so that
+    # SparseBankState can keep them in another layout
+
+    def exposure(self, lender, borrower):
+        return float(self.exposures[lender, borrower])
+
+    def set_exposure(self, lender, borrower, amount):
+        delta = amount - self.exposures[lender, borrower]
+        self.exposures[lender, borrower] = amount
+        self.lending_total[lender] += delta
+        self.borrowing_total[borrower] += delta
+
+    def exposure_values(self, lenders, borrowers):
+        return self.exposures[lenders, borrowers]
+
+    def add_exposures(self, lenders, borrowers, amounts):
+        '''
+        Adds amounts to the exposures of distinct (lender, borrower) pairs.
+        '''
+        self.exposures[lenders, borrowers] += amounts
+        np.add.at(self.lending_total, lenders, amounts)
+        np.add.at(self.borrowing_total, borrowers, amounts)
+
+    def linked(self, index, axis=0):
+        '''
+        Indices and amounts of the nonzero lendings (axis=0) or borrowings
+        (axis=1) of bank index, in index order.
+        '''
+        values = self.exposures[index] if axis == 0 else self.exposures[:, index]
+        indices = np.flatnonzero(values)
+        indices = indices[indices != index]
+        return indices, values[indices]
+
+    def exposure_coo(self):
+        rows, cols = np.nonzero(self.exposures)
+        return rows, cols, self.exposures[rows, cols]
+
+    def exposure_matrix(self):
+        return np.array(self.exposures)
+
+    def exposure_sums(self):
+        return self.exposures.sum(axis=1), self.exposures.sum(axis=0)
+
+    def load_exposures(self, rows, cols, values):
+        '''
+        Sets all exposures at once from COO arrays: values[k] lent by rows[k]
+        to cols[k]. Only the cells that change are written, so a mapped
+        matrix keeps sharing the pages left as they were.
+        '''
+        stale = self.exposures != 0
+        stale[rows, cols] = False
+        self.exposures[stale] = 0
+        changed = self.exposures[rows, cols] != values
+        self.exposures[rows[changed], cols[changed]] = values[changed]
+        self.refresh_totals()
+
+    def refresh_totals(self):
+        self.lending_total, self.borrowing_total = self.exposure_sums()
+
+    def verify_totals(self):
+        lendings, borrowings = self.exposure_sums()
+        for name, total, expected in [("lendings", self.lending_total, lendings),
+                                      ("borrowings", self.borrowing_total, borrowings)]:
+            if not np.allclose(total, expected, rtol=1e-6, atol=1e-6):
+                raise AssertionError("running totals of %s differ from the exposures" % name)
+
+
+class ExposureView(object):
+    '''
+    Dict-like view over one row (lendings) or one column (borrowings) of the
+    exposure matrix, keyed by counterparty code like the per-bank dicts:
+    it holds the nonzero exposures only, any other code reads as 0.
+    '''
+    def __init__(self, state, index, axis):
+        self.state = state
+        self.index = index
+        self.axis = axis
+
+    def pair(self, j):
+        return (self.index, j) if self.axis == 0 else (j, self.index)
+
+    def __getitem__(self, code):
+        lender, borrower = self.pair(self.state.index[code])
+        return self.state.exposure(lender, borrower)
+
+    def __setitem__(self, code, amount):
+        lender, borrower = self.pair(self.state.index[code])
+        self.state.set_exposure(lender, borrower, amount)
+
+    def __contains__(self, code):
+        j = self.state.index.get(code)
+        return j is not None and j != self.index and self[code] != 0
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.state.linked(self.index, self.axis)[0])
+
+    def get(self, code, default=None):
+        if code in self.state.index:
+            return self[code]
+        return default
+
+    def keys(self):
+        return [self.state.codes[j] for j in self.state.linked(self.index, self.axis)[0]]
+
+    def values(self):
+        return self.state.linked(self.index, self.axis)[1].tolist()
+
+    def items(self):
+        indices, values = self.state.linked(self.index, self.axis)
+        return zip([self.state.codes[j] for j in indices], values.tolist())
+
+    def assign(self, amounts):
+        for j in self.state.linked(self.index, self.axis)[0]:
+            lender, borrower = self.pair(j)
+            self.state.set_exposure(lender, borrower, 0)
+        for code, amount in amounts.items():
+            j = self.state.index.get(code)
+            if j is not None and j != self.index and amount != 0:
+                lender, borrower = self.pair(j)
+                self.state.set_exposure(lender, borrower, amount)
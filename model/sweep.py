@@ -0,0 +1,198 @@
+'''
+Parameter sweeps over model.parameters.DEFAULTS. A design is a list of
+parameter overrides, every point of it runs once per replication and its
+summary is kept in a ResultCache, keyed by the parameters, the options,
+the population contents and the code version, so an interrupted sweep
+resumes where it stopped:
+
+    python -m model.sweep --grid shock_rate=0.3,0.5,0.7 --grid loan_term=2,4 --replications 5
+    python -m model.sweep --lhs shock_rate=0.1:0.9 --lhs loan_term=2:8 --samples 20
+'''
+import argparse
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import sys
+
+import numpy as np
+
+from data.store import load_population
+from cache import ResultCache, code_version, population_digest
+from distributions import derive_seed
+from parameters import DEFAULTS, model_parameters
+from pool import run_pool
+from scenarios import summarize
+
+# Parameters taking whole numbers, rounded when sampled
+INTEGER_PARAMETERS = ["loan_term"]
+
+
+def grid(**values):
+    '''
+    Every combination of the given values, e.g.
+    grid(shock_rate=[0.3, 0.5], loan_term=[2, 4]) gives 4 points.
+    '''
+    names = sorted(values)
+    return [dict(zip(names, combination)) for combination in itertools.product(*[values[name] for name in names])]
+
+
+def latin_hypercube(bounds, samples, seed=None):
+    '''
+    samples points spread over bounds = {name: (low, high)}: every
+    parameter range is cut into samples strata and each stratum is
+    sampled exactly once, in a random order per parameter.
+    '''
+    rng = np.random.RandomState(seed)
+    points = [{} for _ in range(samples)]
+    for name in sorted(bounds):
+        low, high = bounds[name]
+        values = low + (high - low) * (rng.permutation(samples) + rng.uniform(size=samples)) / samples
+        for point, value in zip(points, values.tolist()):
+            point[name] = int(round(value)) if name in INTEGER_PARAMETERS else value
+    return points
+
+
+def load_named_population(name):
+    '''
+    A population directory written by data.store.save_population, whose
+    files the workers share, or else a module with params and
+    lending_borrowing_matrix.
+    '''
+    if os.path.isdir(name):
+        return load_population(name)
+    module = importlib.import_module(name)
+    return module.params, module.lending_borrowing_matrix
+
+
+def point_key(parameters, seed, options, population, code=None):
+    '''
+    Hash of everything a run depends on: its parameters, seed and options,
+    the digest of its population contents and the version of the code.
+    '''
+    description = json.dumps({"parameters": model_parameters(parameters), "seed": seed, "options": options,
+                              "population": population, "code": code or code_version()}, sort_keys=True)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()[:20]
+
+
+def build_points(design, replications=1, base_seed=0, options=None):
+    '''
+    One point per design entry and replication. Replication r uses the same
+    seed at every design entry (common random numbers), so differences
+    between entries come from the parameters.
+    '''
+    options = dict(options or {})
+    population = population_digest(load_named_population(options.get("population", "data.banks_1")))
+    points = []
+    for index, parameters in enumerate(design):
+        model_parameters(parameters)
+        for replication in range(replications):
+            seed = derive_seed(base_seed, replication)
+            points.append({"design": index, "replication": replication, "parameters": parameters, "seed": seed,
+                           "options": options, "key": point_key(parameters, seed, options, population)})
+    return points
+
+
+def run_point(point):
+    '''
+    Runs a point. Its options are CreditContagionModel arguments plus
+    limit_step, and population names a module or a population directory,
+    data.banks_1 by default.
+    '''
+    from model import CreditContagionModel
+
+    options = dict(point["options"])
+    limit_step = options.pop("limit_step", 1)
+    options["population"] = load_named_population(options.pop("population", "data.banks_1"))
+    if isinstance(options["population"], tuple):
+        options.setdefault("initial_bank", len(options["population"][0]))
+    model = CreditContagionModel(seed=point["seed"], parameters=point["parameters"], reports=False, **options)
+    model.run_model(limit_step)
+    return dict(point, **summarize(model))
+
+
+def run_and_store(task):
+    point, directory = task
+    result = run_point(point)
+    ResultCache(directory).put(point["key"], result)
+    return result
+
+
+def run_sweep(points, directory, processes=None, progress=None):
+    '''
+    Summaries of the points, in order. Points already in the ResultCache
+    of directory are read back instead of run, the others run over
+    processes workers.
+    '''
+    cache = ResultCache(directory)
+    results = {}
+    for point in points:
+        result = cache.get(point["key"])
+        if result is not None:
+            results[point["key"]] = result
+    pending = [point for point in points if point["key"] not in results]
+    done = len(results)
+    if progress is not None:
+        progress(done, len(points))
+
+    finished = run_pool(run_and_store, [(point, directory) for point in pending], processes,
+                        None if progress is None else lambda count, total: progress(done + count, len(points)))
+    for result in finished:
+        results[result["key"]] = result
+    return [results[point["key"]] for point in points]
+
+
+def parse_values(text):
+    '''
+    Comma separated values, as JSON when they parse: 0.3,0.5 or [0.8,1],[0.9,1.1].
+    '''
+    try:
+        return json.loads('[' + text + ']')
+    except ValueError:
+        return text.split(',')
+
+
+def print_progress(done, total):
+    sys.stdout.write('\r%d/%d points' % (done, total) + ('\n' if done == total else ''))
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parameter sweep of the credit contagion model')
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2',
+                        help='values of a parameter, JSON values such as [0.3,0.5] for ranges')
+    parser.add_argument('--lhs', action='append', default=[], metavar='NAME=LOW:HIGH',
+                        help='bounds of a parameter sampled by latin hypercube')
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--replications', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--limit-step', type=int, default=1)
+    parser.add_argument('--engine', default='array', choices=['dict', 'array'])
+    parser.add_argument('--population', default='data.banks_1',
+                        help='module with params and lending_borrowing_matrix, or a saved population directory')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--directory', default='statistic_reports/sweep')
+    args = parser.parse_args()
+
+    if args.grid and args.lhs:
+        parser.error('use either --grid or --lhs')
+    if args.lhs:
+        bounds = {}
+        for bound in args.lhs:
+            name, limits = bound.split('=')
+            bounds[name] = tuple(float(limit) for limit in limits.split(':'))
+        design = latin_hypercube(bounds, args.samples, args.seed)
+    else:
+        design = grid(**{name: parse_values(values) for name, values in (value.split('=') for value in args.grid)})
+    unknown = set(name for parameters in design for name in parameters) - set(DEFAULTS)
+    if unknown:
+        parser.error('unknown parameters: %s' % ', '.join(sorted(unknown)))
+
+    points = build_points(design, args.replications, args.seed, {"limit_step": args.limit_step,
+                                                                   "engine": args.engine,
+                                                                   "population": args.population})
+    results = run_sweep(points, args.directory, args.processes, print_progress)
+    with open(os.path.join(args.directory, 'results.jsonl'), 'w') as results_file:
+        for result in results:
+            results_file.write(json.dumps(result, sort_keys=True) + '\n')
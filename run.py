@@ -1,10 +1,11 @@
-from model.model import CreditContagionModel
+from model.cache import ResultCache, run_cached
+from model.distributions import derive_seed
 from data.banks_1 import params
 
+# test cases already run with the same banks, code and seed are read back from the cache
+cache = ResultCache()
 for i in range(10):
-    model = CreditContagionModel(shock_type='Idiosyncratic Shock', shocked_bank_number=1, initial_bank=params.__len__(), test_case=i)
-    model.run_model()
-
-    model.export_report()
+    run_cached(cache, shock_type='Idiosyncratic Shock', shocked_bank_number=1, initial_bank=params.__len__(),
+               test_case=i, seed=derive_seed(0, i))
 
 a = 0
@@ -1,11 +1,68 @@
 import random
 from collections import defaultdict
+from itertools import chain, islice
+
+import numpy as np
 
 from mesa.time import RandomActivation
 from agents.bank import Bank
 from agents.bankrupting_processor import BankruptingProcessor
 import operator
 
+class OtherBanks(object):
+    '''
+    All banks of a list but the one at position skip, iterated in place
+    instead of copied into a new list for every bank.
+    '''
+    def __init__(self, banks, skip, position=None):
+        self.banks = banks
+        self.skip = skip
+        # position of every bank code in banks
+        self.position = position
+
+    def __iter__(self):
+        return chain(islice(self.banks, 0, self.skip), islice(self.banks, self.skip + 1, None))
+
+    def __len__(self):
+        return len(self.banks) - 1
+
+    def among(self, codes):
+        '''
+        The banks of codes, in iteration order, found by position.
+        '''
+        return [self.banks[i] for i in sorted(self.position[code] for code in codes if code in self.position)
+                if i != self.skip]
+
+
+class BankIndex(object):
+    '''
+    Position of every bank in the schedule's list, rebuilt once per stage
+    after the shuffle, and the codes of the live banks. A bank leaves the
+    live banks in O(1) when it is found bankrupted.
+    '''
+    def __init__(self, banks):
+        # the schedule's own list, shuffled in place every stage
+        self.banks = banks
+        self.live = set()
+        self.reindex()
+
+    def reindex(self):
+        self.position = {bank.code: i for i, bank in enumerate(self.banks)}
+
+    def add(self, bank):
+        self.position[bank.code] = len(self.banks) - 1
+        self.live.add(bank.code)
+
+    def is_live(self, bank):
+        return bank.code in self.live
+
+    def remove_live(self, bank):
+        self.live.discard(bank.code)
+
+    def others(self, bank):
+        return OtherBanks(self.banks, self.position[bank.code], self.position)
+
+
 class RandomActivationByBreed(RandomActivation):
     '''
     A scheduler which activates each type of agent once per step, in random
@@ -18,10 +75,23 @@ class RandomActivationByBreed(RandomActivation):
     '''
     agents_by_breed = defaultdict(list)
 
-    def __init__(self, model):
+    def __init__(self, model, state=None):
         RandomActivation.__init__(self, model)
         self.agents_by_breed = defaultdict(list)
         self.run_time = 0
+        # BankState of the array engine, None for dict based banks
+        self.state = state
+        # ScoreEngine updating the scores of all banks before stage 2
+        self.score_engine = None
+        # InterbankMarket opened for all banks before stage 2
+        self.market = None
+        # RepaymentLedger settling the stage 3 repayments of all banks at once
+        self.ledger = None
+        # GrowthEngine running stage 1 of all banks at once
+        self.growth_engine = None
+        # shuffles the banks every stage: the random module or a stream of the model
+        self.random = random
+        self.bank_index = BankIndex(self.agents_by_breed[Bank])
 
     def add(self, agent):
         '''
@@ -32,8 +102,9 @@ class RandomActivationByBreed(RandomActivation):
         '''
 
         self.agents.append(agent)
-        agent_class = agent.__class__
-        self.agents_by_breed[agent_class].append(agent)
+        self.agents_by_breed[self.breed_of(agent)].append(agent)
+        if self.breed_of(agent) is Bank:
+            self.bank_index.add(agent)
 
     def remove(self, agent):
         '''
@@ -43,9 +114,18 @@ class RandomActivationByBreed(RandomActivation):
         while agent in self.agents:
             self.agents.remove(agent)
 
-        agent_class = type(agent)
+        agent_class = self.breed_of(agent)
         while agent in self.agents_by_breed[agent_class]:
             self.agents_by_breed[agent_class].remove(agent)
+        if agent_class is Bank:
+            self.bank_index.remove_live(agent)
+            self.bank_index.reindex()
+
+    def breed_of(self, agent):
+        '''
+        Banks are grouped under Bank whatever engine backs them.
+        '''
+        return Bank if isinstance(agent, Bank) else agent.__class__
 
     def step(self, stage, cycle_stage):
         '''
@@ -67,12 +147,30 @@ class RandomActivationByBreed(RandomActivation):
         '''
         banks = self.agents_by_breed[Bank]
         bankrupting_processor = self.agents_by_breed[BankruptingProcessor][0]
-        random.shuffle(banks)
+        self.random.shuffle(banks)
+        self.bank_index.reindex()
+        if stage == 2 and self.score_engine is not None:
+            self.score_engine.update()
+        if stage == 2 and self.market is not None:
+            self.market.open(banks)
+        # stage 1 of a bank only touches its own balance sheet, so it can run after the loop
+        growing = [] if stage == 1 and self.growth_engine is not None else None
         for bank in banks:
+            if not self.bank_index.is_live(bank):
+                continue
             if not bank.is_bankrupted():
-                bank.step(stage, bank.other_agents(banks))
+                if growing is not None:
+                    growing.append(bank)
+                else:
+                    bank.step(stage, self.bank_index.others(bank))
             else:
+                # processed once by the bankrupting processor, then skipped
+                self.bank_index.remove_live(bank)
                 bankrupting_processor.add_bank(bank)
+        if growing:
+            self.growth_engine.step(growing)
+        if stage == 3 and self.ledger is not None:
+            self.ledger.advance()
 
     def step_bankrupting(self):
         bankrupting_processor = self.agents_by_breed[BankruptingProcessor][0]
@@ -85,18 +183,26 @@ class RandomActivationByBreed(RandomActivation):
         return len(self.agents_by_breed[breed_class])
 
     def total_assets(self):
+        if self.state is not None:
+            return float(self.state.total_asset().sum())
         banks = self.agents_by_breed[Bank]
         return sum([bank.total_asset() for bank in banks])
 
     def total_equity(self):
+        if self.state is not None:
+            return float(self.state.equity.sum())
         banks = self.agents_by_breed[Bank]
         return sum([bank.equity for bank in banks])
 
     def number_live_bank(self):
+        if self.state is not None:
+            return self.state.number_live()
         banks = self.agents_by_breed[Bank]
         return len([bank for bank in banks if not bank.is_bankrupted()])
 
     def number_bankrupted_bank(self):
+        if self.state is not None:
+            return self.state.number_bankrupted()
         banks = self.agents_by_breed[Bank]
         return len([bank for bank in banks if bank.is_bankrupted()])
 
@@ -111,6 +217,12 @@ class RandomActivationByBreed(RandomActivation):
         return self.run_time
 
     def interbank_matrix(self):
+        if self.state is not None:
+            order = sorted(range(self.state.size()), key=lambda i: self.state.codes[i])
+            codes = [self.state.codes[i] for i in order]
+            # row i = borrowings of bank i = column i of the exposures
+            borrowings = self.state.exposure_matrix()[:, order].T[:, order]
+            return [[""] + codes] + [[code] + list(row) for code, row in zip(codes, borrowings)]
         banks = self.agents_by_breed[Bank]
         banks = sorted(banks, key=operator.attrgetter('code'))
         mtx = [[""] + [bank.code for bank in banks]]
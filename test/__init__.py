@@ -1,2 +1,3 @@
 from agents import *
-from model import *
\ No newline at end of file
+from model import *
+from utils import *
\ No newline at end of file
@@ -1,5 +1,17 @@
+import copy
 import unittest
 
+from agents.bank import Bank
+from data.banks import params, lending_borrowing_matrix
+
+
+def bank_params(code, check_aggregates=True):
+    bank_params = copy.deepcopy([bank for bank in params if bank["code"] == code][0])
+    bank_params["lendings"] = lending_borrowing_matrix[code]
+    bank_params["borrowings"] = {bank: lending_borrowing_matrix[bank][code] for bank in lending_borrowing_matrix}
+    bank_params["check_aggregates"] = check_aggregates
+    return bank_params
+
 class BankTest(unittest.TestCase):
 
     def test_upper(self):
@@ -14,4 +26,25 @@ class BankTest(unittest.TestCase):
         self.assertEqual(s.split(), ['hello', 'world'])
         # check that s.split fails when the separator is not a string
         with self.assertRaises(TypeError):
-            s.split(2)
\ No newline at end of file
+            s.split(2)
+
+    def test_running_totals(self):
+        lender, borrower = Bank(bank_params("A")), Bank(bank_params("B"))
+        self.assertEqual(lender.total_lendings(), 50)
+        self.assertEqual(borrower.total_borrowings(), 25)
+
+        borrower.borrow(lender, 10, [5, 5])
+        lender.lend(borrower, 10)
+        borrower.pay(lender, 4)
+        lender.receive(borrower, 4)
+        self.assertEqual(lender.total_lendings(), 56)
+        self.assertEqual(borrower.total_borrowings(), 31)
+
+        borrower.set_borrowing("A", 0)
+        self.assertEqual(borrower.total_borrowings(), 5)
+
+    def test_verify_aggregates(self):
+        bank = Bank(bank_params("A"))
+        bank.lendings["B"] = 0
+        with self.assertRaises(AssertionError):
+            bank.total_lendings()
@@ -0,0 +1,43 @@
+# model is the top level package here, not test.model
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from data.banks import params, lending_borrowing_matrix
+from model.model import CreditContagionModel
+
+
+def build_model(**options):
+    '''
+    CreditContagionModel of the banks of data.banks, without reports unless
+    options ask for them.
+    '''
+    options = dict({"population": (params, lending_borrowing_matrix), "initial_bank": len(params),
+                    "reports": False}, **options)
+    return CreditContagionModel(**options)
+
+
+def run_model(limit_step=3, **options):
+    '''
+    build_model(**options) after run_model(limit_step).
+    '''
+    model = build_model(**options)
+    model.run_model(limit_step=limit_step)
+    return model
+
+
+class WorkingDirectory(object):
+    '''
+    TestCase mixin running every test in its own temporary directory, under
+    which the reports are written.
+    '''
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
@@ -1,5 +1,45 @@
 from formulas import FormulasTest
+from state import StateTest
+from scores import ScoresTest
+from market import MarketTest
+from clearing import ClearingTest
+from generator import GeneratorTest
+from checkpoint import CheckpointTest
+from scenarios import ScenariosTest
+from ledger import LedgerTest
+from growth import GrowthTest
+from streams import StreamsTest
+from convergence import ConvergenceTest
+from metrics import MetricsTest
+from sweep import SweepTest
+from cache import CacheTest
+from store import StoreTest
+from sparse import SparseTest
+from batch import BatchTest
+from collector import CollectorTest
+from exposure_history import ExposureHistoryTest
+from construction import ConstructionTest
 
 __all__ = [
-    'FormulasTest'
+    'FormulasTest',
+    'StateTest',
+    'ScoresTest',
+    'MarketTest',
+    'ClearingTest',
+    'GeneratorTest',
+    'CheckpointTest',
+    'ScenariosTest',
+    'LedgerTest',
+    'GrowthTest',
+    'StreamsTest',
+    'ConvergenceTest',
+    'MetricsTest',
+    'SweepTest',
+    'CacheTest',
+    'StoreTest',
+    'SparseTest',
+    'BatchTest',
+    'CollectorTest',
+    'ExposureHistoryTest',
+    'ConstructionTest'
 ]
\ No newline at end of file
@@ -0,0 +1,51 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from batch_run import build_tasks, run_batch, run_replication, aggregate, export_batch, SUMMARY_FIELDS
+from data.banks_1 import params
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replication_alone_equals_pooled(self):
+        tasks = build_tasks(2, ['Idiosyncratic Shock'], [1], len(params), base_seed=7, engine='array')
+        results = run_batch(tasks, processes=2, progress=None)
+        self.assertEqual([result["test_case"] for result in results], [0, 1])
+        self.assertNotEqual(results[0]["seed"], results[1]["seed"])
+        # rebuilt from scratch, the second task alone gives its pooled result
+        task = build_tasks(2, ['Idiosyncratic Shock'], [1], len(params), base_seed=7, engine='array')[1]
+        self.assertEqual(run_replication(task), results[1])
+
+    def test_aggregate(self):
+        results = []
+        for shocked_bank_number, test_case in [(1, 0), (1, 1), (1, 2), (2, 0)]:
+            results.append({"shock_type": 'Idiosyncratic Shock', "shocked_bank_number": shocked_bank_number,
+                            "test_case": test_case, "seed": test_case, "steps": 10 + test_case,
+                            "live_banks": 90 - test_case, "bankrupted_banks": 10 + test_case, "affected_banks": 0,
+                            "total_asset": 100.0 * (test_case + 1), "total_equity": 10.0, "defaults": test_case})
+        scenarios = export_batch(results, self.directory)
+        self.assertEqual([(row["shocked_bank_number"], row["replications"]) for row in scenarios], [(1, 3), (2, 1)])
+        self.assertEqual(len(scenarios[0]), 3 + 7 * 4)
+        self.assertEqual(scenarios, aggregate(results))
+        self.assertEqual(scenarios[0]["total_asset_mean"], 200.0)
+        self.assertEqual(scenarios[0]["total_asset_std"], np.std([100.0, 200.0, 300.0]))
+        self.assertEqual((scenarios[0]["steps_min"], scenarios[0]["steps_max"]), (10, 12))
+        self.assertEqual(scenarios[1]["live_banks_std"], 0)
+
+        with open(os.path.join(self.directory, 'replications.csv')) as csvfile:
+            rows = list(csv.DictReader(csvfile))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(sorted(rows[0]), sorted(SUMMARY_FIELDS))
+        with open(os.path.join(self.directory, 'scenarios.csv')) as csvfile:
+            self.assertEqual(len(list(csv.DictReader(csvfile))), 2)
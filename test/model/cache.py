@@ -0,0 +1,78 @@
+import os
+import shutil
+import unittest
+
+from data.banks import params, lending_borrowing_matrix
+from model.cache import ResultCache, run_cached, run_key
+from model.model import report_directory
+import model.cache
+from test.helpers import WorkingDirectory
+
+
+class CacheTest(WorkingDirectory, unittest.TestCase):
+
+    def setUp(self):
+        WorkingDirectory.setUp(self)
+        self.cache = ResultCache('cache')
+        self.options = {"population": (params, lending_borrowing_matrix), "initial_bank": len(params),
+                        "seed": 3, "test_case": 0}
+
+    def test_hit_skips_the_run(self):
+        summary = run_cached(self.cache, limit_step=2, **self.options)
+        files = sorted(os.listdir(report_directory('Type_1', 0)))
+        self.assertTrue(files)
+
+        shutil.rmtree('statistic_reports')
+        model_class = model.cache.CreditContagionModel
+        model.cache.CreditContagionModel = None
+        try:
+            self.assertEqual(run_cached(self.cache, limit_step=2, **self.options), summary)
+        finally:
+            model.cache.CreditContagionModel = model_class
+        self.assertEqual(sorted(os.listdir(report_directory('Type_1', 0))), files)
+
+    def test_hit_replaces_the_reports_of_another_seed(self):
+        directory = report_directory('Type_1', 0)
+        reports = {}
+        for seed in [3, 4]:
+            run_cached(self.cache, limit_step=2, **dict(self.options, seed=seed))
+            reports[seed] = {name: open(os.path.join(directory, name)).read() for name in os.listdir(directory)}
+        self.assertNotEqual(reports[3]["cash.csv"], reports[4]["cash.csv"])
+
+        model_class = model.cache.CreditContagionModel
+        model.cache.CreditContagionModel = None
+        try:
+            run_cached(self.cache, limit_step=2, **self.options)
+        finally:
+            model.cache.CreditContagionModel = model_class
+        self.assertEqual({name: open(os.path.join(directory, name)).read() for name in os.listdir(directory)},
+                         reports[3])
+
+    def test_key(self):
+        key = run_key(self.options, 2)
+        self.assertEqual(key, run_key(dict(self.options), 2))
+        self.assertNotEqual(key, run_key(dict(self.options, seed=4), 2))
+        self.assertNotEqual(key, run_key(dict(self.options, parameters={"loan_term": 2}), 2))
+        self.assertNotEqual(key, run_key(self.options, 3))
+
+    def test_unseeded_runs_are_not_cached(self):
+        run_cached(self.cache, limit_step=2, **dict(self.options, seed=None, reports=False))
+        self.assertEqual(self.cache.entries(), [])
+
+    def test_least_recently_used_is_evicted(self):
+        for key in ['a', 'b', 'c']:
+            self.cache.put(key, {"key": key, "padding": 'x' * 100})
+            os.utime(os.path.join(self.cache.path(key), 'summary.json'), (0, {'a': 1, 'b': 2, 'c': 3}[key]))
+        self.cache.get('a')
+        self.cache.max_bytes = 300
+        self.cache.evict()
+        self.assertEqual(sorted(key for _, _, key in self.cache.entries()), ['a', 'c'])
+
+    def test_stored_entry_is_kept(self):
+        self.cache.put('a', {"key": 'a'})
+        os.utime(os.path.join(self.cache.path('a'), 'summary.json'), (0, 1))
+        # larger than the whole store, but just stored
+        self.cache.max_bytes = 50
+        self.cache.put('b', {"key": 'b', "padding": 'x' * 100})
+        self.assertEqual([key for _, _, key in self.cache.entries()], ['b'])
+        self.assertEqual(self.cache.get('b')["key"], 'b')
\ No newline at end of file
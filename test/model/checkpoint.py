@@ -0,0 +1,35 @@
+import os
+import unittest
+
+from test.helpers import build_model, WorkingDirectory
+
+
+class CheckpointTest(WorkingDirectory, unittest.TestCase):
+
+    def test_restored_run_matches(self):
+        for engine, scores in [('dict', 'matrix'), ('array', 'matrix'), ('dict', 'agent')]:
+            path = os.path.join(self.directory, engine + scores + '.npz')
+            model = build_model(seed=5, engine=engine, scores=scores)
+            model.run_model(limit_step=4, stop_before_shock=True)
+            self.assertEqual(model.progress["step"], 3)
+            model.checkpoint(path)
+            model.run_model(limit_step=4)
+
+            restored = build_model(seed=99, engine=engine, scores=scores).restore(path)
+            self.assertEqual(restored.progress["step"], 3)
+            restored.run_model(limit_step=4)
+
+            self.assertEqual(restored.progress, model.progress)
+            self.assertEqual(restored.schedule.get_run_time(), model.schedule.get_run_time())
+            self.assertAlmostEqual(restored.schedule.total_equity(), model.schedule.total_equity())
+            self.assertEqual(restored.schedule.number_bankrupted_bank(), model.schedule.number_bankrupted_bank())
+            for bank, restored_bank in zip(model.banks, restored.banks):
+                self.assertAlmostEqual(bank.cash, restored_bank.cash)
+                self.assertAlmostEqual(bank.total_lendings(), restored_bank.total_lendings())
+                self.assertEqual(bank.round_scheduled_repayment_amount(),
+                                 restored_bank.round_scheduled_repayment_amount())
+
+    def test_other_banks_are_rejected(self):
+        path = os.path.join(self.directory, 'checkpoint.npz')
+        build_model(seed=1, scores='matrix').checkpoint(path)
+        self.assertRaises(ValueError, build_model(seed=1, engine='array', scores='matrix').restore, path)
\ No newline at end of file
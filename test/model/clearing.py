@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from agents.bank import Bank
+from agents.bankrupting_processor import BankruptingProcessor
+from model.clearing import clearing_vector
+from test.agents.bank import bank_params
+
+
+class ClearingTest(unittest.TestCase):
+
+    def test_clearing_vector(self):
+        # 0 owes 10 to 1, 1 owes 8 to 2
+        liabilities = np.array([[0, 10, 0], [0, 0, 8], [0, 0, 0]], dtype=float)
+        payments, defaults, rounds = clearing_vector(liabilities, np.array([4., 0, 0]))
+        np.testing.assert_allclose(payments, [4, 4, 0])
+        self.assertEqual(list(defaults), [True, True, False])
+        self.assertTrue(rounds > 1)
+
+    def test_cascade_processes_every_bank_once(self):
+        processor = BankruptingProcessor()
+        banks = []
+        for code in ["A", "B", "C"]:
+            params = bank_params(code)
+            params["bankrupting_processor"] = processor
+            banks.append(Bank(params))
+        processor.set_context({"banks": banks})
+
+        processor.add_bank(banks[0])
+        processor.add_bank(banks[0])
+        self.assertEqual(len(processor.bankrupted_bank), 1)
+        processor.processing()
+        cascade = processor.cascades[-1]
+        self.assertTrue(1 <= cascade["defaults"] <= len(banks))
+        self.assertEqual(cascade["rounds"], cascade["depth"] + 1)
+        self.assertEqual(banks[0].total_lendings(), 0)
+        self.assertEqual(banks[0].total_borrowings(), 0)
+        self.assertEqual(len(processor.bankrupted_bank), 0)
\ No newline at end of file
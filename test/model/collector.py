@@ -0,0 +1,63 @@
+import os
+import unittest
+
+import numpy as np
+
+from model.collector import load_columns, MODEL_COLUMNS
+from test.helpers import build_model, WorkingDirectory
+
+
+class CollectorTest(WorkingDirectory, unittest.TestCase):
+
+    def run_model(self, collector):
+        model = build_model(seed=3, reports=True, collector=collector, chunk_size=3, interbank='history')
+        model.run_model(2)
+        model.export_report()
+        return model
+
+    def assert_same_columns(self, mesa, codes, columns):
+        model_vars = mesa.data_collector.model_vars
+        steps = len(model_vars["Step"])
+        self.assertTrue(steps > 3)
+        for column in MODEL_COLUMNS:
+            np.testing.assert_allclose(np.asarray(columns[column], dtype=float), model_vars[column], err_msg=column)
+
+        agent_vars = mesa.data_collector.agent_vars
+        for column in ["cash", "equity", "deposit", "is_bankrupted"]:
+            self.assertEqual(columns[column].shape, (steps, len(codes)))
+            for row, records in zip(columns[column], agent_vars[column]):
+                values = dict(records)
+                np.testing.assert_allclose(row, [values[code] for code in codes], atol=1e-5, err_msg=column)
+        for column in ["lendings", "borrowings"]:
+            for row, records in zip(columns[column], agent_vars[column]):
+                totals = {code: sum(amounts.values()) for code, amounts in records}
+                np.testing.assert_allclose(row, [totals[code] for code in codes], atol=1e-3, err_msg=column)
+
+    def test_columns_match_the_mesa_collector(self):
+        mesa = self.run_model('mesa')
+        columnar = self.run_model('columnar')
+        directory = columnar.data_collector.directory
+        self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.npz')]),
+                         columnar.data_collector.chunk_count)
+        self.assertTrue(columnar.data_collector.chunk_count > 1)
+        self.assert_same_columns(mesa, columnar.data_collector.codes, load_columns(directory))
+
+    def test_parquet_chunks(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            self.skipTest('pyarrow is not installed')
+        mesa = self.run_model('mesa')
+        parquet = self.run_model('parquet')
+        codes = parquet.data_collector.codes
+        directory = parquet.data_collector.directory
+        tables = [pq.read_table(os.path.join(directory, name)).to_pydict()
+                  for name in sorted(os.listdir(directory)) if name.endswith('.parquet')]
+        # long format back to one array per column, of shape (steps, banks)
+        columns = {}
+        for column in tables[0]:
+            values = np.array([value for table in tables for value in table[column]])
+            columns[column] = values.reshape(-1, len(codes))
+        self.assertEqual(columns["code"][0].tolist(), codes)
+        columns.update({column: columns[column][:, 0] for column in MODEL_COLUMNS})
+        self.assert_same_columns(mesa, codes, columns)
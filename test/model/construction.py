@@ -0,0 +1,33 @@
+import copy
+import unittest
+
+import numpy as np
+
+from data.banks_1 import params, lending_borrowing_matrix
+from data.generator import generate_population
+from model.model import CreditContagionModel
+
+
+class ConstructionTest(unittest.TestCase):
+
+    def test_inputs_are_not_modified(self):
+        population = generate_population(30, density=0.2, seed=5)
+        params_copy, matrix_copy = copy.deepcopy(params), copy.deepcopy(lending_borrowing_matrix)
+        population_copy = copy.deepcopy(population)
+        for engine, exposures, source in [('dict', 'dense', (params, lending_borrowing_matrix)),
+                                          ('array', 'dense', (params, lending_borrowing_matrix)),
+                                          ('array', 'sparse', (params, lending_borrowing_matrix)),
+                                          ('dict', 'dense', population), ('array', 'dense', population),
+                                          ('array', 'sparse', population)]:
+            model = CreditContagionModel(engine=engine, exposures=exposures, population=source,
+                                         initial_bank=len(params), reports=False, seed=2)
+            # a few steps, the shock included, move and clear exposures
+            for step in range(4):
+                model.step(step, shock=step == 1)
+            self.assertTrue(model.schedule.number_bankrupted_bank() > 0)
+
+        self.assertEqual(params, params_copy)
+        self.assertEqual(lending_borrowing_matrix, matrix_copy)
+        for name in ['codes', 'rows', 'cols', 'values', 'cash', 'external_asset', 'equity', 'deposit',
+                     'lending_total', 'borrowing_total', 'large_bank']:
+            np.testing.assert_array_equal(getattr(population, name), getattr(population_copy, name), err_msg=name)
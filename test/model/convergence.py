@@ -0,0 +1,47 @@
+import unittest
+
+from data.generator import generate_population
+from model.convergence import Convergence
+from model.model import CreditContagionModel
+from test.helpers import run_model
+
+
+class ConvergenceTest(unittest.TestCase):
+
+    def test_default_stops_on_stable_bankrupt_set(self):
+        model = run_model(seed=2)
+        self.assertEqual(model.progress["reason"], 'bankrupt_set')
+        self.assertEqual(model.progress["stable_count"], model.stable_count_limit)
+
+    def test_max_steps_and_callback(self):
+        model = run_model(seed=2, convergence=Convergence(max_steps=5))
+        self.assertEqual(model.progress["reason"], 'max_steps')
+        self.assertEqual(model.schedule.get_run_time(), 4)
+
+        model = run_model(seed=2, convergence=Convergence(callback=lambda m: m.progress["i"] == 2))
+        self.assertEqual(model.progress["reason"], 'callback')
+        self.assertEqual(model.progress["step"] + model.progress["i"], 6)
+
+    def test_equity_tolerance(self):
+        # banks keep failing one by one while the total equity moves by less than 2% a step
+        population = generate_population(40, density=0.1, seed=1)
+        steps = {}
+        for convergence in [None, Convergence(equity_tolerance=0.02)]:
+            model = CreditContagionModel(seed=2, reports=False, engine='array', population=population,
+                                         convergence=convergence)
+            model.run_model(limit_step=3)
+            steps[model.progress["reason"]] = model.progress["step"] + model.progress["i"]
+        self.assertEqual(sorted(steps), ['bankrupt_set', 'equity'])
+        self.assertTrue(steps['equity'] < steps['bankrupt_set'])
+
+    def test_quiet_tail_keeps_reports_aligned(self):
+        full = run_model(seed=2)
+        quiet = run_model(seed=2, convergence=Convergence(quiet_tail=True))
+        model_vars, agent_vars = quiet.data_collector.model_vars, quiet.data_collector.agent_vars
+        self.assertTrue(len(model_vars["Step"]) < len(full.data_collector.model_vars["Step"]))
+        self.assertEqual(len(agent_vars["cash"]), len(model_vars["Step"]))
+        # the collected steps are the same as in the full run
+        rows = [full.data_collector.model_vars["Step"].index(step) for step in model_vars["Step"]]
+        full_vars = full.data_collector
+        self.assertEqual(agent_vars["cash"], [full_vars.agent_vars["cash"][row] for row in rows])
+        self.assertEqual(model_vars["Total_Equity"], [full_vars.model_vars["Total_Equity"][row] for row in rows])
\ No newline at end of file
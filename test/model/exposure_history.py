@@ -0,0 +1,55 @@
+import os
+import unittest
+
+import numpy as np
+
+from model.exposure_history import ExposureHistory, ExposureHistoryReader, SNAPSHOT, DELTA
+from test.helpers import build_model, WorkingDirectory
+
+
+class ExposureHistoryTest(WorkingDirectory, unittest.TestCase):
+
+    def test_round_trip(self):
+        rng = np.random.RandomState(1)
+        matrices = []
+        matrix = np.where(rng.uniform(size=(6, 6)) < 0.4, rng.uniform(size=(6, 6)), 0)
+        for step in range(8):
+            matrix = matrix.copy()
+            # links change, appear and go back to zero
+            matrix[rng.randint(6), rng.randint(6)] = rng.uniform()
+            matrix[rng.randint(6), rng.randint(6)] = 0
+            matrices.append(matrix)
+
+        for snapshot_every in [0, 3]:
+            history = ExposureHistory('history.npy', list('ABCDEF'), snapshot_every)
+            for step, matrix in enumerate(matrices):
+                if step % 2:
+                    history.record(step * 2, matrix)
+                else:
+                    rows, cols = np.nonzero(matrix)
+                    history.record_coo(step * 2, rows[::-1], cols[::-1], matrix[rows, cols][::-1])
+            history.close()
+
+            reader = ExposureHistoryReader('history.npy')
+            self.assertEqual(reader.codes, list('ABCDEF'))
+            self.assertEqual(reader.steps(), [step * 2 for step in range(8)])
+            kinds = [kind for kind, _, _ in reader.records]
+            self.assertEqual(kinds, [SNAPSHOT] + [DELTA] * 7 if snapshot_every == 0 else
+                             [SNAPSHOT, DELTA, DELTA] * 2 + [SNAPSHOT, DELTA])
+            for step, matrix in enumerate(matrices):
+                np.testing.assert_array_equal(reader.matrix_at(step * 2), matrix)
+                np.testing.assert_array_equal(reader.matrix_at(step * 2 + 1), matrix)
+            self.assertRaises(KeyError, reader.matrix_at, -1)
+
+    def test_engines_record_the_same_history(self):
+        matrices = []
+        for engine in ['dict', 'array']:
+            model = build_model(seed=3, reports=True, engine=engine, interbank='history')
+            model.run_model(2)
+            model.export_report()
+            reader = ExposureHistoryReader(model.interbank_history.file_path)
+            matrices.append([reader.matrix_at(step) for step in reader.steps()])
+            self.assertTrue(any(matrix.any() for matrix in matrices[-1]))
+        self.assertEqual(len(matrices[0]), len(matrices[1]))
+        for dict_matrix, array_matrix in zip(*matrices):
+            np.testing.assert_allclose(dict_matrix, array_matrix)
@@ -7,8 +7,14 @@ class FormulasTest(unittest.TestCase):
         self.assertEqual('foo'.upper(), 'FOO')
 
     def test_size_score(self):
-        Aj, A, I = 1, 1, 1
+        Aj, A, I = 1, [1], [1]
         self.assertEqual(size_score(Aj, A, I), 0)
 
         Aj, A, I = 4, [4, 9], [1, 1]
-        self.assertEqual(size_score(Aj, A, I), -0.40546510810816438)
\ No newline at end of file
+        self.assertAlmostEqual(size_score(Aj, A, I), -0.40546510810816438)
+
+    def test_lending_decisions(self):
+        scores, alphas, betas = [0.5, -2, 3], [1, 0.4, 0.9], [-1, -0.95, -1.1]
+        expected = [lending_decision(*args) for args in zip(scores, alphas, betas)]
+        self.assertTrue(np.allclose(lending_decisions(scores, np.array(alphas), np.array(betas)), expected))
+        self.assertEqual(lending_decisions([-1000], 1, -1)[0], 0)
\ No newline at end of file
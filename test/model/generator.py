@@ -0,0 +1,28 @@
+import unittest
+
+import numpy as np
+
+from data.generator import generate_population, TOPOLOGIES
+
+
+class GeneratorTest(unittest.TestCase):
+
+    def test_balance_sheet_identity(self):
+        for topology in TOPOLOGIES:
+            population = generate_population(200, topology, density=0.05, seed=1, chunk_size=64)
+            np.testing.assert_allclose(population.total_asset(), population.total_liability())
+            self.assertTrue((population.deposit > 0).all())
+            self.assertFalse((population.rows == population.cols).any())
+            links = population.rows * population.size() + population.cols
+            self.assertEqual(len(np.unique(links)), len(links))
+
+    def test_params_match_exposures(self):
+        population = generate_population(20, density=0.3, seed=2)
+        params, lending_borrowing_matrix = population.to_params()
+        chunks = list(population.iter_params(chunk_size=7))
+        self.assertEqual([len(chunk) for chunk in chunks], [7, 7, 6])
+        for bank, sparse_bank in zip(params, sum(chunks, [])):
+            code = bank["code"]
+            self.assertAlmostEqual(sum(lending_borrowing_matrix[code].values()), bank["asset"]["interbank_asset"])
+            self.assertEqual({other: amount for other, amount in lending_borrowing_matrix[code].items() if amount > 0},
+                             sparse_bank["lendings"])
\ No newline at end of file
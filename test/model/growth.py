@@ -0,0 +1,64 @@
+import unittest
+
+import numpy as np
+
+from data.banks import params
+from model.growth import GrowthEngine, TARGET_FIELDS
+from test.helpers import build_model
+
+
+class GrowthTest(unittest.TestCase):
+
+    def test_bulk_matches_agents(self):
+        for engine in ['dict', 'array']:
+            agent_model, bulk_model = [build_model(engine=engine, stage_1=stage_1, seed=11, rng='streams')
+                                       for stage_1 in ['agent', 'bulk']]
+            for model in [agent_model, bulk_model]:
+                model.banks[0].set_shock(shock_rate=0.3)
+
+            for bank in agent_model.banks:
+                bank.stage_1(agent_model.banks)
+
+            # the same samples, drawn from the same bank streams
+            growth, noise = np.zeros(len(params)), np.zeros(len(params))
+            for k, bank in enumerate(bulk_model.banks):
+                if not bank.is_shocked:
+                    growth[k] = bank.external_asset_growth_rate()
+                noise[k] = bank.deposit_noise_rate()
+            growth_engine = bulk_model.schedule.growth_engine
+            growth_engine.apply(bulk_model.banks, np.arange(len(params)), growth, noise)
+
+            for bank, other in zip(agent_model.banks, bulk_model.banks):
+                for field in ["cash", "deposit", "equity", "external_asset", "is_shocked"] + TARGET_FIELDS:
+                    self.assertAlmostEqual(getattr(bank, field), getattr(other, field))
+
+    def test_scheduler_steps_all_banks_at_once(self):
+        model = build_model(engine='array', stage_1='bulk', seed=11, rng='streams')
+        growth_engine, batches = model.schedule.growth_engine, []
+        step = growth_engine.step
+
+        def recorded(banks):
+            # which banks go bankrupt is decided before any balance sheet changes
+            self.assertFalse(any(bank.is_bankrupted() for bank in banks))
+            batches.append(len(banks))
+            step(banks)
+        growth_engine.step = recorded
+        for bank in model.banks:
+            bank.stage_1 = None
+        model.run_model(limit_step=3)
+
+        # one engine call per step instead of a stage_1 call per bank
+        self.assertEqual(len(batches), model.progress["step"] + model.progress["i"])
+        self.assertEqual(batches[0], len(params))
+        for bank in model.banks:
+            if not bank.is_bankrupted():
+                self.assertAlmostEqual(bank.lending_target_amount,
+                                       bank.total_asset_target_amount * bank.lending_target_rate)
+
+    def test_draw(self):
+        model = build_model(engine='array', seed=11)
+        growth_engine = GrowthEngine(model.banks, model.state)
+        growth, noise = growth_engine.draw(np.arange(len(params)))
+        self.assertEqual(growth.shape, (len(params),))
+        self.assertTrue(np.all(np.abs(noise) <= 0.02))
+        self.assertTrue(model.schedule.growth_engine is None)
@@ -0,0 +1,66 @@
+import unittest
+
+from data.generator import generate_population
+from model.ledger import RepaymentLedger
+from test.helpers import run_model
+
+
+class LedgerTest(unittest.TestCase):
+
+    def test_schedule_take_and_advance(self):
+        ledger = RepaymentLedger(["A", "B", "C"], 2)
+        ledger.schedule("A", "B", [0, 1, 2])
+        self.assertEqual(ledger.take("A", "B"), 0)
+        ledger.advance()
+        ledger.schedule("A", "B", [0, 3, 3])
+        self.assertEqual(ledger.ladders("A"), {"B": [1, 5, 3]})
+        self.assertEqual(ledger.take("A", "B"), 1)
+        self.assertIsNone(ledger.take("A", "C"))
+        ledger.advance()
+        self.assertEqual(list(ledger.due()), [5])
+        ledger.clear("A", "B")
+        self.assertEqual(ledger.ladders("A"), {"B": [0, 0, 0]})
+        self.assertRaises(ValueError, ledger.schedule, "A", "C", [0, 1, 2, 3])
+
+    def test_unpaid_dues_are_kept(self):
+        # a borrower that did not repay this period owes the same ladder next period
+        ledger = RepaymentLedger(["A", "B", "C"], 2)
+        ledger.schedule("A", "C", [2, 1])
+        ledger.schedule("B", "C", [2, 1])
+        self.assertEqual(ledger.take("A", "C"), 2)
+        ledger.advance()
+        self.assertEqual(ledger.ladders("A"), {"C": [1, 0, 0]})
+        self.assertEqual(ledger.ladders("B"), {"C": [2, 1, 0]})
+        ledger.advance()
+        self.assertEqual(ledger.ladders("B"), {"C": [2, 1, 0]})
+        self.assertEqual(ledger.take("B", "C"), 2)
+
+    def test_ledger_matches_lists(self):
+        # banks of this network fail while their borrowers are repaying them
+        population = generate_population(30, density=0.2, seed=3)
+        for engine in ['dict', 'array']:
+            ledger_model, list_model = [run_model(2, engine=engine, seed=0, population=population, ledger=ledger)
+                                        for ledger in [True, False]]
+            # the schedules are in the one ledger of the model, none is left in the banks
+            self.assertTrue(all(bank.ledger is ledger_model.ledger for bank in ledger_model.banks))
+            self.assertEqual([bank.scheduled_repayment_amount for bank in ledger_model.banks],
+                             [{}] * len(ledger_model.banks))
+            self.assertAlmostEqual(ledger_model.ledger.due().sum(),
+                                   sum(ladder[0] for bank in list_model.banks
+                                       for ladder in bank.scheduled_repayment_amount.values() if ladder))
+
+            depth = ledger_model.parameters["loan_term"] + 1
+            ledger_run, list_run = ledger_model.data_collector, list_model.data_collector
+            self.assertEqual(ledger_run.model_vars, list_run.model_vars)
+            for name in ['cash', 'equity', 'deposit', 'lendings', 'borrowings', 'is_bankrupted']:
+                self.assertEqual(ledger_run.agent_vars[name], list_run.agent_vars[name])
+            # the ledger keeps term + 1 periods per relation, a list only the periods left
+            for ledger_step, list_step in zip(ledger_run.agent_vars["scheduled_repayment_amount"],
+                                              list_run.agent_vars["scheduled_repayment_amount"]):
+                for (_, ladders), (_, lists) in zip(ledger_step, list_step):
+                    self.assertEqual(owed(ladders, depth), owed(lists, depth))
+
+
+def owed(ladders, depth):
+    # the bankrupting processor reports no schedule
+    return {code: ladder + [0] * (depth - len(ladder)) for code, ladder in (ladders or {}).items() if any(ladder)}
@@ -0,0 +1,87 @@
+import unittest
+
+import numpy as np
+
+from agents.bank import Bank
+from data.banks import params, lending_borrowing_matrix
+from model.market import InterbankMarket
+from model.model import CreditContagionModel
+from test.agents.bank import bank_params
+
+
+class AcceptAll(object):
+    def take(self, size):
+        return np.zeros(size)
+
+
+class MarketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.market = InterbankMarket(batch_size=1)
+        self.banks = []
+        for code in ["A", "B", "C"]:
+            params = bank_params(code)
+            params["market"] = self.market
+            params["random_stream"] = AcceptAll()
+            self.banks.append(Bank(params))
+        for bank in self.banks:
+            bank.init_scores(bank.other_agents(self.banks))
+            bank.lending_target_rate = 1
+            bank.lending_target_amount = bank.total_lendings() + 50
+        self.market.open(self.banks)
+
+    def test_lenders_ordered_by_asset(self):
+        assets = [bank.total_asset() for bank in self.market.lenders]
+        self.assertEqual(assets, sorted(assets, reverse=True))
+        self.assertEqual(len(self.market.lenders), 3)
+
+    def test_exhausted_lenders_are_skipped(self):
+        first, second, borrower = self.market.lenders
+        first.lending_target_amount = first.total_lendings() + 5
+        lent = second.total_lendings()
+        borrower.ask_amount = 10
+
+        self.assertEqual(self.market.match(borrower, 1), 10)
+        self.assertEqual(first.lending_capacity(), 0)
+        self.assertEqual(second.total_lendings(), lent + 5)
+        self.assertEqual(self.market.next_lender(0), 1)
+
+    def test_borrower_scores_order_the_lenders(self):
+        borrower, richer, poorer = self.market.lenders
+        # a relation with the poorer lender outweighs its size
+        borrower.relation_score[poorer] += 50
+        borrower.update_total_score([richer, poorer])
+        asked = {}
+        for name in ['market', 'agent']:
+            asked[name] = []
+            borrower.take_loan = lambda bank, amount, term, asked=asked[name]: asked.append(bank.code)
+            borrower.ask_amount = 1000
+            if name == 'market':
+                self.market.match(borrower, 1)
+            else:
+                borrower.ask_for_loans([richer, poorer], 1)
+        self.assertEqual(asked['market'], [poorer.code, richer.code])
+        self.assertEqual(asked['market'], asked['agent'])
+
+    def test_lending_capacity(self):
+        # the rate applies to the target amount once more, as is_available_for_lendings always did
+        bank = self.banks[0]
+        bank.lending_target_rate = 0.5
+        bank.lending_target_amount = 2 * bank.total_lendings() + 20
+        self.assertEqual(bank.lending_capacity(), 10)
+        bank.lending_target_amount = bank.total_lendings()
+        self.assertEqual(bank.lending_capacity(), 0)
+        self.assertFalse(bank.is_available_for_lendings())
+
+    def test_model_without_market(self):
+        asked = []
+        ask_for_loans = Bank.ask_for_loans
+        Bank.ask_for_loans = lambda bank, banks, term: asked.append(bank.code) or ask_for_loans(bank, banks, term)
+        try:
+            model = CreditContagionModel(population=(params, lending_borrowing_matrix), initial_bank=len(params),
+                                         reports=False, seed=3, market=False)
+            model.run_model(2)
+        finally:
+            Bank.ask_for_loans = ask_for_loans
+        self.assertIsNone(model.schedule.market)
+        self.assertTrue(asked)
\ No newline at end of file
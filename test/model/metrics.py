@@ -0,0 +1,86 @@
+import json
+import os
+import resource
+import shutil
+import tempfile
+import unittest
+
+import model.fomulas as fl
+import model.metrics as metrics_module
+from test.helpers import build_model, run_model
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_sections_and_formulas(self):
+        size_score = fl.size_score
+        model = run_model(seed=2, metrics=True)
+        metrics = model.metrics
+        steps = model.progress["step"] + model.progress["i"]
+        for stage in [1, 2, 3]:
+            self.assertEqual(metrics.calls['stage_%d' % stage], steps)
+        self.assertEqual(metrics.calls['collect'], steps)
+        self.assertTrue(metrics.calls['size_score'] > 0)
+        self.assertEqual(len(metrics.cascades), len(model.bankrupting_processor.cascades))
+        self.assertTrue(metrics.cascades)
+        # every cascade has its own time, within the time of all cascades
+        seconds = [cascade["seconds"] for cascade in metrics.cascades]
+        self.assertTrue(all(second >= 0 for second in seconds))
+        self.assertTrue(sum(seconds) <= metrics.seconds['cascade'])
+        self.assertTrue(fl.size_score is size_score)
+        self.assertTrue(model.banks[0].formulas.size_score is not size_score)
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'metrics.json')
+            metrics.write(path)
+            with open(path) as metrics_file:
+                summary = json.load(metrics_file)
+            self.assertEqual(summary["sections"]["stage_1"]["calls"], steps)
+            self.assertEqual(summary["memory"], metrics.peak_memory.mode)
+            growth = {"traced": "memory", "peak": "peak_growth", "peak_rss": "peak_rss_growth"}[summary["memory"]]
+            self.assertTrue(growth in summary["sections"]["stage_1"])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_formulas_counted_per_model(self):
+        counted, plain = build_model(seed=2, metrics=True), build_model(seed=2)
+        plain.run_model(limit_step=2)
+        self.assertEqual(counted.metrics.calls['size_score'], 0)
+        counted.run_model(limit_step=2)
+        calls = dict(counted.metrics.calls)
+        self.assertTrue(calls['size_score'] > 0)
+        # the counted formulas belong to the counted model only, whenever they are called
+        plain.run_model(limit_step=2)
+        self.assertEqual(counted.metrics.calls['size_score'], calls['size_score'])
+        counted.banks[0].formulas.size_score(1, [1, 2], [1, 0])
+        self.assertEqual(counted.metrics.calls['size_score'], calls['size_score'] + 1)
+        self.assertTrue(plain.banks[0].formulas is fl)
+
+    def test_peak_rss_in_bytes(self):
+        kilobytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.assertEqual(metrics_module.RSS_UNIT, 1 if metrics_module.sys.platform == 'darwin' else 1024)
+        self.assertTrue(metrics_module.peak_rss() >= kilobytes * metrics_module.RSS_UNIT)
+
+    def test_peak_memory_per_section(self):
+        memory = metrics_module.PeakMemory()
+        if memory.mode != 'peak':
+            self.skipTest('the peak resident memory cannot be reset here')
+        megabyte = 1024 * 1024
+        memory.enter()
+        memory.enter()
+        block = bytearray(64 * megabyte)
+        del block
+        self.assertTrue(memory.exit() >= 60 * megabyte)
+        # a smaller section after a larger one still has its own peak
+        memory.enter()
+        block = bytearray(16 * megabyte)
+        del block
+        self.assertTrue(32 * megabyte > memory.exit() >= 12 * megabyte)
+        # the enclosing section keeps the peak of both
+        self.assertTrue(memory.exit() >= 60 * megabyte)
+
+    def test_disabled(self):
+        model = build_model(seed=2)
+        self.assertTrue(model.metrics is None)
+        self.assertFalse('step_bank' in vars(model.schedule))
\ No newline at end of file
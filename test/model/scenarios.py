@@ -0,0 +1,41 @@
+import unittest
+
+from model.scenarios import ScenarioRunner, build_scenarios
+from test.helpers import build_model
+
+
+class ScenariosTest(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = ScenarioRunner(build_model(seed=5), limit_step=3)
+        self.scenarios = build_scenarios(shock_rates=[0.5, 0.9], shocked_codes=[["A"], ["B"]])
+
+    def test_scenario_matches_a_full_run(self):
+        results = self.runner.run_all(self.scenarios)
+        self.assertEqual(len(results), 4)
+        for scenario, result in zip(self.scenarios, results):
+            model = build_model(seed=5)
+            model.shock_rate = scenario["shock_rate"]
+            model.shocked_codes = scenario["shocked_codes"]
+            model.run_model(limit_step=3)
+            self.assertEqual(result["steps"], model.schedule.get_run_time())
+            self.assertEqual(result["bankrupted_banks"], model.schedule.number_bankrupted_bank())
+            self.assertAlmostEqual(result["total_asset"], model.schedule.total_assets())
+
+    def test_scenarios_start_from_the_burn_in(self):
+        model = self.runner.model
+        banks, burn_in = list(model.banks), model.schedule.get_run_time()
+        run_model, starts = model.run_model, []
+
+        def recorded(*args, **kwargs):
+            starts.append(model.schedule.get_run_time())
+            return run_model(*args, **kwargs)
+        model.run_model = recorded
+        self.runner.run_all(self.scenarios)
+        # every scenario restores the burn-in into the same banks instead of running it again
+        self.assertEqual(starts, [burn_in] * len(self.scenarios))
+        self.assertTrue(burn_in > 0)
+        self.assertTrue(all(bank is other for bank, other in zip(banks, model.banks)))
+
+    def test_parallel_workers(self):
+        self.assertEqual(self.runner.run_all(self.scenarios, processes=2), self.runner.run_all(self.scenarios))
\ No newline at end of file
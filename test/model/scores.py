@@ -0,0 +1,63 @@
+import unittest
+
+from agents.bank import Bank
+import numpy as np
+
+from model.scores import ScoreEngine, LinkScoreEngine
+from test.agents.bank import bank_params
+
+
+class ScoresTest(unittest.TestCase):
+
+    def setUp(self):
+        self.agent_banks = [Bank(bank_params(code)) for code in ["A", "B", "C"]]
+        self.matrix_banks = [Bank(bank_params(code)) for code in ["A", "B", "C"]]
+        for bank in self.agent_banks:
+            bank.init_scores(bank.other_agents(self.agent_banks))
+        self.engine = ScoreEngine(self.matrix_banks)
+        for bank in self.matrix_banks:
+            bank.attach_score_engine(self.engine)
+        self.engine.init_scores()
+
+    def assert_same_scores(self):
+        for agent_bank, matrix_bank in zip(self.agent_banks, self.matrix_banks):
+            for other_agent, other_matrix in zip(self.agent_banks, self.matrix_banks):
+                if other_agent is agent_bank:
+                    continue
+                for name in ["relation_score", "size_score", "total_score"]:
+                    self.assertAlmostEqual(getattr(agent_bank, name)[other_agent],
+                                           getattr(matrix_bank, name)[other_matrix])
+
+    def test_init_scores(self):
+        self.assert_same_scores()
+
+    def test_update_after_borrowing(self):
+        for banks in [self.agent_banks, self.matrix_banks]:
+            banks[1].borrow(banks[0], 10, [10])
+            banks[0].lend(banks[1], 10)
+            banks[1].update_relation_score(banks[1].update_size_score(banks[1].other_agents(banks)), 10)
+            banks[2].update_relation_score(banks[2].update_size_score(banks[2].other_agents(banks)), 0)
+        for bank in self.agent_banks:
+            bank.update_total_score(bank.update_size_score(bank.other_agents(self.agent_banks)))
+        self.engine.update()
+        self.assert_same_scores()
+        self.assertEqual(list(self.engine.live_banks(self.matrix_banks[0], self.matrix_banks)), self.matrix_banks[1:])
+
+    def test_link_engine_matches_matrix(self):
+        banks = [Bank(bank_params(code)) for code in ["A", "B", "C"]]
+        banks[1].lend(banks[2], 30)
+        banks[2].borrow(banks[1], 30, [30])
+        engines = [ScoreEngine(banks), LinkScoreEngine(banks)]
+        rows, cols = np.indices((len(banks), len(banks)))
+        for engine in engines:
+            engine.init_scores()
+            engine.update_relation(banks[2], 30)
+            engine.update_relation(banks[0], 0)
+        for update in [False, True]:
+            if update:
+                banks[0].cash += 200
+                for engine in engines:
+                    engine.update()
+            for name in ["relation", "size", "total"]:
+                np.testing.assert_allclose(engines[1].scores(name, rows, cols), engines[0].scores(name, rows, cols))
+        self.assertFalse([name for name in LinkScoreEngine.FIELDS if np.ndim(getattr(engines[1], name)) > 1])
@@ -0,0 +1,115 @@
+import shutil
+import tempfile
+import types
+import unittest
+from io import BytesIO
+
+import numpy as np
+
+from agents.bank import Bank
+from data.banks_1 import params, lending_borrowing_matrix
+from data.generator import generate_population
+from data.store import save_population, load_population
+from model.model import CreditContagionModel
+from model.scenarios import summarize
+from model.sparse import SparseExposures
+
+
+def arrays_of(root):
+    '''
+    Every numpy array reachable from the attributes of root.
+    '''
+    arrays, seen, stack = [], set(), [root]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        if isinstance(value, np.ndarray):
+            arrays.append(value)
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple, set)):
+            stack.extend(value)
+        elif hasattr(value, '__dict__') and not isinstance(value, (type, types.ModuleType, types.FunctionType)):
+            stack.extend(vars(value).values())
+    return arrays
+
+
+class SparseTest(unittest.TestCase):
+
+    def test_links_outside_the_csr(self):
+        exposures = SparseExposures.from_coo(4, [0, 2, 0, 1], [1, 3, 1, 0], [5., 2., 7., 0.])
+        self.assertEqual(exposures.get(0, 1), 7)
+        self.assertEqual(exposures.set(3, 1, 4.), 0)
+        self.assertEqual(exposures.column(1)[0].tolist(), [0, 3])
+        self.assertEqual(exposures.get_many(np.array([0, 3, 1]), np.array([1, 1, 2])).tolist(), [7, 4, 0])
+
+        exposures.add_many(np.array([0, 2]), np.array([1, 0]), np.array([-7., 1.]))
+        exposures.compact()
+        self.assertEqual(exposures.added, 0)
+        np.testing.assert_array_equal(exposures.toarray(), [[0, 0, 0, 0], [0, 0, 0, 0], [1, 0, 0, 2], [0, 4, 0, 0]])
+        self.assertEqual(exposures.row(2)[0].tolist(), [0, 3])
+
+    def test_bank_dicts_hold_counterparties(self):
+        model = CreditContagionModel(initial_bank=len(params), reports=False)
+        for bank in model.banks:
+            code = bank.code
+            self.assertEqual(set(bank.lendings), set(other for other, amount in lending_borrowing_matrix[code].items()
+                                                     if amount != 0 and other != code))
+
+    def test_no_bank_by_bank_arrays(self):
+        population = generate_population(300, density=0.02, seed=4)
+        size = population.size()
+        largest = {}
+        for exposures in ['dense', 'sparse']:
+            model = CreditContagionModel(engine='array', population=population, reports=False, seed=1,
+                                         exposures=exposures, scores='matrix', market=True)
+            for i_step in range(2):
+                model.step(i_step, shock=i_step == 0)
+            largest[exposures] = max(array.size for array in arrays_of(model))
+        self.assertEqual(largest['dense'], size * size)
+        # the largest sparse arrays hold the links and the repayment ladders
+        self.assertTrue(largest['sparse'] < size * size / 2)
+
+    def test_sparse_matches_dense(self):
+        directory = tempfile.mkdtemp()
+        try:
+            population = generate_population(60, density=0.05, seed=8)
+            save_population(directory, population)
+            summaries = []
+            for exposures, ledger, source in [('dense', True, population), ('sparse', True, population),
+                                              ('sparse', False, population),
+                                              ('sparse', True, load_population(directory))]:
+                model = CreditContagionModel(engine='array', population=source, reports=False, seed=6,
+                                             exposures=exposures, ledger=ledger, scores='matrix', market=True)
+                model.run_model(2)
+                summaries.append(summarize(model))
+                model.state.verify_totals()
+            for summary in summaries[1:]:
+                self.assertEqual(summary["bankrupted_banks"], summaries[0]["bankrupted_banks"])
+                self.assertAlmostEqual(summary["total_equity"], summaries[0]["total_equity"])
+            self.assertTrue(model.mapped_exposures)
+            np.testing.assert_array_equal(load_population(directory).exposure_matrix(), population.exposure_matrix())
+        finally:
+            shutil.rmtree(directory)
+
+    def test_checkpoint_round_trip(self):
+        population = generate_population(40, density=0.1, seed=9)
+        model = CreditContagionModel(engine='array', population=population, reports=False, seed=3,
+                                     exposures='sparse')
+        model.run_model(2, stop_before_shock=True)
+        checkpoint = BytesIO()
+        model.checkpoint(checkpoint)
+        model.run_model(2)
+        expected = summarize(model)
+        # cascades before the checkpoint are not part of it
+        del expected["defaults"]
+
+        restored = CreditContagionModel(engine='array', population=population, reports=False, seed=3,
+                                        exposures='sparse')
+        restored.restore(BytesIO(checkpoint.getvalue()))
+        restored.run_model(2)
+        summary = summarize(restored)
+        del summary["defaults"]
+        self.assertEqual(summary, expected)
\ No newline at end of file
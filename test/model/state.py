@@ -0,0 +1,66 @@
+import copy
+import random
+import unittest
+
+import numpy as np
+
+from agents.bank import Bank
+from agents.array_bank import ArrayBank
+from model.state import BankState
+from data.banks import params, lending_borrowing_matrix
+from model.model import CreditContagionModel
+
+
+def bank_params(i):
+    bank_params = copy.deepcopy(params[i])
+    bank_params["lendings"] = lending_borrowing_matrix[bank_params["code"]]
+    bank_params["borrowings"] = {bank: lending_borrowing_matrix[bank][bank_params["code"]]
+                                 for bank in lending_borrowing_matrix}
+    return bank_params
+
+
+class StateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.state = BankState([bank["code"] for bank in params])
+        self.array_banks = [ArrayBank(bank_params(i), self.state) for i in range(len(params))]
+        self.dict_banks = [Bank(bank_params(i)) for i in range(len(params))]
+
+    def test_balance_sheet_matches_dict_banks(self):
+        for array_bank, dict_bank in zip(self.array_banks, self.dict_banks):
+            self.assertEqual(array_bank.total_lendings(), dict_bank.total_lendings())
+            self.assertEqual(array_bank.total_borrowings(), dict_bank.total_borrowings())
+            self.assertEqual(array_bank.total_asset(), dict_bank.total_asset())
+            self.assertEqual(dict(array_bank.lendings.items()), dict_bank.lendings)
+        self.assertEqual(list(self.state.total_asset()), [bank.total_asset() for bank in self.dict_banks])
+
+    def test_repayment_moves_shared_exposure_once(self):
+        lender, borrower = self.array_banks[0], self.array_banks[1]
+        borrower.pay(lender, 5)
+        lender.receive(borrower, 5)
+        self.assertEqual(lender.lendings["B"], 15)
+        self.assertEqual(borrower.borrowings["A"], 15)
+        self.assertTrue(borrower.check_balance_sheet_problem())
+
+    def test_update_bankrupted(self):
+        self.assertEqual(self.state.number_bankrupted(), 0)
+        self.array_banks[2].cash = -100
+        self.assertEqual(list(self.state.update_bankrupted()), [False, False, True])
+        self.assertTrue(self.array_banks[2].bankrupted)
+
+    def test_defaults_are_the_per_agent_paths(self):
+        runs = []
+        for _ in range(2):
+            # unseeded, the model draws from the global generators like run.py always did
+            random.seed(5)
+            np.random.seed(5)
+            model = CreditContagionModel(initial_bank=len(params), reports=False,
+                                         population=(params, lending_borrowing_matrix))
+            self.assertIsNone(model.state)
+            self.assertIsNone(model.streams)
+            self.assertIsNone(model.ledger)
+            for engine in [model.schedule.score_engine, model.schedule.market, model.schedule.growth_engine]:
+                self.assertIsNone(engine)
+            model.run_model(2)
+            runs.append(model.data_collector.model_vars)
+        self.assertEqual(runs[0], runs[1])
\ No newline at end of file
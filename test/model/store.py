@@ -0,0 +1,43 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from data.generator import generate_population
+from data.store import save_population, load_population, dense_exposures
+from model.model import CreditContagionModel
+from model.scenarios import summarize
+
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.population = generate_population(30, density=0.2, seed=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        save_population(self.directory, self.population)
+        loaded = load_population(self.directory)
+        self.assertEqual(loaded.codes, self.population.codes)
+        np.testing.assert_array_equal(loaded.exposure_matrix(), self.population.exposure_matrix())
+        np.testing.assert_array_equal(loaded.large_bank, self.population.large_bank)
+        np.testing.assert_allclose(loaded.deposit, self.population.deposit)
+
+    def test_mapped_exposures_are_copy_on_write(self):
+        save_population(self.directory, self.population, dense=True)
+        summaries = []
+        for population in [self.population, load_population(self.directory), load_population(self.directory)]:
+            model = CreditContagionModel(engine='array', population=population, reports=False, seed=4)
+            model.run_model(2)
+            summaries.append(summarize(model))
+        self.assertTrue(model.mapped_exposures)
+        self.assertEqual(summaries[1], summaries[0])
+        self.assertEqual(summaries[2], summaries[0])
+
+        # the runs only changed their private pages
+        self.assertFalse(np.array_equal(model.state.exposures, self.population.exposure_matrix()))
+        np.testing.assert_array_equal(dense_exposures(self.directory), self.population.exposure_matrix())
\ No newline at end of file
@@ -0,0 +1,35 @@
+import unittest
+
+from model.distributions import RandomStreams
+from test.helpers import build_model, run_model
+
+
+class StreamsTest(unittest.TestCase):
+
+    def test_streams_are_independent(self):
+        streams, other = RandomStreams(7), RandomStreams(7)
+        other.stream('schedule').uniform(size=10)
+        self.assertEqual(list(streams.stream('bank', 'A').uniform(size=3)),
+                         list(other.stream('bank', 'A').uniform(size=3)))
+        self.assertNotEqual(list(streams.stream('bank', 'A').uniform(size=3)),
+                            list(streams.stream('bank', 'B').uniform(size=3)))
+
+    def test_reseed_in_place(self):
+        streams = RandomStreams(7)
+        generator = streams.stream('growth')
+        first = list(generator.uniform(size=3))
+        streams.reseed(8)
+        streams.reseed(7)
+        self.assertEqual(list(generator.uniform(size=3)), first)
+
+    def test_interleaved_runs_reproduce(self):
+        alone = run_model(4, seed=3, rng='streams')
+
+        # another model seeding and drawing in between does not change the run
+        model = build_model(seed=3, rng='streams')
+        run_model(4, seed=4, rng='streams')
+        model.run_model(limit_step=4)
+        self.assertEqual(alone.schedule.get_run_time(), model.schedule.get_run_time())
+        for bank, other_bank in zip(alone.banks, model.banks):
+            self.assertEqual(bank.cash, other_bank.cash)
+            self.assertEqual(bank.is_bankrupted(), other_bank.is_bankrupted())
\ No newline at end of file
@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from data import contanst
+from data.banks import params, lending_borrowing_matrix
+from data.generator import generate_population
+from data.store import save_population
+from model.model import CreditContagionModel
+from model.cache import ResultCache
+from model.sweep import grid, latin_hypercube, build_points, run_sweep, point_key
+
+
+class SweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parameters_are_per_model(self):
+        model = CreditContagionModel(initial_bank=len(params), reports=False,
+                                     population=(params, lending_borrowing_matrix),
+                                     ledger=True, parameters={"loan_term": 2, "beta_range": (-2, -1)})
+        self.assertEqual(model.ledger.depth, 3)
+        self.assertEqual([bank.term for bank in model.banks], [2] * len(params))
+        self.assertEqual(model.banks[0].beta_range(), (-2, -1))
+        self.assertEqual(contanst.LOAN_TERM, 4)
+        self.assertRaises(ValueError, CreditContagionModel, parameters={"alpha": 1})
+
+    def test_designs(self):
+        self.assertEqual(len(grid(shock_rate=[0.3, 0.5, 0.7], loan_term=[2, 4])), 6)
+        points = latin_hypercube({"shock_rate": (0, 1), "loan_term": (1, 8)}, 5, seed=1)
+        self.assertEqual(sorted(int(point["shock_rate"] * 5) for point in points), range(5))
+        self.assertTrue(all(isinstance(point["loan_term"], int) for point in points))
+
+    def test_sweep_resumes(self):
+        points = build_points(grid(shock_rate=[0.3, 0.9]), replications=2,
+                              options={"population": "data.banks", "limit_step": 2})
+        results = run_sweep(points, self.directory, processes=2)
+        self.assertEqual([result["key"] for result in results], [point["key"] for point in points])
+        self.assertEqual(results, run_sweep(points, self.directory, processes=1))
+
+        # finished points are read back, only the missing one runs again
+        cache = ResultCache(self.directory)
+        with open(os.path.join(cache.path(points[0]["key"]), 'summary.json'), 'w') as result_file:
+            json.dump(dict(results[0], steps=-1), result_file)
+        shutil.rmtree(cache.path(points[1]["key"]))
+        resumed = run_sweep(points, self.directory, processes=1)
+        self.assertEqual(resumed[0]["steps"], -1)
+        self.assertEqual(resumed[1], results[1])
+
+    def test_keys_cover_population_and_code(self):
+        parameters, options = {"shock_rate": 0.3}, {"population": "data.banks"}
+        key = point_key(parameters, 1, options, 'population', 'code')
+        self.assertEqual(key, point_key(parameters, 1, dict(options), 'population', 'code'))
+        self.assertNotEqual(key, point_key(parameters, 1, options, 'other population', 'code'))
+        self.assertNotEqual(key, point_key(parameters, 1, options, 'population', 'other code'))
+        # the same population name with other contents gives other keys
+        directory = os.path.join(self.directory, 'population')
+        keys = []
+        for seed in [1, 2]:
+            save_population(directory, generate_population(10, density=0.3, seed=seed))
+            keys.append(build_points([parameters], options={"population": directory})[0]["key"])
+        self.assertNotEqual(keys[0], keys[1])
\ No newline at end of file
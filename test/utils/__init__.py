@@ -0,0 +1,5 @@
+from logger import LoggerTest
+
+__all__ = [
+    'LoggerTest'
+]
\ No newline at end of file
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from data import banks
+from model.model import CreditContagionModel
+from utils.logger import EventLog, JsonlSink, BinarySink, read_events, filter_events, parse_level, log, \
+    DEBUG, INFO, WARNING, OFF
+
+
+class LoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_events(self, sink):
+        events = EventLog(level=INFO, sinks=[sink])
+        events.debug('stage', code=1, stage=2)
+        events.info('pay', code=1, amount=2.5, bank=3)
+        events.warning('bankrupted', code=3, cash=-1.0)
+        events.info('cascade', defaults=2, rounds=1)
+        events.close()
+
+    def test_sinks_round_trip(self):
+        for name, sink in [('events.jsonl', JsonlSink), ('events.bin', BinarySink)]:
+            path = os.path.join(self.directory, name)
+            self.write_events(sink(path))
+            events = list(read_events(path))
+            self.assertEqual([event['event'] for event in events], ['pay', 'bankrupted', 'cascade'])
+            self.assertEqual(events[0], {'level': INFO, 'event': 'pay', 'code': 1, 'amount': 2.5, 'bank': 3})
+            self.assertEqual([event['event'] for event in filter_events(events, min_level=WARNING)], ['bankrupted'])
+            self.assertEqual(list(filter_events(events, names=['pay', 'bankrupted'], code=3)),
+                             [{'level': WARNING, 'event': 'bankrupted', 'code': 3, 'cash': -1.0}])
+
+    def test_levels(self):
+        self.assertEqual(parse_level('debug'), DEBUG)
+        self.assertEqual(parse_level('Info'), INFO)
+        self.assertEqual(parse_level(OFF), OFF)
+        for level in ['verbose', 15, None]:
+            self.assertRaises(ValueError, parse_level, level)
+        self.assertRaises(ValueError, CreditContagionModel, reports=False, log_level='loud')
+
+    def test_models_keep_their_traces(self):
+        params, lending_borrowing_matrix = banks.params, banks.lending_borrowing_matrix
+        first, second = [os.path.join(self.directory, name) for name in ['first.jsonl', 'second.jsonl']]
+        models = [CreditContagionModel(population=(params, lending_borrowing_matrix), initial_bank=len(params),
+                                       reports=False, seed=3, rng='streams', trace=path) for path in [first, second]]
+        for model in models:
+            model.run_model(2)
+            model.close_log()
+        self.assertEqual(log.level, OFF)
+        self.assertEqual(log.sinks, [])
+        first_events, second_events = list(read_events(first)), list(read_events(second))
+        self.assertTrue(len(first_events) > 0)
+        self.assertEqual(first_events, second_events)
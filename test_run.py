@@ -1,6 +1,12 @@
 import unittest
 from test import *
 
-for test_class in ['BankTest']:
-    suite = unittest.TestLoader().loadTestsFromTestCase(eval('BankTest'))
+for test_class in ['BankTest', 'FormulasTest', 'StateTest', 'ScoresTest', 'MarketTest', 'ClearingTest',
+                   'GeneratorTest', 'CheckpointTest',
+                   'ScenariosTest', 'LedgerTest', 'GrowthTest',
+                   'StreamsTest', 'ConvergenceTest', 'MetricsTest',
+                   'SweepTest', 'CacheTest', 'StoreTest',
+                   'SparseTest', 'LoggerTest', 'BatchTest',
+                   'CollectorTest', 'ExposureHistoryTest', 'ConstructionTest']:
+    suite = unittest.TestLoader().loadTestsFromTestCase(eval(test_class))
     unittest.TextTestRunner(verbosity=2).run(suite)
\ No newline at end of file
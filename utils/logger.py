@@ -0,0 +1,226 @@
+import json
+import pickle
+import sys
+from contextlib import contextmanager
+
+TRACE = 5
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+LEVEL_NAMES = {TRACE: 'TRACE', DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', OFF: 'OFF'}
+
+
+def parse_level(level):
+    '''
+    Level number of a level or of its name, in any case: parse_level('debug') == DEBUG.
+    '''
+    if level in LEVEL_NAMES:
+        return level
+    names = {name: number for number, name in LEVEL_NAMES.items()}
+    if hasattr(level, 'upper') and level.upper() in names:
+        return names[level.upper()]
+    raise ValueError("Unknown log level: %r" % (level,))
+
+
+# Text layout of the events, only rendered by TextSink
+MESSAGES = {
+    'pay': '---> Code: {code} paid {amount} to {bank}',
+    'receive': '---> Code: {code} received {amount} from {bank}',
+    'lend': '---> Code: {code} lend {amount} to {bank}',
+    'borrow': '---> Code: {code} borrowed {amount} from {bank}',
+    'update_deposit': '---> Code: {code} updated_deposit - deposit_target_amount : {deposit_target_amount}'
+                      ' - new_deposit : {new_deposit} - noise rate : {noise_rate}',
+    'update_external_asset': '---> Code: {code} updated_external_asset - external_asset : {external_asset}'
+                             ' - growth_rate: {growth_rate} - new_external_asset : {new_external_asset}',
+    'shock': '--->(SHOCK) Code: {code} updated_external_asset - external_asset : {external_asset}'
+             ' - shock_rate : {shock_rate} - new_external_asset : {new_external_asset}',
+    'update_equity': '---> Code: {code} updated_equity - equity : {equity} - growth_rate: {growth_rate}'
+                     ' - new_equity : {new_equity}',
+    'update_target_amount': '---> Code {code} update_{target}_target_amount : {amount}',
+    'score': '---> Code {code} total_score with Bank {bank} : {score}',
+    'loan': '---> Code {code} lending - amount: {amount} - remaining amount: {remaining} Bank: {bank}',
+    'sell_debt': '---> Code {code} sells debt of {bank} - cash : {cash} - debt : {debt} - enough cash : {enough_cash}',
+    'bankrupted': '---> Code: {code} bankrupted - cash : {cash}',
+    'cascade': '---> Cascade of {defaults} defaults in {rounds} rounds',
+    'stage': 'Code: {code} --> Run stage_{stage} - cash : {cash} - Balance Sheet : {balanced}',
+    'model': 'Project Name: {project} - Initial number banks: {banks}',
+    'step': '[{time}, {banks}]',
+}
+
+
+def json_default(value):
+    # NumPy scalars
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class TextSink(object):
+    '''
+    Renders events as the human readable lines of MESSAGES.
+    '''
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, level, event, fields):
+        if event in MESSAGES:
+            line = MESSAGES[event].format(**fields)
+        else:
+            line = event + ' ' + ' '.join('%s=%s' % (key, fields[key]) for key in sorted(fields))
+        self.stream.write(line + '\n')
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+class JsonlSink(object):
+    '''
+    Writes one JSON object per event and line.
+    '''
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def write(self, level, event, fields):
+        record = dict(fields, level=level, event=event)
+        self.file.write(json.dumps(record, default=json_default) + '\n')
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class BinarySink(object):
+    '''
+    Appends (level, event, fields) records with pickle, the most compact sink.
+    '''
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+
+    def write(self, level, event, fields):
+        pickle.dump((level, event, fields), self.file, pickle.HIGHEST_PROTOCOL)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def open_sink(path):
+    if path.endswith('.jsonl'):
+        return JsonlSink(path)
+    return BinarySink(path)
+
+
+class EventLog(object):
+    '''
+    Leveled event log. Events are a name plus raw fields and are only
+    formatted by the sinks, so a disabled level costs a single comparison.
+    '''
+    def __init__(self, level=OFF, sinks=None):
+        self.level = level
+        self.sinks = sinks or []
+
+    def configure(self, level=None, sinks=None):
+        if level is not None:
+            self.level = parse_level(level)
+        if sinks is not None:
+            self.close()
+            self.sinks = sinks
+        if self.level < OFF and not self.sinks:
+            self.sinks = [TextSink()]
+
+    @contextmanager
+    def using(self, level, sinks):
+        '''
+        Logs at level to sinks inside the block, then gives the previous
+        level and sinks back, still open.
+        '''
+        previous = self.level, self.sinks
+        self.level, self.sinks = level, sinks
+        try:
+            yield self
+        finally:
+            self.level, self.sinks = previous
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def log(self, level, event, **fields):
+        if level >= self.level:
+            self.emit(level, event, fields)
+
+    def trace(self, event, **fields):
+        if TRACE >= self.level:
+            self.emit(TRACE, event, fields)
+
+    def debug(self, event, **fields):
+        if DEBUG >= self.level:
+            self.emit(DEBUG, event, fields)
+
+    def info(self, event, **fields):
+        if INFO >= self.level:
+            self.emit(INFO, event, fields)
+
+    def warning(self, event, **fields):
+        if WARNING >= self.level:
+            self.emit(WARNING, event, fields)
+
+    def emit(self, level, event, fields):
+        for sink in self.sinks:
+            sink.write(level, event, fields)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+        self.sinks = []
+
+
+log = EventLog()
+
+
+# ===================================================================
+# Replay of traced runs
+
+def read_events(path):
+    '''
+    Yields the events of a JSONL or binary trace as dicts.
+    '''
+    if path.endswith('.jsonl'):
+        with open(path) as trace:
+            for line in trace:
+                yield json.loads(line)
+    else:
+        with open(path, 'rb') as trace:
+            while True:
+                try:
+                    level, event, fields = pickle.load(trace)
+                except EOFError:
+                    break
+                yield dict(fields, level=level, event=event)
+
+
+def filter_events(events, names=None, min_level=TRACE, **match):
+    '''
+    Keeps events with one of the given names, at least min_level and whose
+    fields equal the keyword arguments, e.g. filter_events(events, code='A').
+    '''
+    for event in events:
+        if names is not None and event['event'] not in names:
+            continue
+        if event['level'] < min_level:
+            continue
+        if any(event.get(key) != value for key, value in match.items()):
+            continue
+        yield event